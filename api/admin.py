@@ -3,5 +3,9 @@ from .models import *
 
 admin.site.register(Project)
 admin.site.register(Donation)
+admin.site.register(Donor)
+admin.site.register(GatewayPlan)
+admin.site.register(IdempotencyKey)
+admin.site.register(RecurringDonation)
 admin.site.register(Volunteer)
 admin.site.register(Subscription)
@@ -16,7 +16,7 @@ def login(request, payload: LoginSchema):
     """
     try:
         if '@' in payload.username:
-            user = User.objects.filter(email=payload.username).first()
+            user = User.by_email(payload.username).first()
         else:
             user = User.objects.filter(username=payload.username).first()
         if not user:
@@ -38,7 +38,7 @@ def register(request, payload: RegisterSchema):
     try:
         if User.objects.filter(username=payload.username).exists():
             return 400, ErrorResponse(message="Username already taken", code=400)
-        if User.objects.filter(email=payload.email).exists():
+        if User.by_email(payload.email).exists():
             return 400, ErrorResponse(message="Email already registered", code=400)
 
         user = User.objects.create(
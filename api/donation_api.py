@@ -1,30 +1,68 @@
 from ninja import Router, Query
+from ninja.decorators import decorate_view
 from ninja.responses import Response
 
 import json
+from datetime import date, datetime, time, timedelta
+from typing import Literal
 
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import Q
-from core.clients import PaypalClient, PaystackClient
+from core.clients import PaypalClient, PaystackClient, gateway_status
+from core.database import read_from_replica
 from django.core.paginator import Paginator, EmptyPage
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.db.models import Sum
 from decimal import Decimal
 import logging
 
-from .models import Donation, Project, ExchangeRate
+from .models import Donation, Donor, Project, ExchangeRate, GatewayPlan, IdempotencyKey, RecurringDonation
 from .schema import (
     DonationResponse, ErrorResponse, DonationRequestSchema, DonationListResponse, DonationFilter, ExchangeRatResponse,
-    UpdateExchangeRateRequest
+    UpdateExchangeRateRequest, DonorResponse, DonationStatusResponse, CurrencyCode, RateCurrency,
+    DonationAnalyticsResponse, RecurringMetricsResponse
 )
 
 from api.utils import conversion
+from core.tracing import span
+from core.utils import stream_csv, stream_ndjson
 
 logger = logging.getLogger(__name__)
 
 router = Router(tags=["Donations"])
 
+EXPORT_FIELDS = [
+    "id", "created_at", "payment_completed_at", "donor_full_name", "donor_email",
+    "amount", "currency", "project_id", "project_title", "project_currency",
+    "project_currency_amount", "exchange_rate_used", "frequency", "status",
+    "payment_client", "reference",
+]
+
+
+def filter_donations(donations_qs, filters: DonationFilter, start_date: date = None, end_date: date = None):
+    """Apply the list filters and an inclusive created_at date range"""
+    if filters.search:
+        donations_qs = donations_qs.filter(
+            Q(donor_full_name__icontains=filters.search) | Q(donor_email__icontains=filters.search) | Q(
+                project__title__icontains=filters.search))
+
+    if filters.frequency:
+        donations_qs = donations_qs.filter(frequency__icontains=filters.frequency)
+    if filters.status:
+        donations_qs = donations_qs.filter(status=filters.status.upper())
+
+    if filters.payment_method:
+        donations_qs = donations_qs.filter(payment_client__icontains=filters.payment_method)
+
+    tz = timezone.get_current_timezone()
+    if start_date:
+        donations_qs = donations_qs.filter(created_at__gte=datetime.combine(start_date, time.min, tzinfo=tz))
+    if end_date:
+        donations_qs = donations_qs.filter(created_at__lte=datetime.combine(end_date, time.max, tzinfo=tz))
+    return donations_qs
+
 
 def handle_paystack_payment(payload_dict,
                             callback_url):
@@ -33,19 +71,23 @@ def handle_paystack_payment(payload_dict,
 
     try:
         if payload_dict['frequency'] == Donation.FrequencyChoices.MONTHLY:
-            # Create subscription plan
-            plan_payload = {
-                "name": f"Monthly Donation - {payload_dict.get('project_id', 'General')}",
-                "interval": "monthly",
-                "amount": int(payload_dict['amount'] * 100),
-                "currency": payload_dict['currency']
-            }
-
-            plan_response = paystack.initialize_plan(plan_payload)
-            if not plan_response.get('status'):
-                raise Exception("Failed to create payment plan")
-
-            plan_code = plan_response["data"]["plan_code"]
+            def create_plan():
+                plan_payload = {
+                    "name": f"Monthly Donation - {payload_dict['amount']} {payload_dict['currency']}",
+                    "interval": "monthly",
+                    "amount": int(payload_dict['amount'] * 100),
+                    "currency": payload_dict['currency']
+                }
+                plan_response = paystack.initialize_plan(plan_payload)
+                if not plan_response.get('status'):
+                    raise Exception("Failed to create payment plan")
+                return plan_response["data"]["plan_code"]
+
+            # Reuse the subscription plan for this amount/currency if one exists
+            plan_code = GatewayPlan.get_or_create_plan(
+                Donation.PaymentClientChoices.PAYSTACK, payload_dict['amount'],
+                payload_dict['currency'], "monthly", create_plan
+            )
 
             # Initialize subscription
             transaction_payload = {
@@ -98,7 +140,6 @@ def handle_paypal_payment(payload_dict,
     """Handle PayPal payment initialization"""
     client = PaypalClient()
 
-    print("in paypal=====>", callback_url, payload_dict)
     try:
         if payload_dict['frequency'] == Donation.FrequencyChoices.ONCE:
             resp = client.create_payment(
@@ -117,9 +158,14 @@ def handle_paypal_payment(payload_dict,
             return 201, {"checkout_url": resp["approval_url"]}
 
         elif payload_dict['frequency'] == Donation.FrequencyChoices.MONTHLY:
+            plan_id = GatewayPlan.get_or_create_plan(
+                Donation.PaymentClientChoices.PAYPAL, payload_dict['amount'], "USD", "monthly",
+                lambda: client.create_billing_plan(amount=payload_dict['amount'], return_url=callback_url)
+            )
             resp = client.subcription_payment(
                 amount=payload_dict['amount'],
-                return_url=callback_url
+                return_url=callback_url,
+                plan_id=plan_id
             )
 
             if not resp.get("success"):
@@ -127,6 +173,7 @@ def handle_paypal_payment(payload_dict,
 
             donation_ = Donation.objects.create(**payload_dict)
             donation_.reference = resp["token"]
+            donation_.payment_plan_code = plan_id
             donation_.save()
 
             return 201, {"checkout_url": resp["approval_url"]}
@@ -140,10 +187,34 @@ def handle_paypal_payment(payload_dict,
 
 @router.post("/donations", auth=None,
              response={201: dict, 400: ErrorResponse,
-                       404: ErrorResponse})
-def create_donation(request, payload: DonationRequestSchema):
-    """Create a new donation with improved validation and currency handling"""
+                       404: ErrorResponse, 409: ErrorResponse})
+def create_donation(request, payload: DonationRequestSchema, response: HttpResponse):
+    """
+    Create a new donation with improved validation and currency handling.
+    With an Idempotency-Key header, retries get the first response back instead
+    of a second donation and gateway checkout.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        return start_checkout(payload)
+    if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+        return 400, ErrorResponse(message="Idempotency-Key is too long", code=400)
+
+    try:
+        status, body, replayed = IdempotencyKey.run(
+            "donation.create", key, IdempotencyKey.fingerprint_of(payload.model_dump(mode="json")),
+            lambda: start_checkout(payload)
+        )
+    except IdempotencyKey.Conflict as e:
+        return 409, ErrorResponse(message=str(e), code=409)
 
+    if replayed:
+        response["Idempotent-Replayed"] = "true"
+    return status, body
+
+
+def start_checkout(payload: DonationRequestSchema):
+    """Validate the donation and start its checkout at the gateway"""
     try:
         with transaction.atomic():
             payload_dict = payload.model_dump()
@@ -163,7 +234,9 @@ def create_donation(request, payload: DonationRequestSchema):
 
             # Validate exchange rate exists if currencies differ
             if project and payload.currency != project.currency:
-                if not ExchangeRate.get_current_rate():
+                try:
+                    ExchangeRate.cross_rate(payload.currency, project.currency)
+                except ValueError:
                     return 400, ErrorResponse(
                         message="Currency conversion not available at this time",
                         code=400
@@ -181,9 +254,11 @@ def create_donation(request, payload: DonationRequestSchema):
             payment_client = payload.payment_client
 
             if payment_client == Donation.PaymentClientChoices.PAYSTACK:
-                return handle_paystack_payment(payload_dict, callback_url)
+                with span("donation.checkout", gateway="paystack", frequency=payload.frequency):
+                    return handle_paystack_payment(payload_dict, callback_url)
             elif payment_client == Donation.PaymentClientChoices.PAYPAL:
-                return handle_paypal_payment(payload_dict, callback_url)
+                with span("donation.checkout", gateway="paypal", frequency=payload.frequency):
+                    return handle_paypal_payment(payload_dict, callback_url)
             else:
                 return 400, ErrorResponse(message="Invalid payment method", code=400)
 
@@ -213,10 +288,21 @@ def paystack_webhook(request):
 
             # Validate webhook signature
             signature = request.headers.get("X-Paystack-Signature")
-            if not validate_webhook(request.body, signature):
+            with span("webhook.paystack.verify_signature"):
+                valid = validate_webhook(request.body, signature)
+            if not valid:
                 logger.warning("Paystack webhook: Invalid signature")
                 return {"status": "error", "message": "Invalid signature"}
 
+            customer_email = (data.get("customer") or {}).get("email")
+            plan_code = (data.get("plan") or {}).get("plan_code")
+            if json_data.get("event") == "subscription.disable":
+                cancelled = RecurringDonation.cancel(gateway=Donation.PaymentClientChoices.PAYSTACK,
+                                                     plan_code=plan_code, donor_email__iexact=customer_email)
+                logger.info(f"Paystack webhook: Subscription {data.get('subscription_code')} disabled "
+                            f"({cancelled} series)")
+                return {"status": "success" if cancelled else "ignored"}
+
             # Check if payment was successful
             if (data.get("status") != "success" or
                     data.get("gateway_response") not in ["Successful", "Approved", "[Test] Approved"]):
@@ -227,23 +313,47 @@ def paystack_webhook(request):
             reference = data.get("reference")
             donation = Donation.objects.filter(reference=reference).first()
 
+            if not donation and plan_code and customer_email:
+                # Renewal charge of a subscription: a new reference, recorded under the series' first donation
+                ledger = RecurringDonation.objects.select_related("origin").filter(
+                    gateway=Donation.PaymentClientChoices.PAYSTACK, plan_code=plan_code,
+                    donor_email__iexact=customer_email,
+                ).order_by("-started_at").first()
+                if ledger:
+                    original_donation = ledger.origin
+                    with span("webhook.paystack.record_charge", plan_code=plan_code):
+                        Donation.objects.create(
+                            project_id=original_donation.project_id,
+                            donor_email=original_donation.donor_email,
+                            donor_full_name=original_donation.donor_full_name,
+                            amount=Decimal(str(data.get("amount", 0))) / 100,
+                            currency=data.get("currency") or original_donation.currency,
+                            frequency=Donation.FrequencyChoices.MONTHLY,
+                            status=Donation.StatusChoices.COMPLETED,
+                            payment_client=original_donation.payment_client,
+                            payment_plan_code=plan_code,
+                            parent_donation=original_donation,
+                            reference=reference,
+                        )
+                    logger.info(f"Paystack webhook: Recorded renewal {reference} for plan {plan_code}")
+                    return {"status": "success"}
+
             if not donation:
                 logger.warning(f"Paystack webhook: Donation not found for reference {reference}")
                 return {"status": "error", "message": "Donation not found"}
 
-            # Check if already processed
-            if donation.status == Donation.StatusChoices.COMPLETED:
-                logger.info(f"Paystack webhook: Donation {reference} already completed")
-                return {"status": "already_processed"}
-
-            # Process successful payment
-            donation.status = Donation.StatusChoices.COMPLETED
+            # Process successful payment; only the caller that completes it applies it
+            fields = {}
             if donation.project:
-                donation.previous_amount_raised = donation.project.amount_raised
-                donation.current_amount_raised = donation.project.amount_raised \
-                                                 + donation.get_project_amount()
-
-            donation.save()  # This will trigger project amount update via model save method
+                fields["previous_amount_raised"] = donation.project.amount_raised
+                fields["current_amount_raised"] = donation.project.amount_raised + donation.get_project_amount()
+
+            with span("webhook.paystack.complete", donation_id=donation.id):
+                completed = donation.transition(Donation.StatusChoices.COMPLETED, Donation.PAYABLE_STATUSES,
+                                                **fields)
+            if not completed:
+                logger.info(f"Paystack webhook: Donation {reference} already processed")
+                return {"status": "already_processed"}
 
             logger.info(f"Paystack webhook: Successfully processed donation {reference}")
             return {"status": "success"}
@@ -265,8 +375,6 @@ def paypal_webhook(request):
             payload = request.body.decode("utf-8")
             headers = request.headers
 
-            print("i am response payallll")
-            print(payload)
             # Verify webhook signature
             verification_data = {
                 "auth_algo": headers.get("Paypal-Auth-Algo"),
@@ -279,7 +387,9 @@ def paypal_webhook(request):
             }
 
             client = PaypalClient()
-            if not client.verify_webhook_signature(verification_data):
+            with span("webhook.paypal.verify_signature"):
+                valid = client.verify_webhook_signature(verification_data)
+            if not valid:
                 logger.warning("PayPal webhook: Signature verification failed")
                 return {"status": "error", "message": "Verification failed"}
 
@@ -296,6 +406,12 @@ def paypal_webhook(request):
                     logger.warning("PayPal webhook: No agreement_id in payment")
                     return {"status": "ignored"}
 
+                # PayPal redelivers events; the sale id is the charge's reference, unique per donation
+                sale_id = resource.get("id")
+                if not sale_id:
+                    logger.warning("PayPal webhook: No sale id in payment")
+                    return {"status": "ignored"}
+
                 # Find original donation by agreement_id
                 original_donation = Donation.objects.filter(agreement_id=agreement_id).first()
                 if not original_donation:
@@ -303,23 +419,34 @@ def paypal_webhook(request):
                     return {"status": "error", "message": "Original donation not found"}
 
                 # Create recurring payment record
-                recurring_donation = Donation.objects.create(
-                    project=original_donation.project,
-                    donor_email=original_donation.donor_email,
-                    donor_full_name=original_donation.donor_full_name,
-                    amount=Decimal(str(amount)),
-                    currency=currency,
-                    frequency=Donation.FrequencyChoices.MONTHLY,
-                    status=Donation.StatusChoices.COMPLETED,
-                    payment_client=original_donation.payment_client,
-                    payment_plan_code=original_donation.payment_plan_code,
-                    parent_donation=original_donation,
-                    reference=f"{agreement_id}-{timezone.now().strftime('%Y%m%d%H%M%S')}"
-                )
+                try:
+                    with span("webhook.paypal.record_charge", agreement_id=agreement_id), transaction.atomic():
+                        recurring_donation = Donation.objects.create(
+                            project=original_donation.project,
+                            donor_email=original_donation.donor_email,
+                            donor_full_name=original_donation.donor_full_name,
+                            amount=Decimal(str(amount)),
+                            currency=currency,
+                            frequency=Donation.FrequencyChoices.MONTHLY,
+                            status=Donation.StatusChoices.COMPLETED,
+                            payment_client=original_donation.payment_client,
+                            payment_plan_code=original_donation.payment_plan_code,
+                            parent_donation=original_donation,
+                            reference=sale_id,
+                        )
+                except IntegrityError:
+                    # Redelivered: the insert fails before any totals are applied
+                    logger.info(f"PayPal webhook: Sale {sale_id} already recorded")
+                    return {"status": "already_processed"}
 
                 logger.info(f"PayPal webhook: Created recurring donation {recurring_donation.id}")
                 return {"status": "success"}
 
+            if event_type in ("BILLING.AGREEMENT.CANCELLED", "BILLING.SUBSCRIPTION.CANCELLED"):
+                cancelled = RecurringDonation.cancel(agreement_id=resource.get("id"))
+                logger.info(f"PayPal webhook: Agreement {resource.get('id')} cancelled ({cancelled} series)")
+                return {"status": "success" if cancelled else "ignored"}
+
             return {"status": "ignored", "message": f"Unhandled event type: {event_type}"}
 
     except Exception as e:
@@ -359,23 +486,21 @@ def execute_paypal_payment(request, payer_id: str = None,
                 logger.error(f"Donation not found for payment_id={payment_id}, token={token}")
                 return 404, ErrorResponse(message="Donation not found", code=404)
 
-            # Check if already completed
-            if donation.status == Donation.StatusChoices.COMPLETED:
-                return 400, ErrorResponse(message="Payment already completed", code=400)
-
-            # Update donation status
-            donation.status = Donation.StatusChoices.COMPLETED
-
+            fields = {}
             # Set agreement_id for subscriptions
             if token and resp.get("agreement_id"):
-                donation.agreement_id = resp["agreement_id"]
+                fields["agreement_id"] = resp["agreement_id"]
 
             if donation.project:
-                donation.previous_amount_raised = donation.project.amount_raised
-                donation.current_amount_raised = donation.project.amount_raised \
-                                                 + donation.get_project_amount()
-
-            donation.save()  # This will trigger project update
+                fields["previous_amount_raised"] = donation.project.amount_raised
+                fields["current_amount_raised"] = donation.project.amount_raised + donation.get_project_amount()
+
+            # Only the caller that completes it applies it (the webhook may have raced us)
+            with span("paypal.execute.complete", donation_id=donation.id):
+                completed = donation.transition(Donation.StatusChoices.COMPLETED, Donation.PAYABLE_STATUSES,
+                                                **fields)
+            if not completed:
+                return 400, ErrorResponse(message="Payment already completed", code=400)
 
             logger.info(f"PayPal payment executed successfully for donation {donation.id}")
             return 200, {"message": "Payment executed successfully"}
@@ -402,22 +527,10 @@ def donation(request, donation_id: int):
 
 
 @router.get("/donations", response={200: DonationListResponse})
+@decorate_view(read_from_replica)
 def list_donations(request, filters: DonationFilter = Query(...), page: int = 1, page_size: int = 10):
-    donations_qs = Donation.objects.all(
-    ).order_by("-created_at")
-    if filters.search:
-        donations_qs = donations_qs.filter(
-            Q(donor_full_name__icontains=filters.search) | Q(donor_email__icontains=filters.search) | Q(
-                project__title__icontains=filters.search))
-
-    if filters.frequency:
-        donations_qs = donations_qs.filter(frequency__icontains=filters.frequency)
-    if filters.status:
-        status = filters.status.upper()
-        donations_qs = donations_qs.filter(status__icontains=status)
-
-    if filters.payment_method:
-        donations_qs = donations_qs.filter(payment_client__icontains=filters.payment_method)
+    donations_qs = filter_donations(Donation.objects.all(
+    ).order_by("-created_at"), filters)
 
     paginator = Paginator(donations_qs, page_size)
     total = paginator.count
@@ -436,7 +549,69 @@ def list_donations(request, filters: DonationFilter = Query(...), page: int = 1,
     )
 
 
+@router.get("/donations/{reference}/status", auth=None, response={200: DonationStatusResponse, 404: ErrorResponse})
+async def donation_status(request, reference: str):
+    """Payment status by gateway reference, polled by the thank-you page; always read from the primary"""
+    donation = await Donation.objects.filter(reference=reference).only(
+        "reference", "status", "amount", "currency", "payment_completed_at").afirst()
+    if donation is None:
+        return 404, ErrorResponse(message="Donation not found", code=404)
+    return 200, DonationStatusResponse(data=donation)
+
+
+@router.get("/donors/{email}", response={200: DonorResponse, 404: ErrorResponse})
+def get_donor(request, email: str):
+    """Lifetime giving summary for a donor"""
+    try:
+        donor = Donor.objects.get(email=Donor.normalize_email(email))
+        return 200, DonorResponse(data=donor)
+    except Donor.DoesNotExist:
+        return 404, ErrorResponse(message="Donor not found", code=404)
+
+
+@router.get("/donors/{email}/donations", response={200: DonationListResponse, 404: ErrorResponse})
+def list_donor_donations(request, email: str, page: int = 1, page_size: int = 10):
+    """Completed donations of a donor, newest first"""
+    donor = Donor.objects.filter(email=Donor.normalize_email(email)).only("id").first()
+    if not donor:
+        return 404, ErrorResponse(message="Donor not found", code=404)
+
+    paginator = Paginator(Donation.objects.filter(donor=donor).order_by("-created_at"), page_size)
+    try:
+        donations = list(paginator.page(page))
+    except EmptyPage:
+        donations = []
+    return 200, DonationListResponse(
+        data=donations,
+        page=page,
+        total=paginator.count,
+        page_size=page_size,
+        total_pages=paginator.num_pages
+    )
+
+
+@router.get("/donations/export")
+def export_donations(request, filters: DonationFilter = Query(...), start_date: date = None,
+                     end_date: date = None, fmt: Literal["csv", "ndjson"] = "csv"):
+    """
+    Stream filtered donations as CSV or NDJSON for reconciliation.
+    Rows are read in chunks so memory stays flat for any result size.
+    """
+    donations_qs = filter_donations(Donation.objects.order_by("created_at", "id"), filters,
+                                    start_date=start_date, end_date=end_date)
+    rows = donations_qs.values_list(*EXPORT_FIELDS).iterator(chunk_size=2000)
+
+    if fmt == "ndjson":
+        response = StreamingHttpResponse(stream_ndjson(EXPORT_FIELDS, rows),
+                                         content_type="application/x-ndjson")
+    else:
+        response = StreamingHttpResponse(stream_csv(EXPORT_FIELDS, rows), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="donations.{fmt}"'
+    return response
+
+
 @router.get("/donation_metric", response={200: dict})
+@decorate_view(read_from_replica)
 def donation_metric(request):
     now = timezone.now()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -458,39 +633,97 @@ def donation_metric(request):
     }
 
 
+@router.get("/analytics", response={200: DonationAnalyticsResponse, 400: ErrorResponse})
+@decorate_view(read_from_replica)
+def donation_analytics(request, interval: Literal["day", "week", "month"] = "month",
+                       group_by: Literal["project", "currency", "gateway"] = None,
+                       currency: CurrencyCode = "USD",
+                       start: datetime = None, end: datetime = None):
+    """Completed donation counts and totals in `currency` per interval, optionally grouped"""
+    from .analytics import snapshot
+
+    try:
+        buckets = snapshot.series(interval=interval, group_by=group_by, currency=currency, start=start, end=end)
+    except ValueError as e:
+        return 400, ErrorResponse(message=str(e), code=400)
+
+    return 200, DonationAnalyticsResponse(currency=currency, interval=interval, group_by=group_by, data=buckets)
+
+
+@router.get("/recurring/metrics", response={200: RecurringMetricsResponse, 400: ErrorResponse})
+@decorate_view(read_from_replica)
+def recurring_metrics(request, days: int = 30, currency: CurrencyCode = "USD"):
+    """Active recurring donations, MRR and churn over the last `days`, from the recurring ledger"""
+    if days < 1:
+        return 400, ErrorResponse(message="days must be positive", code=400)
+    try:
+        metrics = RecurringDonation.metrics(days=days, currency=currency)
+    except ValueError as e:
+        return 400, ErrorResponse(message=str(e), code=400)
+
+    return 200, RecurringMetricsResponse(data=metrics)
+
+
+@router.get("/gateways/status", response={200: dict})
+def gateways_status(request):
+    """Circuit breaker state of each payment gateway in this worker process"""
+    return 200, {"gateways": gateway_status()}
+
+
 @router.get(
     "/exchange_rate",
     auth=None,
     response={200: ExchangeRatResponse, 400: ErrorResponse,
               404: ErrorResponse, 500: ErrorResponse},
 )
-def exchange_rate(request):
-    """Get exchange rate"""
+async def exchange_rate(request, currency: RateCurrency = "NGN", at: datetime = None):
+    """Get the rate of `currency` against USD in effect now, or at `at`"""
 
-    rate, created = ExchangeRate.objects.get_or_create(
-        id=1,
-        defaults={"usd_to_ngn_rate": 1600, "ngn_to_usd_rate": 0.000625}
-    )
+    rate = await ExchangeRate.objects.filter(currency=currency, is_active=True,
+                                             effective_date__lte=at or timezone.now()).afirst()
+    if rate is None:
+        if at is not None or currency != "NGN":
+            return 404, ErrorResponse(message=f"No {currency} exchange rate in effect at that time", code=404)
+        rate = await ExchangeRate.objects.acreate(currency="NGN", rate=1600)
 
     return 200, ExchangeRatResponse(data=rate)
 
 
 @router.post(
     "/exchange_rate/update",
-    auth=None,
     response={200: ExchangeRatResponse,
-              400: ErrorResponse, 500: ErrorResponse},
+              400: ErrorResponse, 403: ErrorResponse, 500: ErrorResponse},
 )
 def update_exchange_rate(request, payload: UpdateExchangeRateRequest):
-    """Update exchange rate"""
+    """
+    Add a rate to the history, effective now or from `effective_date` (staff only).
+    Backdated rates re-value donations through revalue_donations, so they may reach
+    back at most EXCHANGE_RATE_MAX_BACKDATE_DAYS.
+    """
+    if not request.auth.is_staff:
+        return 403, ErrorResponse(message="Only staff can change exchange rates", code=403)
 
-    rate, created = ExchangeRate.objects.get_or_create(
-        id=1,
-    )
+    value = payload.rate
+    if value is None and payload.currency == "NGN":
+        value = payload.usd_to_ngn_rate
+    if not value or value <= 0:
+        return 400, ErrorResponse(message="Rate must be positive", code=400)
 
-    rate.usd_to_ngn_rate = payload.usd_to_ngn_rate
-    rate.ngn_to_usd_rate = 1 / payload.usd_to_ngn_rate
-    rate.save()
+    now = timezone.now()
+    effective_date = payload.effective_date or now
+    if timezone.is_naive(effective_date):
+        effective_date = timezone.make_aware(effective_date)
+    if effective_date < now - timedelta(days=settings.EXCHANGE_RATE_MAX_BACKDATE_DAYS):
+        return 400, ErrorResponse(
+            message=f"effective_date can be at most {settings.EXCHANGE_RATE_MAX_BACKDATE_DAYS} days in the past",
+            code=400
+        )
+
+    rate = ExchangeRate.objects.create(
+        currency=payload.currency,
+        rate=Decimal(str(value)),
+        effective_date=effective_date,
+    )
 
     return 200, ExchangeRatResponse(data=rate)
 
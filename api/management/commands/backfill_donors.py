@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Donor
+
+
+class Command(BaseCommand):
+    help = "Rebuild donor lifetime aggregates from completed donations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, batch_size=1000, **options):
+        count = Donor.rebuild(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} donors"))
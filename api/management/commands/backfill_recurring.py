@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.models import RecurringDonation
+
+
+class Command(BaseCommand):
+    help = "Rebuild the recurring donation ledger from monthly donations and their renewals"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, batch_size=1000, **options):
+        count = RecurringDonation.rebuild(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} recurring donations"))
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    "gunicorn-sync": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "needafricaapi.wsgi:application", "--worker-class", "sync",
+        "--workers", str(workers), "--bind", f"127.0.0.1:{port}", "--backlog", "4096",
+    ],
+    "uvicorn-async": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "needafricaapi.asgi:application", "--workers", str(workers),
+        "--host", "127.0.0.1", "--port", str(port), "--backlog", "4096", "--no-access-log", "--log-level", "warning",
+    ],
+}
+DEFAULT_PATHS = ["/api/project/", "/api/project/project_stats/", "/api/donation/exchange_rate"]
+
+
+async def read_response(reader):
+    """Status and keep-alive flag of one HTTP/1.1 response; the body is read and discarded"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    version, status = status_line.split(b" ", 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get(b"transfer-encoding") == b"chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get(b"content-length", 0)))
+    keep_alive = version == b"HTTP/1.1" and headers.get(b"connection") != b"close"
+    return int(status), keep_alive
+
+
+async def probe(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+        return (await read_response(reader))[0]
+    finally:
+        writer.close()
+
+
+async def client(port, paths, deadline, result):
+    """One connection issuing requests back to back, reconnecting when the server closes it"""
+    reader = writer = None
+    sent = 0
+    while time.perf_counter() < deadline:
+        path = paths[sent % len(paths)]
+        sent += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: keep-alive\r\n\r\n".encode())
+            status, keep_alive = await read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            result["errors"] += 1
+            keep_alive = False
+            await asyncio.sleep(0.01)
+        else:
+            result["latencies"].append(time.perf_counter() - started)
+            if status >= 400:
+                result["http_errors"] += 1
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, paths, concurrency, seconds):
+    result = {"latencies": [], "errors": 0, "http_errors": 0}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(port, paths, deadline, result) for _ in range(concurrency)))
+    return result
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+class Command(BaseCommand):
+    help = ("Start the app under gunicorn with sync workers and under uvicorn (ASGI, async views), "
+            "load each with many concurrent keep-alive connections and compare throughput and latency. "
+            "Uses the configured DATABASE_URL, e.g. a database filled by generate_data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help=f"Paths to request in turn (default {' '.join(DEFAULT_PATHS)})")
+        parser.add_argument("--servers", default=",".join(SERVERS), help="Comma separated, from: " + ", ".join(SERVERS))
+        parser.add_argument("--workers", type=int, default=4, help="Worker processes per server")
+        parser.add_argument("--concurrency", type=int, default=256, help="Concurrent client connections")
+        parser.add_argument("--duration", type=float, default=15, help="Measured seconds per server")
+        parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before each run")
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, paths=None, servers="", workers=4, concurrency=256, duration=15, warmup=3, port=8765,
+               **options):
+        names = [name.strip() for name in servers.split(",") if name.strip()]
+        unknown = set(names) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"Unknown servers: {', '.join(sorted(unknown))}")
+        paths = paths or DEFAULT_PATHS
+
+        rows = []
+        for name in names:
+            self.stdout.write(f"{name}: {workers} workers, {concurrency} connections, {duration:.0f}s")
+            process = self.start(SERVERS[name](port, workers), port)
+            try:
+                asyncio.run(load(port, paths, min(concurrency, 16), warmup))
+                result = asyncio.run(load(port, paths, concurrency, duration))
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+            rows.append((name, result))
+
+        self.stdout.write("")
+        self.stdout.write(f"{'server':<16} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'errors':>7} {'4xx/5xx':>8}")
+        for name, result in rows:
+            latencies = sorted(result["latencies"])
+            self.stdout.write(
+                f"{name:<16} {len(latencies) / duration:>9.1f} "
+                f"{statistics.median(latencies) * 1000 if latencies else 0:>8.1f} "
+                f"{percentile(latencies, .95) * 1000:>8.1f} {percentile(latencies, .99) * 1000:>8.1f} "
+                f"{result['errors']:>7} {result['http_errors']:>8}")
+
+    def start(self, command, port):
+        env = {**os.environ, "TRACE_SAMPLE_RATE": "0", "LOG_LEVEL": "WARNING"}
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.perf_counter() + 30
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"{command[2]} exited with {process.returncode}")
+            try:
+                asyncio.run(asyncio.wait_for(probe(port, DEFAULT_PATHS[-1]), 5))
+                return process
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                pass
+            time.sleep(0.2)
+        process.kill()
+        raise CommandError(f"{command[2]} did not start listening on port {port}")
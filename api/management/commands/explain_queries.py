@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from api.models import Donation, Project, Subscription, User, Volunteer
+
+
+def query_shapes():
+    """The querysets behind the hot endpoints, as the views build them"""
+    now = timezone.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "donation_metric.month_amount": lambda: Donation.objects.filter(
+            created_at__gte=month_start).order_by().values("amount"),
+        "list_donations.status": lambda: Donation.objects.filter(status="COMPLETED").order_by("-created_at")[:10],
+        "list_donations.all": lambda: Donation.objects.order_by("-created_at")[:10],
+        "reconcile_donations.pending": lambda: Donation.objects.filter(
+            status="PENDING", created_at__lt=now - timedelta(minutes=30)).order_by("created_at")[:100],
+        "list_projects.status": lambda: Project.objects.filter(status="ACTIVE").order_by("-created_at")[:10],
+        "list_projects.all": lambda: Project.objects.order_by("-created_at")[:10],
+        "login.email": lambda: User.by_email("admin@example.com")[:1],
+        "create_subscription.email": lambda: Subscription.objects.filter(email="reader1@example.com")[:1],
+        "create_volunteer.duplicate": lambda: Volunteer.objects.alias(
+            first_name_lower=Lower("first_name"), last_name_lower=Lower("last_name"), role_lower=Lower("role"),
+        ).filter(first_name_lower="first1", last_name_lower="last1", role_lower="lab-tech")[:1],
+    }
+
+
+class Command(BaseCommand):
+    help = ("Print the EXPLAIN plan of each hot endpoint query. Run before and after an index "
+            "migration (e.g. on data from generate_data) to compare plans.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Only these query shapes")
+        parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (PostgreSQL only)")
+
+    def handle(self, names=None, analyze=False, **options):
+        shapes = query_shapes()
+        unknown = set(names or []) - set(shapes)
+        if unknown:
+            raise CommandError(f"Unknown query shapes: {', '.join(sorted(unknown))}")
+
+        explain_options = {"analyze": True} if analyze and connection.vendor == "postgresql" else {}
+        for name, build in shapes.items():
+            if names and name not in names:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(build().explain(**explain_options))
+            self.stdout.write("")
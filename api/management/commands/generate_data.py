@@ -0,0 +1,248 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import CROSS_RATE_PLACES, Donation, Donor, ExchangeRate, Project, ProjectPhoto, Subscription, Volunteer
+
+DOMAIN = "generated.example.org"
+TITLE_PREFIX = "Generated project"
+REFERENCE_PREFIX = "gen-"
+
+STATUS_WEIGHTS = [
+    (Donation.StatusChoices.COMPLETED, 80),
+    (Donation.StatusChoices.PENDING, 8),
+    (Donation.StatusChoices.FAILED, 7),
+    (Donation.StatusChoices.CANCELLED, 3),
+    (Donation.StatusChoices.REFUNDED, 2),
+]
+AMOUNTS = {"USD": [5, 10, 20, 25, 50, 100, 250, 500], "NGN": [2000, 5000, 10000, 20000, 50000, 100000]}
+COUNTRIES = ["Nigeria", "Ghana", "Kenya", "South Africa", "Uganda", "Rwanda", "United Kingdom", "United States"]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at we set instead of stamping now()"""
+    fields = [model._meta.get_field(name) for model in models for name in ("created_at", "updated_at")]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ("Generate production-shaped data for capacity testing: projects with photos, donations "
+            "across currencies/gateways/statuses with recurring chains, volunteers and subscriptions. "
+            "Output is deterministic for a given --seed. Rows are bulk inserted, bypassing "
+            "Donation.save, and the generated projects' totals and donors are recomputed at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--projects", type=int, default=2000)
+        parser.add_argument("--photos-per-project", type=int, default=3)
+        parser.add_argument("--donations", type=int, default=1_000_000)
+        parser.add_argument("--donors", type=int, default=None, help="Distinct donor emails (default donations/8)")
+        parser.add_argument("--recurring-share", type=float, default=0.1,
+                            help="Share of donations that start a monthly chain")
+        parser.add_argument("--months", type=int, default=24, help="History spread over this many months")
+        parser.add_argument("--volunteers", type=int, default=5000)
+        parser.add_argument("--subscriptions", type=int, default=50000)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--clear", action="store_true", help="Delete previously generated rows first")
+
+    def handle(self, projects=2000, photos_per_project=3, donations=1_000_000, donors=None, recurring_share=0.1,
+               months=24, volunteers=5000, subscriptions=50000, seed=1, batch_size=5000, clear=False, **options):
+        if clear:
+            self.clear()
+        elif Donation.objects.filter(reference__startswith=REFERENCE_PREFIX).exists():
+            raise CommandError("Generated data already exists, rerun with --clear")
+
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = timezone.now().replace(microsecond=0)
+        self.span_seconds = int(timedelta(days=30 * months).total_seconds())
+        self.usd_to_ngn = ExchangeRate.rate_at("NGN") or Decimal("1600")
+
+        started = time.perf_counter()
+        with explicit_timestamps(Project, ProjectPhoto, Donation, Volunteer, Subscription):
+            project_rows = self.step("projects", self.generate_projects, projects, photos_per_project)
+            self.step("donations", self.generate_donations, project_rows, donations,
+                      donors or max(1, donations // 8), recurring_share)
+            self.step("volunteers", self.generate_volunteers, volunteers)
+            self.step("subscriptions", self.generate_subscriptions, subscriptions)
+
+        # Only the generated rows: real projects and donors keep their totals
+        self.step("project totals", Project.recompute_totals,
+                  projects=Project.objects.filter(title__startswith=TITLE_PREFIX))
+        self.step("donors", Donor.rebuild, batch_size=batch_size,
+                  donations=Donation.objects.filter(donor_email__endswith=f"@{DOMAIN}"))
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s"))
+
+    def step(self, label, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        count = len(result) if isinstance(result, list) else result
+        self.stdout.write(f"{label}: {count} in {time.perf_counter() - started:.1f}s")
+        return result
+
+    def clear(self):
+        generated_projects = Project.objects.filter(title__startswith=TITLE_PREFIX)
+        Donation.objects.filter(reference__startswith=REFERENCE_PREFIX).delete()
+        ProjectPhoto.objects.filter(project__in=generated_projects).delete()
+        generated_projects.delete()
+        Donor.objects.filter(email__endswith=f"@{DOMAIN}").delete()
+        Volunteer.objects.filter(email__endswith=f"@{DOMAIN}").delete()
+        Subscription.objects.filter(email__endswith=f"@{DOMAIN}").delete()
+
+    def timestamp(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.span_seconds))
+
+    def bulk_insert(self, model, objects):
+        with transaction.atomic():
+            return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def generate_projects(self, count, photos_per_project):
+        rng = self.rng
+        categories = Project.CategoryChoices.values
+        statuses = [Project.StatusChoices.ACTIVE] * 7 + [Project.StatusChoices.DRAFT, Project.StatusChoices.COMPLETED,
+                                                         Project.StatusChoices.CANCELLED]
+        projects = []
+        for i in range(count):
+            created = self.timestamp()
+            currency = rng.choice(["USD", "USD", "NGN"])
+            target = rng.choice([5000, 10000, 25000, 50000, 100000])
+            projects.append(Project(
+                title=f"{TITLE_PREFIX} {i}",
+                summary="Synthetic project for capacity testing",
+                currency=currency,
+                target_amount=target * (1000 if currency == "NGN" else 1),
+                remaining_amount=target * (1000 if currency == "NGN" else 1),
+                category=rng.choice(categories),
+                location=rng.choice(COUNTRIES),
+                status=rng.choice(statuses),
+                deadline=(created + timedelta(days=rng.randint(60, 720))).date(),
+                milestones=[], goals=[], donation_supports=[],
+                created_at=created, updated_at=created,
+            ))
+        projects = self.bulk_insert(Project, projects)
+
+        photos = [
+            ProjectPhoto(project=project, name=f"Delivery {n + 1}",
+                         image=f"project_photos/generated/{project.pk}-{n}.jpg",
+                         created_at=project.created_at, updated_at=project.created_at)
+            for project in projects for n in range(photos_per_project)
+        ]
+        for start in range(0, len(photos), self.batch_size):
+            self.bulk_insert(ProjectPhoto, photos[start:start + self.batch_size])
+        return [(project.pk, project.currency, project.title) for project in projects]
+
+    def donation(self, index, project, email, full_name, created, **fields):
+        project_id, project_currency, title = project
+        currency = fields.pop("currency", None) or (project_currency if self.rng.random() < 0.8 else
+                                                    self.rng.choice(["USD", "NGN"]))
+        amount = Decimal(fields.pop("amount", None) or self.rng.choice(AMOUNTS[currency]))
+        if currency == project_currency:
+            converted, rate = amount, None
+        elif currency == "USD":
+            converted, rate = amount * self.usd_to_ngn, self.usd_to_ngn
+        else:
+            rate = (1 / self.usd_to_ngn).quantize(CROSS_RATE_PLACES)
+            converted = (amount * rate).quantize(Decimal("0.01"))
+        status = fields.pop("status", None) or self.rng.choices(
+            [s for s, _ in STATUS_WEIGHTS], weights=[w for _, w in STATUS_WEIGHTS])[0]
+        return Donation(
+            project_id=project_id, project_currency=project_currency, project_title=title,
+            donor_email=email, donor_full_name=full_name,
+            amount=amount, currency=currency, project_currency_amount=converted, exchange_rate_used=rate,
+            status=status,
+            payment_client=Donation.PaymentClientChoices.PAYSTACK if currency == "NGN" or self.rng.random() < 0.6
+            else Donation.PaymentClientChoices.PAYPAL,
+            reference=f"{REFERENCE_PREFIX}{index}",
+            payment_completed_at=created if status == Donation.StatusChoices.COMPLETED else None,
+            created_at=created, updated_at=created,
+            **fields,
+        )
+
+    def generate_donations(self, projects, count, donor_count, recurring_share):
+        """
+        One-time donations plus monthly chains: a parent carrying the agreement and one
+        child per later month, linked through parent_donation.
+        """
+        rng = self.rng
+        generated = 0
+        while generated < count:
+            singles, chains = [], []
+            while generated < count and len(singles) + sum(len(c[1]) + 1 for c in chains) < self.batch_size:
+                donor = rng.randrange(donor_count)
+                email, full_name = f"donor{donor}@{DOMAIN}", f"Donor {donor}"
+                project = rng.choice(projects)
+                created = self.timestamp()
+
+                if rng.random() < recurring_share:
+                    parent = self.donation(generated, project, email, full_name, created,
+                                           frequency=Donation.FrequencyChoices.MONTHLY,
+                                           status=Donation.StatusChoices.COMPLETED,
+                                           agreement_id=f"{REFERENCE_PREFIX}agreement-{generated}")
+                    parent.payment_plan_code = f"PLN_gen_{parent.currency}_{parent.amount}"
+                    # Donors churn at a random month before today
+                    months_active = rng.randint(0, max(0, (self.now - created).days // 30))
+                    children = []
+                    for month in range(1, min(months_active, count - generated - 1) + 1):
+                        children.append((generated + month, created + timedelta(days=30 * month)))
+                    chains.append((parent, children))
+                    generated += 1 + len(children)
+                else:
+                    singles.append(self.donation(generated, project, email, full_name, created))
+                    generated += 1
+
+            self.bulk_insert(Donation, singles + [parent for parent, _ in chains])
+            recurring = [
+                self.donation(index, project, parent.donor_email, parent.donor_full_name, created,
+                              currency=parent.currency, amount=parent.amount,
+                              frequency=Donation.FrequencyChoices.MONTHLY,
+                              payment_plan_code=parent.payment_plan_code, parent_donation_id=parent.pk)
+                for parent, children in chains
+                for project in [(parent.project_id, parent.project_currency, parent.project_title)]
+                for index, created in children
+            ]
+            if recurring:
+                self.bulk_insert(Donation, recurring)
+            if self.stdout.isatty():
+                self.stdout.write(f"  donations {generated}/{count}", ending="\r")
+        return generated
+
+    def generate_volunteers(self, count):
+        rng = self.rng
+        roles = [role for role, _ in Volunteer.ROLE_CHOICES]
+        availability = [value for value, _ in Volunteer.AVAILABILITY_CHOICES]
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for i in range(start, min(start + self.batch_size, count)):
+                created = self.timestamp()
+                batch.append(Volunteer(
+                    first_name=f"First{i}", last_name=f"Last{i}", age=rng.randint(18, 70),
+                    email=f"volunteer{i}@{DOMAIN}", country=rng.choice(COUNTRIES),
+                    role=rng.choice(roles), availability=rng.choice(availability),
+                    created_at=created, updated_at=created,
+                ))
+            self.bulk_insert(Volunteer, batch)
+        return count
+
+    def generate_subscriptions(self, count):
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for i in range(start, min(start + self.batch_size, count)):
+                created = self.timestamp()
+                batch.append(Subscription(email=f"reader{i}@{DOMAIN}", active=self.rng.random() < 0.9,
+                                          created_at=created, updated_at=created))
+            self.bulk_insert(Subscription, batch)
+        return count
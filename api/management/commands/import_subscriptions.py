@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.models import Subscription
+from core.utils import read_csv_or_ndjson
+
+
+class Command(BaseCommand):
+    help = "Bulk import newsletter subscriptions from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument("--format", dest="fmt", choices=["csv", "ndjson"], default=None,
+                            help="Input format (defaults to the file extension)")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, path, fmt=None, chunk_size=1000, **options):
+        fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+
+        if path == "-":
+            result = self._import(sys.stdin, fmt, chunk_size)
+        else:
+            with open(path, encoding="utf-8-sig", newline="") as lines:
+                result = self._import(lines, fmt, chunk_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"received={result['received']} created={result['created']} invalid={result['invalid']}"
+        ))
+
+    @staticmethod
+    def _import(lines, fmt, chunk_size):
+        emails = (record.get("email") for record in read_csv_or_ndjson(lines, fmt))
+        return Subscription.bulk_import(emails, chunk_size=chunk_size)
@@ -0,0 +1,182 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+
+from api.models import Donation, Donor, GatewayPlan, Project
+from core.gateway_stubs import StubPaypal, StubPaystack
+
+AMOUNTS = [5, 10, 25, 50, 100]
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries on the current thread's connection"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = ("Run create_donation -> gateway -> webhook/execute flows against local stand-in "
+            "gateways and report throughput, latency, query counts and total consistency. "
+            "Use a scratch Postgres database; SQLite serializes writers above concurrency 1.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--donations", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--paypal-share", type=float, default=0.3)
+        parser.add_argument("--monthly-share", type=float, default=0.2)
+        parser.add_argument("--latency-ms", type=int, default=50, help="Stand-in gateway latency")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Stand-in gateway 503 rate")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--keep", action="store_true", help="Keep the load test project and donations")
+
+    def handle(self, donations=200, concurrency=8, paypal_share=0.3, monthly_share=0.2, latency_ms=50,
+               failure_rate=0.0, seed=1, keep=False, **options):
+        rng = random.Random(seed)
+        flows = [
+            {
+                "index": i,
+                "gateway": "PAYPAL" if rng.random() < paypal_share else "PAYSTACK",
+                "frequency": "MONTHLY" if rng.random() < monthly_share else "ONCE",
+                "amount": rng.choice(AMOUNTS),
+            }
+            for i in range(donations)
+        ]
+
+        self.paystack = StubPaystack(latency_ms=latency_ms, failure_rate=failure_rate, seed=seed)
+        self.paypal = StubPaypal(latency_ms=latency_ms, failure_rate=failure_rate, seed=seed)
+        existing_plans = set(GatewayPlan.objects.values_list("id", flat=True))
+
+        with self.paystack, self.paypal, override_settings(
+            PAYSTACK_API_URL=f"{self.paystack.url}/",
+            PAYSTACK_SECRET_KEY=self.paystack.secret_key,
+            PAYPAL_API_URL=self.paypal.url,
+            PAYPAL_PAYMENT_MODE="sandbox",
+            PAYPAL_CLIENT_ID="stub-client",
+            PAYPAL_SECRET_KEY="stub-secret",
+            PAYPAL_WEBHOOK_ID=self.paypal.webhook_id,
+            FRONTEND_URL="http://frontend.invalid",
+        ):
+            GatewayPlan._cache.clear()
+            self.project = Project.objects.create(
+                title=f"Load test {int(time.time())}", currency=Project.CurrencyChoices.USD,
+                status=Project.StatusChoices.ACTIVE, target_amount=10 ** 9,
+            )
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(self.run_flow, flows))
+            elapsed = time.perf_counter() - started
+
+            self.report(results, elapsed, concurrency)
+
+            if not keep:
+                self.project.delete()
+                Donor.objects.filter(email__startswith="loadtest+").delete()
+            GatewayPlan.objects.exclude(id__in=existing_plans).delete()
+            GatewayPlan._cache.clear()
+
+    def run_flow(self, flow):
+        client = Client()
+        queries = QueryCounter()
+        result = {"flow": flow, "ok": False, "stage": "checkout", "checkout_ms": 0.0, "confirm_ms": 0.0}
+        payload = {
+            "project_id": self.project.id,
+            "donor_email": f"loadtest+{flow['index']}@example.com",
+            "donor_full_name": f"Load Test {flow['index']}",
+            "frequency": flow["frequency"],
+            "payment_client": flow["gateway"],
+            "amount": flow["amount"],
+            "currency": "USD",
+        }
+
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            response = client.post("/api/donation/donations", payload, content_type="application/json")
+            result["checkout_ms"] = (time.perf_counter() - started) * 1000
+            if response.status_code == 201:
+                result["stage"] = "confirm"
+                started = time.perf_counter()
+                result["ok"] = self.confirm(client, flow, response.json()["checkout_url"])
+                result["confirm_ms"] = (time.perf_counter() - started) * 1000
+
+        result["queries"] = queries.count
+        return result
+
+    def confirm(self, client, flow, checkout_url):
+        """Play the donor's return / the gateway's webhook for a created checkout"""
+        query = parse_qs(urlparse(checkout_url).query)
+
+        if flow["gateway"] == "PAYSTACK":
+            reference = checkout_url.rstrip("/").rsplit("/", 1)[-1]
+            body, signature = self.paystack.webhook(reference)
+            response = client.post("/api/donation/paystack/webhook", body, content_type="application/json",
+                                   HTTP_X_PAYSTACK_SIGNATURE=signature)
+            return response.json().get("status") == "success"
+
+        if flow["frequency"] == "ONCE":
+            response = client.get("/api/donation/execute_paypal/payment",
+                                  {"payment_id": query["paymentId"][0], "payer_id": "STUBPAYER"})
+            return response.status_code == 200
+
+        token = query["token"][0]
+        response = client.get("/api/donation/execute_paypal/payment", {"token": token})
+        if response.status_code != 200:
+            return False
+        # First recurring charge arrives as a signed webhook
+        agreement_id = self.paypal.agreements[token]["id"]
+        body, headers = self.paypal.webhook(agreement_id, flow["amount"])
+        extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()}
+        response = client.post("/api/donation/paypal/webhook", body, content_type="application/json", **extra)
+        return response.json().get("status") == "success"
+
+    def report(self, results, elapsed, concurrency):
+        ok = [r for r in results if r["ok"]]
+        failed_checkout = sum(1 for r in results if r["stage"] == "checkout")
+        totals = [r["checkout_ms"] + r["confirm_ms"] for r in ok]
+        checkout = [r["checkout_ms"] for r in results]
+        confirm = [r["confirm_ms"] for r in ok]
+        queries = [r["queries"] for r in results]
+
+        self.project.refresh_from_db()
+        completed_sum = Donation.objects.filter(
+            project=self.project, status=Donation.StatusChoices.COMPLETED
+        ).aggregate(total=Sum("project_currency_amount"))["total"] or 0
+
+        write = self.stdout.write
+        write(f"flows={len(results)} ok={len(ok)} failed_checkout={failed_checkout} "
+              f"failed_confirm={len(results) - len(ok) - failed_checkout} concurrency={concurrency}")
+        write(f"elapsed={elapsed:.2f}s throughput={len(results) / elapsed:.1f} flows/s")
+        write(f"end-to-end p50={percentile(totals, 50):.1f}ms p99={percentile(totals, 99):.1f}ms")
+        write(f"checkout   p50={percentile(checkout, 50):.1f}ms p99={percentile(checkout, 99):.1f}ms")
+        write(f"confirm    p50={percentile(confirm, 50):.1f}ms p99={percentile(confirm, 99):.1f}ms")
+        if queries:
+            write(f"db queries per flow mean={statistics.mean(queries):.1f} max={max(queries)} "
+                  f"total={sum(queries)}")
+        write(f"gateway requests paystack={self.paystack.request_count} ({self.paystack.failure_count} failed) "
+              f"paypal={self.paypal.request_count} ({self.paypal.failure_count} failed)")
+
+        if self.project.amount_raised == completed_sum:
+            write(self.style.SUCCESS(f"totals match: amount_raised={self.project.amount_raised}"))
+        else:
+            write(self.style.ERROR(f"totals MISMATCH: amount_raised={self.project.amount_raised} "
+                                   f"completed donations={completed_sum}"))
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import statistics
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+# core.middleware classes and the Django middleware they specialise
+SITE_MIDDLEWARE = {
+    "core.middleware.SiteSessionMiddleware": "django.contrib.sessions.middleware.SessionMiddleware",
+    "core.middleware.SiteCsrfViewMiddleware": "django.middleware.csrf.CsrfViewMiddleware",
+    "core.middleware.SiteAuthenticationMiddleware": "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.SiteMessageMiddleware": "django.contrib.messages.middleware.MessageMiddleware",
+    "core.middleware.SiteXFrameOptionsMiddleware": "django.middleware.clickjacking.XFrameOptionsMiddleware",
+}
+
+
+def full_middleware():
+    """The stack before the API profile: every browser middleware on every path, CommonMiddleware twice"""
+    middleware = [SITE_MIDDLEWARE.get(path, path) for path in settings.MIDDLEWARE]
+    session = middleware.index(SITE_MIDDLEWARE["core.middleware.SiteSessionMiddleware"])
+    middleware.insert(session + 1, "django.middleware.common.CommonMiddleware")
+    return middleware
+
+
+def time_wsgi(path, requests):
+    handler = WSGIHandler()
+    timings = []
+    for _ in range(requests):
+        environ = {"PATH_INFO": path, "REQUEST_METHOD": "GET"}
+        setup_testing_defaults(environ)
+        started = time.perf_counter()
+        b"".join(handler(environ, lambda status, headers, exc_info=None: None))
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def asgi_request(handler, path):
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": [(b"host", b"testserver")], "http_version": "1.1", "scheme": "http",
+             "server": ("testserver", 80), "client": ("127.0.0.1", 0)}
+    body = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = asyncio.Event()
+
+    async def receive():
+        if body:
+            return body.pop()
+        await sent.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            sent.set()
+
+    await handler(scope, receive, send)
+
+
+def time_asgi(path, requests):
+    handler = ASGIHandler()
+
+    async def run():
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            await asgi_request(handler, path)
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    return asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = ("Time requests to an API path through the full browser middleware stack, the current API "
+            "profile and no middleware at all, under both the WSGI and the ASGI handler, in process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/donation/gateways/status",
+                            help="API path to request (the default answers 401 without touching the database)")
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, path="/api/donation/gateways/status", requests=2000, **options):
+        profiles = {"full": full_middleware(), "api profile": list(settings.MIDDLEWARE), "none": []}
+        results = {}
+        # 401s would otherwise log a warning per request
+        logging.disable(logging.WARNING)
+        try:
+            for name, middleware in profiles.items():
+                with override_settings(MIDDLEWARE=middleware):
+                    time_wsgi(path, 50)
+                    wsgi = statistics.median(time_wsgi(path, requests)) * 1e6
+                    time_asgi(path, 50)
+                    asgi = statistics.median(time_asgi(path, requests)) * 1e6
+                results[name] = (wsgi, asgi)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(f"GET {path}, median of {requests} requests (us)")
+        self.stdout.write(f"  {'profile':<12} {'wsgi':>9} {'asgi':>9}")
+        for name, (wsgi, asgi) in results.items():
+            self.stdout.write(f"  {name:<12} {wsgi:>9.1f} {asgi:>9.1f}")
+        full, lean = results["full"], results["api profile"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved per API request: {full[0] - lean[0]:.1f}us under WSGI, {full[1] - lean[1]:.1f}us under ASGI"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key responses and abandoned in-progress keys (run periodically, e.g. hourly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, batch_size=1000, **options):
+        count = IdempotencyKey.purge(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired idempotency keys"))
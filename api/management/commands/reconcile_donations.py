@@ -0,0 +1,117 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import cached_property
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Donation
+from core.clients import PaymentError, PaypalClient, PaystackClient
+from core.utils import chunked
+
+COMPLETED = "completed"
+FAILED = "failed"
+EXPIRED = "expired"
+PENDING = "pending"
+ERROR = "error"
+
+PAYSTACK_FAILED = {"failed", "reversed"}
+PAYPAL_FAILED = {"failed", "canceled", "expired"}
+
+
+class Command(BaseCommand):
+    help = "Verify stale PENDING donations against Paystack/PayPal and complete or expire them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=30,
+                            help="Only check donations pending for at least this many minutes")
+        parser.add_argument("--expire-after", type=int, default=48,
+                            help="Cancel donations still unpaid after this many hours")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent gateway requests")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--limit", type=int, default=None)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, older_than=30, expire_after=48, workers=8, batch_size=100, limit=None,
+               dry_run=False, **options):
+        now = timezone.now()
+        self.expire_before = now - timedelta(hours=expire_after)
+
+        queryset = Donation.objects.filter(
+            status=Donation.StatusChoices.PENDING,
+            created_at__lt=now - timedelta(minutes=older_than),
+        ).order_by("created_at").only("id", "reference", "payment_client", "created_at")
+        if limit:
+            queryset = queryset[:limit]
+
+        counts = {COMPLETED: 0, FAILED: 0, EXPIRED: 0, PENDING: 0, ERROR: 0}
+        checked = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for batch in chunked(queryset.iterator(chunk_size=batch_size), batch_size):
+                outcomes = list(pool.map(self.check, batch))
+                checked += len(batch)
+                for outcome, _, _ in outcomes:
+                    counts[outcome] += 1
+                if not dry_run:
+                    self.apply(outcomes)
+
+        elapsed = time.monotonic() - started
+        rate = checked / elapsed if elapsed else 0
+        summary = " ".join(f"{name}={count}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"checked={checked} in {elapsed:.2f}s ({rate:.1f}/s) {summary}" + (" (dry run)" if dry_run else "")
+        ))
+
+    @cached_property
+    def paystack(self):
+        return PaystackClient()
+
+    @cached_property
+    def paypal(self):
+        return PaypalClient()
+
+    def check(self, donation):
+        """Ask the gateway about one donation; returns (outcome, donation, reason)"""
+        expired = donation.created_at < self.expire_before
+        try:
+            if not donation.reference:
+                state = None
+            elif donation.payment_client == Donation.PaymentClientChoices.PAYSTACK:
+                state = self.paystack.verify_transaction(donation.reference)["data"]["status"]
+                if state == "success":
+                    return COMPLETED, donation, state
+                if state in PAYSTACK_FAILED:
+                    return FAILED, donation, f"Paystack status: {state}"
+            elif donation.reference.startswith(("PAY-", "PAYID-")):
+                state = self.paypal.get_payment(donation.reference)["state"]
+                if state == "approved":
+                    return COMPLETED, donation, state
+                if state in PAYPAL_FAILED:
+                    return FAILED, donation, f"PayPal state: {state}"
+            else:
+                # Subscription tokens can't be looked up before the agreement is executed
+                state = None
+        except PaymentError as e:
+            if not expired:
+                return ERROR, donation, str(e)
+            state = str(e)
+
+        if expired:
+            return EXPIRED, donation, f"Unpaid after expiry ({state or 'no gateway record'})"
+        return PENDING, donation, state
+
+    def apply(self, outcomes):
+        completed = [donation.pk for outcome, donation, _ in outcomes if outcome == COMPLETED]
+        if completed:
+            Donation.complete_many(completed)
+
+        for outcome, donation, reason in outcomes:
+            if outcome in (FAILED, EXPIRED):
+                status = Donation.StatusChoices.FAILED if outcome == FAILED \
+                    else Donation.StatusChoices.CANCELLED
+                Donation.objects.filter(pk=donation.pk, status=Donation.StatusChoices.PENDING).update(
+                    status=status, failure_reason=reason, updated_at=timezone.now()
+                )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from api.models import Donation
+
+
+class Command(BaseCommand):
+    help = "Re-convert cross-currency donations at the exchange rate in effect when each was made"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=parse_datetime, default=None,
+                            help="Only donations created at or after this ISO datetime")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, since=None, batch_size=1000, **options):
+        count = Donation.revalue(since=since, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Revalued {count} donations"))
@@ -0,0 +1,66 @@
+import json
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from core.querylog import WATCHED_TABLES, logger as slow_query_logger
+
+
+class Command(BaseCommand):
+    help = ("Aggregate slow query log lines (JSON logs with SLOW_QUERY_MS set) by SQL fingerprint, "
+            "rank them by total time and flag sequential scans on "
+            f"{', '.join(WATCHED_TABLES)}.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="Log files to read (default stdin)")
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--show-plans", action="store_true", help="Print the captured plan of each offender")
+
+    def handle(self, paths=None, top=20, show_plans=False, **options):
+        groups = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "call_sites": defaultdict(int),
+                                      "seq_scans": set(), "plan": None, "sql": None})
+        for entry in self.entries(paths):
+            group = groups[entry["fingerprint"]]
+            group["sql"] = entry["sql"]
+            group["count"] += 1
+            group["total_ms"] += entry["duration_ms"]
+            group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+            group["call_sites"][entry.get("call_site") or "(outside api/)"] += 1
+            group["seq_scans"].update(entry.get("seq_scans") or [])
+            group["plan"] = entry.get("plan") or group["plan"]
+
+        if not groups:
+            self.stdout.write("No slow queries found")
+            return
+
+        ranked = sorted(groups.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:top]
+        for fingerprint, group in ranked:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{fingerprint}  total={group['total_ms']:.1f}ms count={group['count']} "
+                f"mean={group['total_ms'] / group['count']:.1f}ms max={group['max_ms']:.1f}ms"))
+            if group["seq_scans"]:
+                self.stdout.write(self.style.WARNING(f"  sequential scan on {', '.join(sorted(group['seq_scans']))}"))
+            for site, count in sorted(group["call_sites"].items(), key=lambda item: -item[1]):
+                self.stdout.write(f"  {count:>6}x {site}")
+            self.stdout.write(f"  {group['sql'][:500]}")
+            if show_plans and group["plan"]:
+                self.stdout.write("  plan:\n    " + group["plan"].replace("\n", "\n    "))
+            self.stdout.write("")
+
+    def entries(self, paths):
+        for path in paths or ["-"]:
+            lines = sys.stdin if path == "-" else open(path, encoding="utf-8")
+            try:
+                for line in lines:
+                    if not line.startswith("{"):
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("logger") == slow_query_logger.name and "fingerprint" in entry:
+                        yield entry
+            finally:
+                if lines is not sys.stdin:
+                    lines.close()
@@ -0,0 +1,100 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Heavy optional stacks that must only load when an endpoint needs them
+DEFERRED_MODULES = ["weasyprint", "paypalrestsdk", "cloudinary", "numpy"]
+
+# Runs in a fresh interpreter: boot the WSGI app, serve one request, report timings and loaded modules
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "needafricaapi.settings")
+from django.core.wsgi import get_wsgi_application
+from wsgiref.util import setup_testing_defaults
+application = get_wsgi_application()
+booted = time.perf_counter()
+environ = {"PATH_INFO": sys.argv[1], "REQUEST_METHOD": "GET"}
+setup_testing_defaults(environ)
+status = []
+b"".join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+served = time.perf_counter()
+print(json.dumps({"boot_ms": (booted - started) * 1000, "first_request_ms": (served - started) * 1000,
+                  "status": status[0], "modules": sorted(m for m in sys.modules if "." not in m)}))
+"""
+
+
+def parse_importtime(stderr):
+    """(total ms of top-level imports, {module: self ms}) from `python -X importtime` output"""
+    total, self_ms = 0.0, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        self_ms[name.strip()] = int(own) / 1000
+        if not name.startswith("  "):
+            total += int(cumulative) / 1000
+    return total, self_ms
+
+
+class Command(BaseCommand):
+    help = ("Measure worker startup in fresh interpreters: import time (-X importtime), time to a booted "
+            "WSGI app and time to the first response. Fails when a threshold is exceeded or a deferred "
+            f"module ({', '.join(DEFERRED_MODULES)}) is imported during startup.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/project/project_stats/", help="Path of the first request")
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=15, help="Slowest modules to list by own import time")
+        parser.add_argument("--max-import-ms", type=float, default=None)
+        parser.add_argument("--max-first-request-ms", type=float, default=None)
+        parser.add_argument("--allow", nargs="*", default=[], help="Deferred modules allowed to load")
+
+    def handle(self, path="/api/project/project_stats/", runs=5, top=15, max_import_ms=None,
+               max_first_request_ms=None, allow=(), **options):
+        env = {**os.environ, "TRACE_SAMPLE_RATE": "0", "LOG_LEVEL": "WARNING"}
+        samples, self_ms = [], {}
+        for _ in range(runs):
+            started = time.perf_counter()
+            process = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE, path], cwd=settings.BASE_DIR,
+                                     env=env, capture_output=True, text=True)
+            process_ms = (time.perf_counter() - started) * 1000
+            if process.returncode:
+                raise CommandError(f"Startup probe failed:\n{process.stderr[-3000:]}")
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            result["process_ms"] = process_ms
+            result["import_ms"], run_self_ms = parse_importtime(process.stderr)
+            for name, ms in run_self_ms.items():
+                self_ms.setdefault(name, []).append(ms)
+            samples.append(result)
+
+        medians = {key: statistics.median(sample[key] for sample in samples)
+                   for key in ("import_ms", "boot_ms", "first_request_ms", "process_ms")}
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Startup, median of {runs} runs (first request {path} -> "
+                                                     f"{samples[0]['status']})"))
+        for key, value in medians.items():
+            self.stdout.write(f"  {key:<18} {value:8.1f}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Slowest modules by own import time"))
+        slowest = sorted(((statistics.median(values), name) for name, values in self_ms.items()), reverse=True)
+        for ms, name in slowest[:top]:
+            self.stdout.write(f"  {ms:8.1f} ms  {name}")
+
+        failures = []
+        loaded = set(samples[0]["modules"])
+        for module in DEFERRED_MODULES:
+            if module in loaded and module not in allow:
+                failures.append(f"{module} was imported during startup")
+        if max_import_ms is not None and medians["import_ms"] > max_import_ms:
+            failures.append(f"import time {medians['import_ms']:.1f}ms > {max_import_ms:.1f}ms")
+        if max_first_request_ms is not None and medians["first_request_ms"] > max_first_request_ms:
+            failures.append(f"time to first request {medians['first_request_ms']:.1f}ms > {max_first_request_ms:.1f}ms")
+        if failures:
+            raise CommandError("Startup regression: " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Startup within limits"))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_volunteer_email_volunteer_phone_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Donor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('full_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('lifetime_totals', models.JSONField(blank=True, default=dict, help_text='Completed amount per currency, e.g. {"USD": "50.00"}')),
+                ('donation_count', models.PositiveIntegerField(default=0)),
+                ('first_donation_at', models.DateTimeField(blank=True, null=True)),
+                ('last_donation_at', models.DateTimeField(blank=True, null=True)),
+                ('is_recurring', models.BooleanField(default=False)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='donor',
+            field=models.ForeignKey(blank=True, help_text='Set once the donation completes', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='donations', to='api.donor'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_donor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GatewayPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('gateway', models.CharField(choices=[('PAYSTACK', 'Paystack'), ('PAYPAL', 'PayPal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(max_length=3)),
+                ('interval', models.CharField(default='monthly', max_length=20)),
+                ('plan_code', models.CharField(help_text='Paystack plan_code or PayPal plan id', max_length=255)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('gateway', 'amount', 'currency', 'interval'), name='unique_gateway_plan')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:35
+
+import api.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_endpoint_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='volunteer',
+            name='cv',
+            field=models.FileField(storage=api.utils.retrieve_storage, upload_to='volunteer_cvs/'),
+        ),
+    ]
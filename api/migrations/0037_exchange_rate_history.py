@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:42
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def reactivate_superseded_rates(apps, schema_editor):
+    """
+    Saving a rate used to deactivate every other one, so inactive rows are history, not retractions.
+    The active rate was rewritten in place without moving its effective_date: date it from its last
+    write so it stays the current rate, and reactivate only rows dated before that. Rows dated after
+    it were never in use and stay inactive.
+    """
+    ExchangeRate = apps.get_model('api', 'ExchangeRate')
+    active = ExchangeRate.objects.filter(is_active=True)
+    cutoff = active.aggregate(last_write=Max('updated_at'))['last_write']
+    active.update(effective_date=F('updated_at'))
+
+    superseded = ExchangeRate.objects.filter(is_active=False)
+    if cutoff is not None:
+        superseded = superseded.filter(effective_date__lt=cutoff)
+    superseded.update(is_active=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_volunteer_cv_storage_callable'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exchangerate',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Cleared to retract a rate entered in error'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangerate',
+            index=models.Index(fields=['is_active', 'effective_date'], name='exchange_rate_effective_idx'),
+        ),
+        migrations.RunPython(reactivate_superseded_rates, migrations.RunPython.noop),
+    ]
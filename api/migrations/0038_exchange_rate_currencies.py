@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def invert_ngn_to_usd_rates(Donation, places):
+    # A handful of distinct rates, inverted in Python: SQLite would divide the integers
+    donations = Donation.objects.filter(currency='NGN', project_currency='USD', exchange_rate_used__gt=0)
+    for rate in list(donations.order_by().values_list('exchange_rate_used', flat=True).distinct()):
+        donations.filter(exchange_rate_used=rate).update(exchange_rate_used=(1 / rate).quantize(places))
+
+
+def rates_per_currency(apps, schema_editor):
+    ExchangeRate = apps.get_model('api', 'ExchangeRate')
+    ExchangeRate.objects.update(currency='NGN', rate=F('usd_to_ngn_rate'))
+    # exchange_rate_used held NGN per USD in both directions; it is now project currency per donation currency
+    invert_ngn_to_usd_rates(apps.get_model('api', 'Donation'), Decimal('0.0000000001'))
+
+
+def usd_to_ngn_rates(apps, schema_editor):
+    ExchangeRate = apps.get_model('api', 'ExchangeRate')
+    ExchangeRate.objects.exclude(currency='NGN').delete()
+    for rate in ExchangeRate.objects.all():
+        rate.usd_to_ngn_rate = rate.rate
+        rate.ngn_to_usd_rate = (1 / rate.rate).quantize(Decimal('0.0001'))
+        rate.save(update_fields=['usd_to_ngn_rate', 'ngn_to_usd_rate'])
+    invert_ngn_to_usd_rates(apps.get_model('api', 'Donation'), Decimal('0.0001'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_exchange_rate_history'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='exchangerate',
+            name='exchange_rate_effective_idx',
+        ),
+        migrations.AddField(
+            model_name='exchangerate',
+            name='currency',
+            field=models.CharField(choices=[('USD', 'US Dollar'), ('NGN', 'Nigerian Naira'), ('GHS', 'Ghanaian Cedi'), ('KES', 'Kenyan Shilling'), ('GBP', 'British Pound'), ('EUR', 'Euro')], default='NGN', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='exchangerate',
+            name='rate',
+            field=models.DecimalField(decimal_places=6, max_digits=18, null=True, help_text='How many units of the currency equal 1 USD (e.g., 1600.000000 NGN)'),
+        ),
+        migrations.AlterField(
+            model_name='donation',
+            name='exchange_rate_used',
+            field=models.DecimalField(blank=True, decimal_places=10, help_text='Units of project currency per unit of donation currency used for conversion', max_digits=20, null=True),
+        ),
+        migrations.RunPython(rates_per_currency, usd_to_ngn_rates),
+        migrations.AlterField(
+            model_name='exchangerate',
+            name='rate',
+            field=models.DecimalField(decimal_places=6, max_digits=18, help_text='How many units of the currency equal 1 USD (e.g., 1600.000000 NGN)'),
+        ),
+        migrations.RemoveField(
+            model_name='exchangerate',
+            name='usd_to_ngn_rate',
+        ),
+        migrations.RemoveField(
+            model_name='exchangerate',
+            name='ngn_to_usd_rate',
+        ),
+        migrations.AddIndex(
+            model_name='exchangerate',
+            index=models.Index(fields=['currency', 'is_active', 'effective_date'], name='exchange_rate_effective_idx'),
+        ),
+    ]
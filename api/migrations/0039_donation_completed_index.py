@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_exchange_rate_currencies'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(condition=models.Q(('status', 'COMPLETED')), fields=['payment_completed_at'], name='donation_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_donation_completed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringDonation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('donor_email', models.EmailField(max_length=254)),
+                ('gateway', models.CharField(choices=[('PAYSTACK', 'Paystack'), ('PAYPAL', 'PayPal')], max_length=20)),
+                ('agreement_id', models.CharField(blank=True, db_index=True, help_text='PayPal billing agreement', max_length=200, null=True)),
+                ('plan_code', models.CharField(blank=True, max_length=255, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Monthly amount', max_digits=12)),
+                ('currency', models.CharField(choices=[('USD', 'USD'), ('NGN', 'NGN')], max_length=3)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('CANCELLED', 'Cancelled')], default='ACTIVE', max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('last_charge_at', models.DateTimeField()),
+                ('next_charge_at', models.DateTimeField()),
+                ('charge_count', models.PositiveIntegerField(default=1)),
+                ('total_charged', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True)),
+                ('origin', models.OneToOneField(help_text='First donation of the series', on_delete=django.db.models.deletion.CASCADE, related_name='recurring_ledger', to='api.donation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_charge_at'], name='recurring_status_next_idx'), models.Index(fields=['cancelled_at'], name='recurring_cancelled_idx'), models.Index(fields=['plan_code', 'donor_email'], name='recurring_plan_email_idx')],
+            },
+        ),
+    ]
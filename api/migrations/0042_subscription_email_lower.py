@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:29
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_subscription_emails(apps, schema_editor):
+    """
+    Subscriptions used to be stored as typed, so one address can have several rows differing in
+    case or padding. Keep the most recently updated row of each address, which carries the
+    reader's latest active/inactive choice, then store every email lower-cased and stripped.
+    """
+    Subscription = apps.get_model('api', 'Subscription')
+    keyed = Subscription.objects.annotate(key=Lower(Trim('email')))
+    duplicated = list(keyed.values('key').annotate(rows=Count('id')).filter(rows__gt=1).values_list('key', flat=True))
+
+    stale, seen = [], set()
+    rows = keyed.filter(key__in=duplicated).order_by('key', '-updated_at', '-id').values_list('id', 'key')
+    for pk, key in rows.iterator():
+        if key in seen:
+            stale.append(pk)
+        seen.add(key)
+    Subscription.objects.filter(pk__in=stale).delete()
+
+    Subscription.objects.exclude(email=Lower(Trim('email'))).update(email=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0041_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_subscription_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='unique_subscription_email_lower'),
+        ),
+    ]
@@ -1,11 +1,26 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Avg, Count, F, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Greatest, Lower, Trim
 from core.models import BaseDBModel
+from core.tracing import span
+from core.utils import chunked
+from bisect import bisect_right
+from calendar import monthrange
+from collections import defaultdict
 from decimal import Decimal, ROUND_HALF_UP
 from django.utils import timezone
+from datetime import UTC, datetime, timedelta
 from django.contrib.auth.models import AbstractUser
 from .utils import retrieve_storage
+import hashlib
+import json
+import logging
+import time
 
-media_storage = retrieve_storage()
+logger = logging.getLogger(__name__)
 
 
 class User(AbstractUser, BaseDBModel):
@@ -14,72 +29,213 @@ class User(AbstractUser, BaseDBModel):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     is_verified = models.BooleanField(default=False)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # login/register look users up by case-insensitive email
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
+    @classmethod
+    def by_email(cls, email):
+        """Case-insensitive email lookup that can use user_email_lower_idx"""
+        return cls.objects.alias(email_lower=Lower('email')).filter(email_lower=email.strip().lower())
+
     def __str__(self):
         return self.username
 
 
+class Currency(models.TextChoices):
+    """Currencies the rate engine converts between; rates are quoted against BASE_CURRENCY"""
+    USD = 'USD', 'US Dollar'
+    NGN = 'NGN', 'Nigerian Naira'
+    GHS = 'GHS', 'Ghanaian Cedi'
+    KES = 'KES', 'Kenyan Shilling'
+    GBP = 'GBP', 'British Pound'
+    EUR = 'EUR', 'Euro'
+
+
+BASE_CURRENCY = Currency.USD
+# Precision of Donation.exchange_rate_used, e.g. 0.000625 USD per NGN
+CROSS_RATE_PLACES = Decimal('0.0000000001')
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def datetime64(moments):
+    """Aware datetimes as a NumPy datetime64[us] (UTC) array; exact, and far faster than np.array(moments)"""
+    import numpy as np
+
+    return np.fromiter(((moment - EPOCH) // MICROSECOND for moment in moments), np.int64,
+                       len(moments)).astype('datetime64[us]')
+
+
 class ExchangeRate(BaseDBModel):
     """
-    Simplified exchange rate model with proper admin controls.
-    Stores the rate for converting 1 USD to NGN.
+    Append-only history of rates against BASE_CURRENCY, one series per currency.
+    Each row applies from its effective_date until the next one for its currency;
+    a rate is retracted by clearing is_active rather than by deleting or editing it.
+    Any pair converts through the base: amount / rate[from] * rate[to].
     """
-    usd_to_ngn_rate = models.DecimalField(
-        max_digits=10,
-        decimal_places=4,
-        default=1,
-        help_text="How many NGN equals 1 USD (e.g., 1600.0000)"
+    currency = models.CharField(
+        max_length=3,
+        choices=Currency.choices,
+        default=Currency.NGN,
     )
-    ngn_to_usd_rate = models.DecimalField(
-        max_digits=10,
-        decimal_places=4,
-        default=1,
-        help_text="How many USD equals 1 NGN (e.g., 0.000625)"
+    rate = models.DecimalField(
+        max_digits=18,
+        decimal_places=6,
+        help_text="How many units of the currency equal 1 USD (e.g., 1600.000000 NGN)"
     )
     effective_date = models.DateTimeField(default=timezone.now)
-    is_active = models.BooleanField(default=True)
+    is_active = models.BooleanField(default=True, help_text="Cleared to retract a rate entered in error")
+
+    # Process-local (rate tables, loaded at, NumPy copies) for rate_at() and convert_many(); see history()
+    _history = None
 
     class Meta:
         ordering = ['-effective_date']
         verbose_name = "Exchange Rate"
         verbose_name_plural = "Exchange Rates"
+        indexes = [
+            models.Index(fields=['currency', 'is_active', 'effective_date'], name='exchange_rate_effective_idx'),
+        ]
+
+    def clean(self):
+        if self.currency == BASE_CURRENCY:
+            raise ValidationError({"currency": f"Rates are quoted against {BASE_CURRENCY}"})
+        if self.rate is not None and self.rate <= 0:
+            raise ValidationError({"rate": "Rate must be positive"})
 
     def save(self, *args, **kwargs):
-        if self.is_active:
-            # Deactivate all other rates when setting a new active rate
-            ExchangeRate.objects.filter(is_active=True).update(is_active=False)
         super().save(*args, **kwargs)
+        self.invalidate_history()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invalidate_history()
+        return result
 
     @classmethod
-    def get_current_rate(cls):
-        """Get the current active exchange rate"""
-        return cls.objects.filter(is_active=True).first()
+    def invalidate_history(cls):
+        """Drop this process's copy now and again once the change is committed"""
+        cls._history = None
+        transaction.on_commit(lambda: setattr(cls, '_history', None))
 
     @classmethod
-    def convert_currency(cls, amount, from_currency, to_currency):
+    def history(cls):
+        """
+        {currency: (effective dates, rates)} of active rates, each sorted by date.
+        Loaded in one query and kept for EXCHANGE_RATE_REFRESH_SECONDS; changes
+        made by this process reload it at once, other workers pick them up on expiry.
         """
-        Convert amount between USD and NGN
+        return cls.loaded_history()[0]
+
+    @classmethod
+    def loaded_history(cls):
+        history = cls._history
+        if history is None or time.monotonic() - history[1] > settings.EXCHANGE_RATE_REFRESH_SECONDS:
+            tables = {}
+            rows = cls.objects.filter(is_active=True).order_by('effective_date', 'id') \
+                .values_list('currency', 'effective_date', 'rate')
+            for currency, effective_date, rate in rows:
+                dates, rates = tables.setdefault(currency, ([], []))
+                dates.append(effective_date)
+                rates.append(rate)
+            history = cls._history = (tables, time.monotonic(), {})
+        return history
+
+    @classmethod
+    def rate_at(cls, currency, when=None):
+        """Units of `currency` per USD in effect at `when` (default now), or None before its first rate"""
+        if currency == BASE_CURRENCY:
+            return Decimal(1)
+        dates, rates = cls.history().get(currency, ((), ()))
+        index = bisect_right(dates, when or timezone.now())
+        return rates[index - 1] if index else None
+
+    @classmethod
+    def get_current_rate(cls, currency=Currency.NGN):
+        """Get the exchange rate row in effect now for `currency`"""
+        return cls.objects.filter(currency=currency, is_active=True, effective_date__lte=timezone.now()).first()
+
+    @classmethod
+    def cross_rate(cls, from_currency, to_currency, at=None):
+        """Units of `to_currency` per unit of `from_currency` at `at` (default now)"""
+        from_rate, to_rate = cls.rate_at(from_currency, at), cls.rate_at(to_currency, at)
+        if not from_rate or not to_rate:
+            missing = to_currency if from_rate else from_currency
+            raise ValueError(f"No active exchange rate found for {missing}")
+        return (to_rate / from_rate).quantize(CROSS_RATE_PLACES, rounding=ROUND_HALF_UP)
+
+    @classmethod
+    def convert_currency(cls, amount, from_currency, to_currency, at=None):
+        """
+        Convert amount between any two currencies at the rates in effect at `at` (default now)
         Returns Decimal with proper precision
         """
         if from_currency == to_currency:
             return Decimal(str(amount))
 
-        current_rate = cls.get_current_rate()
-        if not current_rate:
-            raise ValueError("No active exchange rate found")
+        return cls.convert_at(amount, cls.cross_rate(from_currency, to_currency, at))
 
-        amount_decimal = Decimal(str(amount))
+    @staticmethod
+    def convert_at(amount, cross_rate):
+        converted = Decimal(str(amount)) * cross_rate
+        return converted.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-        if from_currency == 'USD' and to_currency == 'NGN':
-            converted = amount_decimal * current_rate.usd_to_ngn_rate
-        elif from_currency == 'NGN' and to_currency == 'USD':
-            converted = amount_decimal / current_rate.usd_to_ngn_rate
-        else:
-            raise ValueError(f"Unsupported currency conversion: {from_currency} to {to_currency}")
+    @classmethod
+    def rate_arrays(cls, currency):
+        """NumPy (datetime64[us] UTC effective dates, float64 rates) for `currency`, memoised with history()"""
+        import numpy as np
 
-        return converted.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        tables, _, arrays = cls.loaded_history()
+        if currency not in arrays:
+            dates, rates = tables.get(currency, ((), ()))
+            arrays[currency] = (datetime64(dates), np.array(rates, dtype=np.float64))
+        return arrays[currency]
+
+    @classmethod
+    def convert_many(cls, amounts, currencies, to_currency, at=None):
+        """
+        Convert parallel arrays of amounts and currency codes to `to_currency` in one vectorized pass.
+        `at` is None for the current rates, one datetime, or one timestamp per amount (datetime64
+        or aware datetimes). Returns a float64 NumPy array rounded to cents: meant for reporting,
+        stored amounts go through convert_currency().
+        """
+        import numpy as np
+
+        amounts = np.asarray(amounts, dtype=np.float64)
+        codes, index = np.unique(np.asarray(currencies, dtype='U3'), return_inverse=True)
+        if at is None or isinstance(at, datetime):
+            # One rate per distinct currency, looked up once
+            factors = np.array([float(cls.cross_rate(code, to_currency, at)) for code in codes], dtype=np.float64)
+            return np.round(amounts * factors[index], 2)
+
+        at = np.asarray(at)
+        at = datetime64(at) if at.dtype == object else at.astype('datetime64[us]')
+        from_rates = np.empty(len(amounts), dtype=np.float64)
+        for position, code in enumerate(codes):
+            rows = index == position
+            from_rates[rows] = cls.rates_at(code, at[rows])
+        return np.round(amounts / from_rates * cls.rates_at(to_currency, at), 2)
+
+    @classmethod
+    def rates_at(cls, currency, at):
+        """
+        Rates of `currency` in effect at each datetime64 in `at`;
+        times before its first rate use that rate rather than failing a whole report
+        """
+        import numpy as np
+
+        if currency == BASE_CURRENCY:
+            return np.ones(len(at), dtype=np.float64)
+        dates, rates = cls.rate_arrays(currency)
+        if not len(rates):
+            raise ValueError(f"No active exchange rate found for {currency}")
+        return rates[np.maximum(np.searchsorted(dates, at, side='right') - 1, 0)]
 
     def __str__(self):
-        return f"1 USD = {self.usd_to_ngn_rate} NGN (Active: {self.is_active})"
+        return f"1 USD = {self.rate} {self.currency} from {self.effective_date:%Y-%m-%d %H:%M} (Active: {self.is_active})"
 
 
 class Project(BaseDBModel):
@@ -148,14 +304,30 @@ class Project(BaseDBModel):
     impact_count = models.IntegerField(default=0, null=True, blank=True)
     impact_phrase = models.CharField(max_length=150, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # list_projects: newest first, optionally filtered by status
+            models.Index(fields=['-created_at'], name='project_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='project_status_created_idx'),
+        ]
+
     def add_donation_amount(self, amount):
-        """Add donation amount and update progress"""
-        self.amount_raised += Decimal(str(amount))
+        """Add donation amount atomically in the database and update progress"""
+        Project.objects.filter(pk=self.pk).update(
+            amount_raised=F('amount_raised') + Decimal(str(amount))
+        )
+        self.refresh_from_db(fields=['amount_raised'])
         self.update_progress()
 
     def update_progress(self):
         """Update funding progress calculations"""
-        print("updating progress===>>>>>")
+        self.calculate_progress()
+
+        # Always save after updating progress, leaving amount_raised to the atomic update
+        self.save(update_fields=['percentage_funded', 'remaining_amount', 'status', 'updated_at'])
+
+    def calculate_progress(self):
+        """Set percentage_funded, remaining_amount and status from amount_raised without saving"""
         if self.target_amount > 0:
             self.percentage_funded = float((self.amount_raised / self.target_amount) * 100)
             self.remaining_amount = max(self.target_amount - self.amount_raised, Decimal('0.00'))
@@ -168,26 +340,46 @@ class Project(BaseDBModel):
             self.percentage_funded = 0.0
             self.remaining_amount = Decimal('0.00')
 
-        # Always save after updating progress
-        self.save()
+    @classmethod
+    def recompute_totals(cls, batch_size=1000, projects=None):
+        """
+        Recompute amount_raised and progress of every project (or of the `projects` queryset)
+        from its completed donations. Used after bulk loads that bypass Donation.save;
+        returns the number of projects updated.
+        """
+        projects = cls.objects.all() if projects is None else projects
+        totals = dict(Donation.objects.filter(
+            status=Donation.StatusChoices.COMPLETED, project__in=projects
+        ).values('project').annotate(
+            total=Sum('project_currency_amount')
+        ).values_list('project', 'total'))
+
+        projects = list(projects.only('id', 'target_amount', 'status').order_by('pk'))
+        count = 0
+        for chunk in chunked(projects, batch_size):
+            for project in chunk:
+                project.amount_raised = Decimal(str(totals.get(project.pk) or 0)).quantize(Decimal('0.01'))
+                project.calculate_progress()
+            cls.objects.bulk_update(chunk, ['amount_raised', 'percentage_funded', 'remaining_amount', 'status'])
+            count += len(chunk)
+        return count
 
     def get_donations_summary(self):
-        """Get summary of donations for this project"""
-        from django.db.models import Sum, Count
-
+        """Get summary of donations for this project in a single aggregate query"""
         completed_donations = self.donations.filter(status=Donation.StatusChoices.COMPLETED)
 
-        return {
-            'total_donors': completed_donations.values('donor_email').distinct().count(),
-            'total_donations': completed_donations.count(),
-            'amount_raised': self.amount_raised,
-            'average_donation': completed_donations.aggregate(
-                avg=models.Avg('project_currency_amount')
-            )['avg'] or 0,
-            'recurring_donors': completed_donations.filter(
-                frequency=Donation.FrequencyChoices.MONTHLY
-            ).values('donor_email').distinct().count(),
-        }
+        summary = completed_donations.aggregate(
+            total_donors=Count('donor_email', distinct=True),
+            total_donations=Count('id'),
+            average_donation=Avg('project_currency_amount'),
+            recurring_donors=Count(
+                'donor_email', distinct=True,
+                filter=Q(frequency=Donation.FrequencyChoices.MONTHLY)
+            ),
+        )
+        summary['amount_raised'] = self.amount_raised
+        summary['average_donation'] = summary['average_donation'] or 0
+        return summary
 
     def __str__(self):
         return f"{self.title} - {self.percentage_funded:.1f}% funded ({self.get_status_display()})"
@@ -204,6 +396,110 @@ class ProjectPhoto(BaseDBModel):
         return f"Photo for {self.project.title}"
 
 
+class Donor(BaseDBModel):
+    """
+    Lifetime giving per donor, keyed by normalized email.
+    Maintained on donation completion, rebuilt with `manage.py backfill_donors`.
+    """
+    email = models.EmailField(unique=True)
+    full_name = models.CharField(max_length=255, blank=True, null=True)
+    lifetime_totals = models.JSONField(default=dict, blank=True,
+                                       help_text="Completed amount per currency, e.g. {\"USD\": \"50.00\"}")
+    donation_count = models.PositiveIntegerField(default=0)
+    first_donation_at = models.DateTimeField(null=True, blank=True)
+    last_donation_at = models.DateTimeField(null=True, blank=True)
+    is_recurring = models.BooleanField(default=False)
+
+    @staticmethod
+    def normalize_email(email):
+        return (email or "").strip().lower()
+
+    @classmethod
+    def record_donation(cls, donation):
+        """Fold a newly completed donation into its donor's aggregates"""
+        email = cls.normalize_email(donation.donor_email)
+        completed_at = donation.payment_completed_at or timezone.now()
+
+        with transaction.atomic():
+            donor, _ = cls.objects.select_for_update().get_or_create(
+                email=email, defaults={"full_name": donation.donor_full_name}
+            )
+            totals = donor.lifetime_totals or {}
+            totals[donation.currency] = str((
+                Decimal(totals.get(donation.currency, "0")) + Decimal(str(donation.amount))
+            ).quantize(Decimal("0.01")))
+            donor.lifetime_totals = totals
+            donor.donation_count += 1
+            donor.full_name = donation.donor_full_name or donor.full_name
+            if not donor.first_donation_at or completed_at < donor.first_donation_at:
+                donor.first_donation_at = completed_at
+            if not donor.last_donation_at or completed_at > donor.last_donation_at:
+                donor.last_donation_at = completed_at
+            donor.is_recurring = donor.is_recurring or donation.is_recurring()
+            donor.save()
+
+            Donation.objects.filter(pk=donation.pk).update(donor=donor)
+            donation.donor = donor
+        return donor
+
+    @classmethod
+    def rebuild(cls, batch_size=1000, donations=None):
+        """
+        Recompute every donor from completed donations (only those in `donations` when given)
+        and link donations to donors. Rows are grouped by email in the database and streamed,
+        so memory stays flat.
+        """
+        completed = (Donation.objects.all() if donations is None else donations).filter(
+            status=Donation.StatusChoices.COMPLETED)
+        rows = completed.annotate(
+            email_key=Lower(Trim('donor_email'))
+        ).values('email_key', 'currency').annotate(
+            total=Sum('amount'),
+            count=Count('id'),
+            first=Min('payment_completed_at'),
+            last=Max('payment_completed_at'),
+            recurring=Count('id', filter=~Q(frequency=Donation.FrequencyChoices.ONCE)),
+            full_name=Max('donor_full_name'),
+        ).order_by('email_key')
+
+        def donors():
+            current = None
+            for row in rows.iterator(chunk_size=batch_size):
+                email = row['email_key']
+                if current is None or current.email != email:
+                    if current is not None:
+                        yield current
+                    current = cls(email=email, full_name=row['full_name'], lifetime_totals={})
+                current.lifetime_totals[row['currency']] = str(Decimal(str(row['total'])).quantize(Decimal("0.01")))
+                current.donation_count += row['count']
+                if row['first'] and (not current.first_donation_at or row['first'] < current.first_donation_at):
+                    current.first_donation_at = row['first']
+                if row['last'] and (not current.last_donation_at or row['last'] > current.last_donation_at):
+                    current.last_donation_at = row['last']
+                current.is_recurring = current.is_recurring or row['recurring'] > 0
+            if current is not None:
+                yield current
+
+        count = 0
+        for chunk in chunked(donors(), batch_size):
+            cls.objects.bulk_create(
+                chunk,
+                update_conflicts=True,
+                unique_fields=['email'],
+                update_fields=['full_name', 'lifetime_totals', 'donation_count',
+                               'first_donation_at', 'last_donation_at', 'is_recurring'],
+            )
+            count += len(chunk)
+
+        completed.filter(donor__isnull=True).update(
+            donor=Subquery(cls.objects.filter(email=Lower(Trim(OuterRef('donor_email')))).values('id')[:1])
+        )
+        return count
+
+    def __str__(self):
+        return self.email
+
+
 class Donation(BaseDBModel):
     """Improved donation model with better validation and currency handling"""
 
@@ -219,6 +515,11 @@ class Donation(BaseDBModel):
         CANCELLED = 'CANCELLED', 'Cancelled'
         REFUNDED = 'REFUNDED', 'Refunded'
 
+    # A payment the gateway confirms completes the donation from any of these, including
+    # one reconcile_donations already gave up on
+    PAYABLE_STATUSES = [StatusChoices.PENDING, StatusChoices.PROCESSING, StatusChoices.FAILED,
+                        StatusChoices.CANCELLED]
+
     class FrequencyChoices(models.TextChoices):
         ONCE = 'ONCE', 'One-time'
         MONTHLY = 'MONTHLY', 'Monthly'
@@ -240,6 +541,13 @@ class Donation(BaseDBModel):
     # Donor information
     donor_email = models.EmailField(db_index=True)
     donor_full_name = models.CharField(max_length=255)
+    donor = models.ForeignKey(
+        Donor,
+        on_delete=models.SET_NULL,
+        related_name='donations',
+        null=True, blank=True,
+        help_text="Set once the donation completes"
+    )
 
     # Amount and currency
     amount = models.DecimalField(
@@ -270,10 +578,10 @@ class Donation(BaseDBModel):
     project_title = models.CharField(max_length=255, null=True, blank=True)
 
     exchange_rate_used = models.DecimalField(
-        max_digits=10,
-        decimal_places=4,
+        max_digits=20,
+        decimal_places=10,
         null=True, blank=True,
-        help_text="Exchange rate used for conversion"
+        help_text="Units of project currency per unit of donation currency used for conversion"
     )
 
     # Donation details
@@ -333,9 +641,27 @@ class Donation(BaseDBModel):
             models.Index(fields=['donor_email', 'status']),
             models.Index(fields=['project', 'status']),
             models.Index(fields=['reference']),
+            # list_donations / export: newest first, optionally by status; donation_metric: created_at ranges
+            models.Index(fields=['-created_at'], name='donation_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='donation_status_created_idx'),
+            # reconcile_donations only scans the small PENDING slice
+            models.Index(fields=['created_at'], condition=Q(status='PENDING'), name='donation_pending_idx'),
+            # analytics snapshot: delta of donations completed past its watermark
+            models.Index(fields=['payment_completed_at'], condition=Q(status='COMPLETED'),
+                         name='donation_completed_idx'),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can tell a completion from a re-save
+        instance._loaded_status = dict(zip(field_names, values)).get('status')
+        return instance
+
     def save(self, *args, **kwargs):
+        just_completed = (self.status == self.StatusChoices.COMPLETED and
+                          getattr(self, '_loaded_status', None) != self.StatusChoices.COMPLETED)
+
         # Set payment completion timestamp
         if self.status == self.StatusChoices.COMPLETED \
                 and not self.payment_completed_at:
@@ -343,14 +669,92 @@ class Donation(BaseDBModel):
 
         # Calculate converted amount if needed
         if self.project:
-            self.convert_to_project_currency()
+            with span("donation.convert_currency"):
+                self.convert_to_project_currency()
 
-        super().save(*args, **kwargs)
+        with span("donation.save"):
+            super().save(*args, **kwargs)
+        self._loaded_status = self.status
+
+        # Only on the transition to completed, not on later updates
+        if just_completed:
+            with span("donation.on_completed", donation_id=self.pk):
+                self.on_completed()
 
-        # Update project amounts if donation completed
-        if (self.status == self.StatusChoices.COMPLETED and
-                self.project):  # Only on creation, not updates
+    def transition(self, status, allowed, **fields):
+        """
+        Move to `status` with one conditional UPDATE that only matches while the stored
+        status is in `allowed`, also writing `fields`. Returns whether this caller made the
+        change; only then are completion side effects applied. A concurrent caller waits on
+        the row only until the winner commits, then matches nothing.
+        """
+        fields["status"] = status
+        if status == self.StatusChoices.COMPLETED:
+            fields.setdefault("payment_completed_at", self.payment_completed_at or timezone.now())
+        if self.project:
+            with span("donation.convert_currency"):
+                self.convert_to_project_currency()
+            fields.update(project_currency=self.project_currency, project_title=self.project_title,
+                          project_currency_amount=self.project_currency_amount,
+                          exchange_rate_used=self.exchange_rate_used)
+        fields["updated_at"] = timezone.now()
+
+        with span("donation.transition", donation_id=self.pk, status=status):
+            won = type(self).objects.filter(pk=self.pk, status__in=allowed).update(**fields)
+        if not won:
+            return False
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self._loaded_status = status
+
+        if status == self.StatusChoices.COMPLETED:
+            with span("donation.on_completed", donation_id=self.pk):
+                self.on_completed()
+        return True
+
+    @classmethod
+    def complete_many(cls, ids):
+        """
+        Complete payable donations in one transaction, accepting the same statuses as transition().
+        Rows already locked by another worker are skipped; returns the donations completed here.
+        """
+        with transaction.atomic():
+            donations = list(cls.objects.select_for_update(skip_locked=True).filter(
+                pk__in=ids, status__in=cls.PAYABLE_STATUSES,
+            ))
+            if not donations:
+                return []
+
+            now = timezone.now()
+            cls.objects.filter(pk__in=[d.pk for d in donations]).update(
+                status=cls.StatusChoices.COMPLETED, payment_completed_at=now, updated_at=now
+            )
+
+            per_project = defaultdict(Decimal)
+            for donation in donations:
+                donation.status = donation._loaded_status = cls.StatusChoices.COMPLETED
+                donation.payment_completed_at = now
+                if donation.project_id:
+                    per_project[donation.project_id] += Decimal(str(donation.get_project_amount()))
+                Donor.record_donation(donation)
+                RecurringDonation.record_charge(donation)
+
+            for project in Project.objects.filter(pk__in=per_project):
+                project.add_donation_amount(per_project[project.pk])
+
+            from .analytics import snapshot
+            snapshot.record(donations)
+        return donations
+
+    def on_completed(self):
+        """Apply project totals, donor aggregates, the recurring ledger and the analytics snapshot"""
+        from .analytics import snapshot
+
+        if self.project:
             self.project.add_donation_amount(self.get_project_amount())
+        Donor.record_donation(self)
+        RecurringDonation.record_charge(self)
+        snapshot.record([self])
 
     def convert_to_project_currency(self):
         """Convert donation amount to project currency"""
@@ -363,22 +767,57 @@ class Donation(BaseDBModel):
             return
 
         try:
-            current_rate = ExchangeRate.get_current_rate()
-            if not current_rate:
-                raise ValueError("No exchange rate available")
-
-            self.project_currency_amount = ExchangeRate.convert_currency(
-                self.amount,
-                self.currency,
-                self.project.currency
-            )
-            self.exchange_rate_used = current_rate.usd_to_ngn_rate
+            # The rate in effect when the donation was made, so later saves don't re-value it
+            rate = ExchangeRate.cross_rate(self.currency, self.project.currency, self.created_at)
+
+            self.project_currency_amount = ExchangeRate.convert_at(self.amount, rate)
+            self.exchange_rate_used = rate
 
         except Exception as e:
             # Log the error but don't fail the save
-            print(f"Currency conversion failed: {e}")
+            logger.warning("Currency conversion failed for donation %s: %s", self.reference, e)
             self.project_currency_amount = self.amount
 
+    @classmethod
+    def revalue(cls, since=None, batch_size=1000):
+        """
+        Re-convert cross-currency donations at the rate in effect when each was made,
+        moving the difference on completed ones into their project's amount_raised.
+        Rates come from ExchangeRate.history(), so there are no per-donation rate queries;
+        returns the number of donations whose converted amount or rate changed.
+        """
+        ExchangeRate.invalidate_history()
+        queryset = cls.objects.exclude(project_currency__isnull=True).exclude(project_currency=F('currency')) \
+            .order_by('pk').only('id', 'project_id', 'status', 'amount', 'currency', 'project_currency',
+                                 'project_currency_amount', 'exchange_rate_used', 'created_at')
+        if since:
+            queryset = queryset.filter(created_at__gte=since)
+
+        changed = 0
+        for batch in chunked(queryset.iterator(chunk_size=batch_size), batch_size):
+            updates = []
+            per_project = defaultdict(Decimal)
+            for donation in batch:
+                try:
+                    rate = ExchangeRate.cross_rate(donation.currency, donation.project_currency, donation.created_at)
+                except ValueError:
+                    continue
+                amount = ExchangeRate.convert_at(donation.amount, rate)
+                if amount == donation.project_currency_amount and rate == donation.exchange_rate_used:
+                    continue
+                if donation.status == cls.StatusChoices.COMPLETED and donation.project_id:
+                    per_project[donation.project_id] += amount - Decimal(str(donation.get_project_amount()))
+                donation.project_currency_amount = amount
+                donation.exchange_rate_used = rate
+                updates.append(donation)
+
+            with transaction.atomic():
+                cls.objects.bulk_update(updates, ['project_currency_amount', 'exchange_rate_used'])
+                for project in Project.objects.filter(pk__in=per_project):
+                    project.add_donation_amount(per_project[project.pk])
+            changed += len(updates)
+        return changed
+
     def get_project_amount(self):
         """Get the amount in project currency"""
         return self.project_currency_amount or self.amount
@@ -391,6 +830,338 @@ class Donation(BaseDBModel):
         return f"{self.donor_full_name} ({self.get_status_display()})"
 
 
+class GatewayPlan(BaseDBModel):
+    """
+    Recurring billing plan created once at the gateway and reused
+    for every donor giving the same amount, currency and interval.
+    """
+    gateway = models.CharField(max_length=20, choices=Donation.PaymentClientChoices.choices)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    interval = models.CharField(max_length=20, default='monthly')
+    plan_code = models.CharField(max_length=255, help_text="Paystack plan_code or PayPal plan id")
+
+    # Process-local memo of catalog lookups; plans are never mutated once created
+    _cache = {}
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'amount', 'currency', 'interval'],
+                                    name='unique_gateway_plan'),
+        ]
+
+    @classmethod
+    def get_or_create_plan(cls, gateway, amount, currency, interval, create):
+        """
+        Return the plan code for this key, calling `create()` at the gateway
+        only when the catalog has no plan yet.
+        """
+        key = {
+            "gateway": gateway,
+            "amount": Decimal(str(amount)).quantize(Decimal("0.01")),
+            "currency": currency,
+            "interval": interval,
+        }
+        cache_key = tuple(key.values())
+        if cache_key in cls._cache:
+            return cls._cache[cache_key]
+
+        plan = cls.objects.filter(**key).first()
+        if plan:
+            plan_code = plan.plan_code
+        else:
+            plan_code = create()
+            try:
+                with transaction.atomic():
+                    cls.objects.create(plan_code=plan_code, **key)
+            except IntegrityError:
+                # Another request created the same plan concurrently; keep theirs
+                plan_code = cls.objects.get(**key).plan_code
+
+        cls._cache[cache_key] = plan_code
+        return plan_code
+
+    def __str__(self):
+        return f"{self.gateway} {self.amount} {self.currency}/{self.interval}"
+
+
+class IdempotencyKey(BaseDBModel):
+    """
+    Response of a request stored under its client-supplied Idempotency-Key,
+    so that retries are answered from here instead of being run again.
+    """
+
+    class StatusChoices(models.TextChoices):
+        IN_PROGRESS = 'IN_PROGRESS', 'In progress'
+        COMPLETED = 'COMPLETED', 'Completed'
+
+    class Conflict(Exception):
+        pass
+
+    scope = models.CharField(max_length=100, help_text="Operation the key applies to")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the request payload")
+    status = models.CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.IN_PROGRESS)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True,
+                                      help_text="End of the in-progress lease, then of the stored response")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    @staticmethod
+    def fingerprint_of(payload):
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def claim(cls, scope, key, fingerprint):
+        """
+        The key's row, either COMPLETED with the response to replay or IN_PROGRESS
+        and owned by this caller. Waits while another request holds the key;
+        raises Conflict when it holds it too long or the payload differs.
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            now = timezone.now()
+            lease = now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(scope=scope, key=key, fingerprint=fingerprint, expires_at=lease)
+            except IntegrityError:
+                pass
+
+            record = cls.objects.filter(scope=scope, key=key).first()
+            if record is None:
+                # The holder failed and released the key
+                continue
+            if record.expires_at <= now:
+                # An expired response, or a lease left by a crashed worker: take it over unless someone else did
+                taken = cls.objects.filter(pk=record.pk, expires_at=record.expires_at).update(
+                    fingerprint=fingerprint, status=cls.StatusChoices.IN_PROGRESS, response_status=None,
+                    response_body=None, expires_at=lease, updated_at=now)
+                if taken:
+                    record.fingerprint, record.status, record.expires_at = fingerprint, cls.StatusChoices.IN_PROGRESS, lease
+                    return record
+                continue
+            if record.fingerprint != fingerprint:
+                raise cls.Conflict("Idempotency-Key was already used for a different request")
+            if record.status == cls.StatusChoices.COMPLETED:
+                return record
+            if time.monotonic() >= deadline:
+                raise cls.Conflict("A request with this Idempotency-Key is still in progress")
+            time.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+
+    @classmethod
+    def run(cls, scope, key, fingerprint, handler):
+        """
+        (status, body, replayed) of handler() run at most once per key. A 2xx response
+        is stored with the handler's writes and replayed until it expires; any other
+        outcome releases the key so the client can retry.
+        """
+        record = cls.claim(scope, key, fingerprint)
+        if record.status == cls.StatusChoices.COMPLETED:
+            return record.response_status, record.response_body, True
+
+        # Only the lease holder may finish or release the row (a lapsed lease may have been taken over)
+        held = cls.objects.filter(pk=record.pk, expires_at=record.expires_at)
+        try:
+            with transaction.atomic():
+                status, body = handler()
+                if 200 <= status < 300:
+                    now = timezone.now()
+                    stored = held.update(status=cls.StatusChoices.COMPLETED, response_status=status,
+                                         response_body=body, updated_at=now,
+                                         expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS))
+                    if not stored:
+                        # The lease lapsed and another request took the key over: roll back this one's writes
+                        raise cls.Conflict("The Idempotency-Key was taken over by a retry; this attempt was undone")
+                    return status, body, False
+        except BaseException:
+            held.delete()
+            raise
+        held.delete()
+        return status, body, False
+
+    @classmethod
+    def purge(cls, batch_size=1000):
+        """Delete expired keys; returns how many"""
+        expired = cls.objects.filter(expires_at__lte=timezone.now())
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += cls.objects.filter(id__in=ids).delete()[0]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status})"
+
+
+def next_month(moment):
+    """Same day and time a month later, clamped to the end of shorter months"""
+    year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+    return moment.replace(year=year, month=month, day=min(moment.day, monthrange(year, month)[1]))
+
+
+class RecurringDonation(BaseDBModel):
+    """
+    Ledger of recurring donations: one row per agreement or subscription, keyed by its
+    first donation. Kept current as charges complete and gateways report cancellations,
+    so MRR and churn are aggregates over this table rather than walks over Donation chains.
+    """
+
+    class StatusChoices(models.TextChoices):
+        ACTIVE = 'ACTIVE', 'Active'
+        CANCELLED = 'CANCELLED', 'Cancelled'
+
+    origin = models.OneToOneField(Donation, on_delete=models.CASCADE, related_name='recurring_ledger',
+                                  help_text="First donation of the series")
+    donor_email = models.EmailField()
+    gateway = models.CharField(max_length=20, choices=Donation.PaymentClientChoices.choices)
+    agreement_id = models.CharField(max_length=200, null=True, blank=True, db_index=True,
+                                    help_text="PayPal billing agreement")
+    plan_code = models.CharField(max_length=255, null=True, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, help_text="Monthly amount")
+    currency = models.CharField(max_length=3, choices=Donation.CurrencyChoices.choices)
+    status = models.CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.ACTIVE)
+    started_at = models.DateTimeField()
+    last_charge_at = models.DateTimeField()
+    next_charge_at = models.DateTimeField()
+    charge_count = models.PositiveIntegerField(default=1)
+    total_charged = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # metrics: active series by expected charge, cancellations by date
+            models.Index(fields=['status', 'next_charge_at'], name='recurring_status_next_idx'),
+            models.Index(fields=['cancelled_at'], name='recurring_cancelled_idx'),
+            # Paystack renewals and cancellations identify the series by customer and plan
+            models.Index(fields=['plan_code', 'donor_email'], name='recurring_plan_email_idx'),
+        ]
+
+    @classmethod
+    def from_origin(cls, origin, **fields):
+        charged_at = origin.payment_completed_at or origin.created_at
+        return cls(origin=origin, donor_email=origin.donor_email,
+                   gateway=origin.payment_client, agreement_id=origin.agreement_id,
+                   plan_code=origin.payment_plan_code, amount=origin.amount, currency=origin.currency,
+                   started_at=charged_at, last_charge_at=charged_at, next_charge_at=next_month(charged_at),
+                   total_charged=origin.amount, **fields)
+
+    @classmethod
+    def record_charge(cls, donation):
+        """Apply a completed donation to its series: the first charge opens it, later ones extend it"""
+        if donation.frequency == Donation.FrequencyChoices.ONCE:
+            return
+        charged_at = donation.payment_completed_at or timezone.now()
+        origin_id = donation.parent_donation_id or donation.pk
+        updated = cls.objects.filter(origin_id=origin_id).update(
+            charge_count=F('charge_count') + 1,
+            total_charged=F('total_charged') + donation.amount,
+            last_charge_at=Greatest('last_charge_at', Value(charged_at)),
+            next_charge_at=Greatest('next_charge_at', Value(next_month(charged_at))),
+            status=cls.StatusChoices.ACTIVE, cancelled_at=None, updated_at=timezone.now(),
+        )
+        if updated:
+            return
+        if donation.parent_donation_id is None:
+            cls.from_origin(donation).save()
+        else:
+            # A series that predates the ledger and was never backfilled
+            ledger = cls.from_origin(donation.parent_donation, charge_count=2)
+            ledger.total_charged += donation.amount
+            ledger.last_charge_at, ledger.next_charge_at = charged_at, next_month(charged_at)
+            ledger.save()
+
+    @classmethod
+    def cancel(cls, **lookup):
+        """Mark the active series matching `lookup` cancelled; returns how many were"""
+        now = timezone.now()
+        return cls.objects.filter(status=cls.StatusChoices.ACTIVE, **lookup).update(
+            status=cls.StatusChoices.CANCELLED, cancelled_at=now, updated_at=now)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """
+        Recompute every series from its donations. Charge counts, totals and dates are
+        upserted; statuses are kept, since cancellations are only known to the ledger.
+        """
+        completed = Q(recurring_payments__status=Donation.StatusChoices.COMPLETED)
+        origins = Donation.objects.filter(
+            frequency=Donation.FrequencyChoices.MONTHLY,
+            parent_donation__isnull=True,
+            status=Donation.StatusChoices.COMPLETED,
+        ).annotate(
+            renewals=Count('recurring_payments', filter=completed),
+            renewed=Sum('recurring_payments__amount', filter=completed),
+            last_renewal=Max('recurring_payments__payment_completed_at', filter=completed),
+        ).order_by('pk')
+
+        count = 0
+        for batch in chunked(origins.iterator(chunk_size=batch_size), batch_size):
+            ledgers = []
+            for origin in batch:
+                ledger = cls.from_origin(origin, charge_count=1 + origin.renewals)
+                ledger.total_charged += origin.renewed or 0
+                if origin.last_renewal and origin.last_renewal > ledger.last_charge_at:
+                    ledger.last_charge_at, ledger.next_charge_at = origin.last_renewal, next_month(origin.last_renewal)
+                ledgers.append(ledger)
+            cls.objects.bulk_create(ledgers, update_conflicts=True, unique_fields=['origin'], update_fields=[
+                'agreement_id', 'plan_code', 'amount', 'currency', 'started_at', 'last_charge_at',
+                'next_charge_at', 'charge_count', 'total_charged', 'updated_at'])
+            count += len(ledgers)
+        return count
+
+    @classmethod
+    def metrics(cls, days=30, currency=BASE_CURRENCY):
+        """
+        Active series, MRR per currency (and in `currency`), and new and churned series over the
+        last `days`. A series that misses its expected charge by RECURRING_GRACE_DAYS counts as
+        churned from then, as does a cancelled one.
+        """
+        now = timezone.now()
+        start = now - timedelta(days=days)
+        grace = timedelta(days=settings.RECURRING_GRACE_DAYS)
+        active = Q(status=cls.StatusChoices.ACTIVE, next_charge_at__gte=now - grace)
+        lapsed_in_window = Q(status=cls.StatusChoices.ACTIVE, next_charge_at__lt=now - grace,
+                             next_charge_at__gte=start - grace)
+        churned = Q(cancelled_at__gte=start) | lapsed_in_window
+        started_before = Q(started_at__lt=start)
+
+        counts = cls.objects.aggregate(
+            active=Count('id', filter=active),
+            new=Count('id', filter=Q(started_at__gte=start)),
+            churned=Count('id', filter=churned),
+            # Series live at the start of the window and lost during it
+            active_at_start=Count('id', filter=started_before & (active | churned)),
+            churned_from_start=Count('id', filter=started_before & churned),
+        )
+        mrr = {row['currency']: Decimal(str(row['total'])).quantize(Decimal("0.01")) for row in
+               cls.objects.filter(active).values('currency').annotate(total=Sum('amount')).order_by()}
+        converted = Decimal(0)
+        for code, total in mrr.items():
+            converted += ExchangeRate.convert_currency(total, code, currency)
+
+        return {
+            "window_days": days,
+            "active": counts['active'],
+            "new": counts['new'],
+            "churned": counts['churned'],
+            "churn_rate": round(counts['churned_from_start'] / counts['active_at_start'], 4)
+            if counts['active_at_start'] else 0.0,
+            "mrr": {code: str(total) for code, total in mrr.items()},
+            "mrr_currency": currency,
+            "mrr_total": str(converted),
+        }
+
+    def __str__(self):
+        return f"{self.donor_email} {self.amount} {self.currency}/month ({self.get_status_display()})"
+
+
 class Volunteer(BaseDBModel):
     """
 
@@ -418,11 +1189,18 @@ class Volunteer(BaseDBModel):
     days = models.CharField(max_length=50, blank=True, null=True)
     cv = models.FileField(
         upload_to="volunteer_cvs/",
-        storage=media_storage
+        # Callable so migrations do not depend on DEBUG
+        storage=retrieve_storage
     )
 
     submitted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # create_volunteer duplicate check
+            models.Index(Lower('first_name'), Lower('last_name'), Lower('role'), name='volunteer_name_role_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.role}"
 
@@ -431,5 +1209,75 @@ class Subscription(BaseDBModel):
     email = models.EmailField(unique=True)
     active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            # Rows from before normalize_email may differ only in case
+            models.UniqueConstraint(Lower('email'), name='unique_subscription_email_lower'),
+        ]
+
+    @staticmethod
+    def normalize_email(email):
+        """Lower-cased, stripped email or None if it is not a valid address"""
+        email = (email or "").strip().lower()
+        try:
+            validate_email(email)
+        except ValidationError:
+            return None
+        return email
+
+    @classmethod
+    def insert_new(cls, emails):
+        """
+        Insert normalized emails in one statement, skipping ones that already exist.
+        Returns how many rows were inserted, so rows a concurrent insert won are not counted.
+        """
+        if not emails:
+            return 0
+        connection = connections[router.db_for_write(cls)]
+        quote = connection.ops.quote_name
+        fields = [cls._meta.get_field(name) for name in ("email", "active", "created_at", "updated_at")]
+        columns = ", ".join(quote(field.column) for field in fields)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        inserted = 0
+        with connection.cursor() as cursor:
+            # Batches stay under the backend's query parameter limit
+            for batch in chunked(emails, connection.ops.bulk_batch_size(fields, emails)):
+                # ON CONFLICT ... RETURNING needs PostgreSQL or SQLite 3.35+
+                cursor.execute(
+                    f"INSERT INTO {quote(cls._meta.db_table)} ({columns}) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(batch))} "
+                    f"ON CONFLICT DO NOTHING RETURNING {quote(cls._meta.pk.column)}",
+                    [value for email in batch for value in (email, True, now, now)],
+                )
+                inserted += len(cursor.fetchall())
+        return inserted
+
+    @classmethod
+    def bulk_import(cls, emails, chunk_size=1000):
+        """
+        Insert emails in chunks, skipping ones that already exist.
+        Returns counts of received, created and invalid rows.
+        """
+        received = created = invalid = 0
+
+        def normalized():
+            nonlocal received, invalid
+            seen = set()
+            for raw in emails:
+                received += 1
+                email = cls.normalize_email(raw)
+                if not email:
+                    invalid += 1
+                    continue
+                if email in seen:
+                    continue
+                seen.add(email)
+                yield email
+
+        for chunk in chunked(normalized(), chunk_size):
+            created += cls.insert_new(chunk)
+
+        return {"received": received, "created": created, "invalid": invalid}
+
     def __str__(self):
         return self.email
@@ -1,17 +1,21 @@
 from ninja import Router, File, Query
+from ninja.decorators import decorate_view
 from ninja.files import UploadedFile
 from typing import List
 from .models import Project, ProjectPhoto
-from django.db.models import Q
+from django.db.models import Count, Q, prefetch_related_objects
 from .schema import (
     ProjectResponse, ProjectListSchema, ErrorResponse, ProjectRequestSchema, ProjectFilter, AddProjectPhoto,
     ProjectStats
 )
 from core.schema import BaseResponseSchema
-from django.core.paginator import Paginator, EmptyPage
+from core.database import read_from_replica
+from core.metrics import PDF_RENDER_SECONDS, record_upload
+from core.tracing import span
+from core.utils import apaginate
+from django.core.paginator import EmptyPage
 from django.template.loader import render_to_string
 from django.http import HttpResponse
-from weasyprint import HTML
 from io import BytesIO
 from datetime import datetime
 
@@ -19,7 +23,8 @@ router = Router(tags=["Projects"])
 
 
 @router.get("/", auth=None, response={200: ProjectListSchema, 400: ErrorResponse})
-def list_projects(request, filters: ProjectFilter = Query(...), page: int = 1, page_size: int = 10):
+@decorate_view(read_from_replica)
+async def list_projects(request, filters: ProjectFilter = Query(...), page: int = 1, page_size: int = 10):
     try:
 
         queryset = Project.objects.prefetch_related("photos").all().order_by('-created_at')
@@ -29,30 +34,29 @@ def list_projects(request, filters: ProjectFilter = Query(...), page: int = 1, p
         if filters.category:
             queryset = queryset.filter(category__icontains=filters.category)
         if filters.status:
-            queryset = queryset.filter(status__icontains=filters.status)
+            queryset = queryset.filter(status=filters.status.upper())
 
-        paginator = Paginator(queryset, page_size)
         try:
-            page_projects = paginator.page(page)
+            page_projects = await apaginate(queryset, page, page_size)
         except EmptyPage:
             return 400, ErrorResponse(message="Invalid page number")
-        data = page_projects.object_list
+        paginator = page_projects.paginator
 
         return 200, ProjectListSchema(
             page=page,
             total=paginator.count,
             page_size=page_size,
             total_pages=paginator.num_pages,
-            data=data
+            data=page_projects.object_list
         )
     except Exception as e:
         return 400, ErrorResponse(message="Error listing projects", detail=str(e), code=400)
 
 
 @router.get("/{project_id}", auth=None, response={200: ProjectResponse, 404: ErrorResponse})
-def get_project(request, project_id: int):
+async def get_project(request, project_id: int):
     try:
-        project = Project.objects.prefetch_related("photos").get(id=project_id)
+        project = await Project.objects.prefetch_related("photos").aget(id=project_id)
         return 200, ProjectResponse(data=project)
     except Project.DoesNotExist:
         return 404, ErrorResponse(message="Project not found", code=404)
@@ -62,14 +66,17 @@ def get_project(request, project_id: int):
 def create_project(request, payload: ProjectRequestSchema,
                    cover_photo: UploadedFile = File(default=None)):
     try:
-        payload_dict = payload.dict()
+        # Omitted fields keep their model defaults
+        payload_dict = payload.dict(exclude_none=True)
         if status := payload_dict.get('status'):
             payload_dict['status'] = status.upper()
         project = Project.objects.create(**payload_dict)
+        record_upload("project_cover", cover_photo)
         if cover_photo:
             project.cover_image = cover_photo
             project.save()
 
+        prefetch_related_objects([project], "photos")
         return 201, ProjectResponse(data=project)
     except Exception as e:
         return 400, ErrorResponse(message="Error creating project", detail=str(e), code=400)
@@ -80,13 +87,14 @@ def update_project(request, project_id: int, payload: ProjectRequestSchema,
                    media_files: List[UploadedFile] = File(default=None),
                    cover_photo: UploadedFile = File(default=None)):
     try:
-        print(payload)
         project = Project.objects.get(id=project_id)
-        payload_dict = payload.dict(exclude={"photos"})
+        payload_dict = payload.dict(exclude={"photos"}, exclude_none=True)
         if status := payload_dict.get('status'):
             payload_dict['status'] = status.upper()
         for attr, value in payload_dict.items():
             setattr(project, attr, value)
+        record_upload("project_cover", cover_photo)
+        record_upload("project_photo", *(media_files or []))
         if cover_photo:
             project.cover_image = cover_photo
         project.save()
@@ -94,6 +102,7 @@ def update_project(request, project_id: int, payload: ProjectRequestSchema,
             ProjectPhoto.objects.filter(project=project).delete()
             for photo in media_files:
                 ProjectPhoto.objects.create(project=project, image=photo)
+        prefetch_related_objects([project], "photos")
         return 200, ProjectResponse(data=project)
     except Project.DoesNotExist:
         return 404, ErrorResponse(message="Project not found", code=404)
@@ -114,14 +123,17 @@ def delete_project(request, project_id: int):
 @router.post("/{project_id}/photos", response={201: ProjectResponse, 404: ErrorResponse, 400: ErrorResponse})
 def add_project_photos(request, project_id: int, payload: AddProjectPhoto, image: UploadedFile = File(default=None)):
     try:
-        project = Project.objects.prefetch_related("photos").get(id=project_id)
+        project = Project.objects.get(id=project_id)
         photo = ProjectPhoto.objects.create(
             project=project,
             name=payload.name,
             deliver_date=payload.deliver_date)
+        record_upload("project_photo", image)
         if image:
             photo.image = image
             photo.save()
+        # Prefetch after the insert so the response includes the new photo
+        prefetch_related_objects([project], "photos")
         return 201, ProjectResponse(data=project)
     except Project.DoesNotExist:
         return 404, ErrorResponse(message="Project not found", code=404)
@@ -173,12 +185,16 @@ def download_project_report(request, project_id: int):
     }
 
     # render HTML
-    html_string = render_to_string("project_report.html", context, request=request)
+    with span("report.render_html", project_id=project.id):
+        html_string = render_to_string("project_report.html", context, request=request)
+
+    # render to PDF; weasyprint (and its pango/cairo stack) is only loaded by workers that render a report
+    from weasyprint import HTML
 
-    # render to PDF
     html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
     pdf_io = BytesIO()
-    html.write_pdf(pdf_io)
+    with PDF_RENDER_SECONDS.time(), span("report.render_pdf", project_id=project.id):
+        html.write_pdf(pdf_io)
     pdf_io.seek(0)
 
     filename = f"NeedsAfrica_Project_Brief_{project.id}.pdf"
@@ -189,21 +205,16 @@ def download_project_report(request, project_id: int):
 
 @router.get("/project_stats/", auth=None,
             response={200: ProjectStats, 400: ErrorResponse, 404: ErrorResponse, 500: ErrorResponse})
-def get_stats(request):
+@decorate_view(read_from_replica)
+async def get_stats(request):
     """
     total, active, draft, completed
     """
 
-    qs = Project.objects.all()
-    total_ = qs.count()
-    completed = qs.filter(status="COMPLETED").count()
-    active = qs.filter(status="ACTIVE").count()
-    draft = qs.filter(status="DRAFT").count()
-
-    data = {
-        "total": total_,
-        "completed": completed,
-        "active": active,
-        "draft": draft
-    }
+    data = await Project.objects.aaggregate(
+        total=Count("id"),
+        completed=Count("id", filter=Q(status="COMPLETED")),
+        active=Count("id", filter=Q(status="ACTIVE")),
+        draft=Count("id", filter=Q(status="DRAFT")),
+    )
     return 200, ProjectStats(**data)
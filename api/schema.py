@@ -1,8 +1,10 @@
 from ninja import Schema, ModelSchema, FilterSchema
 from datetime import date, datetime
+from decimal import Decimal
 from typing import Optional, List, Any, Literal
 from core.schema import BaseResponseSchema, ErrorResponse
-from .models import (Donation, User, Project, ProjectPhoto, Volunteer, ExchangeRate, Subscription)
+from .models import (BASE_CURRENCY, Currency, Donation, Donor, User, Project, ProjectPhoto, Volunteer, ExchangeRate,
+                     Subscription)
 from core.clients import PaystackClient
 
 
@@ -73,6 +75,47 @@ class DonationResponse(BaseResponseSchema):
     data: DonationSchema | None = None
 
 
+class DonationStatusSchema(Schema):
+    reference: str
+    status: str
+    amount: float
+    currency: str
+    payment_completed_at: datetime | None = None
+
+
+class DonationStatusResponse(BaseResponseSchema):
+    data: DonationStatusSchema | None = None
+
+
+class DonationAnalyticsBucket(Schema):
+    start: date
+    group: int | str | None = None
+    count: int
+    total: float
+
+
+class DonationAnalyticsResponse(BaseResponseSchema):
+    currency: str
+    interval: str
+    group_by: str | None = None
+    data: List[DonationAnalyticsBucket]
+
+
+class RecurringMetricsSchema(Schema):
+    window_days: int
+    active: int
+    new: int
+    churned: int
+    churn_rate: float
+    mrr: dict[str, Decimal]
+    mrr_currency: str
+    mrr_total: Decimal
+
+
+class RecurringMetricsResponse(BaseResponseSchema):
+    data: RecurringMetricsSchema
+
+
 class DonationListResponse(BaseResponseSchema):
     page: int
     total: int
@@ -137,6 +180,8 @@ class VolunteerRequestSchema(Schema):
 
 
 class VolunteerSchema(ModelSchema):
+    cv: str | None = None
+
     class Meta:
         model = Volunteer
         fields = '__all__'
@@ -163,17 +208,33 @@ class VolunteerListSchema(BaseResponseSchema):
 
 
 class ExchangeRateSchema(ModelSchema):
+    # Kept for clients written when only NGN rates existed
+    usd_to_ngn_rate: Decimal | None = None
+
     class Meta:
         model = ExchangeRate
         fields = "__all__"
 
+    @staticmethod
+    def resolve_usd_to_ngn_rate(obj):
+        return obj.rate if obj.currency == "NGN" else None
+
 
 class ExchangeRatResponse(Schema):
     data: ExchangeRateSchema | None = None
 
 
+# Every supported currency, and those quoted against BASE_CURRENCY in the rate history
+CurrencyCode = Literal[tuple(Currency.values)]
+RateCurrency = Literal[tuple(code for code in Currency.values if code != BASE_CURRENCY)]
+
+
 class UpdateExchangeRateRequest(Schema):
-    usd_to_ngn_rate: float
+    currency: RateCurrency = "NGN"
+    # Units of `currency` per USD; usd_to_ngn_rate is the older spelling for NGN
+    rate: float | None = None
+    usd_to_ngn_rate: float | None = None
+    effective_date: datetime | None = None
 
 
 class ProjectStats(Schema):
@@ -209,3 +270,23 @@ class SubscriptionRequestSchema(Schema):
 
 class SubscriptionResponse(BaseResponseSchema):
     data: SubscriptionSchema | None = None
+
+
+class SubscriptionImportResult(Schema):
+    received: int = 0
+    created: int = 0
+    invalid: int = 0
+
+
+class SubscriptionImportResponse(BaseResponseSchema):
+    data: SubscriptionImportResult | None = None
+
+
+class DonorSchema(ModelSchema):
+    class Meta:
+        model = Donor
+        fields = '__all__'
+
+
+class DonorResponse(BaseResponseSchema):
+    data: DonorSchema | None = None
@@ -1,13 +1,22 @@
+import io
+from typing import Literal
+
 from django.core.paginator import Paginator, EmptyPage
+from django.db import IntegrityError
 from django.db.models import Q
-from ninja import Router, Query
+from django.http import StreamingHttpResponse
+from ninja import Router, Query, File
+from ninja.files import UploadedFile
 
 from core.schema import ErrorResponse
+from core.utils import read_csv_or_ndjson, stream_csv, stream_ndjson
 from .models import Subscription
 
 from .schema import SubscriptionResponse, \
     SubscriptionRequestSchema, SubscriptionListSchema,\
-    SubscriptionFilter
+    SubscriptionFilter, SubscriptionImportResponse
+
+EXPORT_FIELDS = ["id", "email", "active", "created_at"]
 
 router = Router(tags=["Subscription"])
 
@@ -19,24 +28,56 @@ def create_subscription(
         payload: SubscriptionRequestSchema,
 ):
     try:
-        # Check for duplicates
-        exists = Subscription.objects.filter(
-            email=payload.email.strip(),
-        ).exists()
-
-        if exists:
-            return 400, ErrorResponse(
-                message="Subscription already exists", code=400)
+        email = Subscription.normalize_email(payload.email)
+        if not email:
+            return 400, ErrorResponse(message="Invalid email", code=400)
 
-        sub = Subscription.objects.create(
-            email=payload.email, )
+        # Unique constraint catches duplicates in the same round trip
+        sub = Subscription.objects.create(email=email)
 
         return 201, SubscriptionResponse(data=sub)
 
+    except IntegrityError:
+        return 400, ErrorResponse(
+            message="Subscription already exists", code=400)
     except Exception as e:
         return 400, ErrorResponse(message="Error creating sub", detail=str(e), code=400)
 
 
+@router.post("/import", response={200: SubscriptionImportResponse, 400: ErrorResponse})
+def import_subscriptions(request, file: UploadedFile = File(...),
+                         fmt: Literal["csv", "ndjson"] = "csv", chunk_size: int = 1000):
+    """
+    Bulk import from a CSV (with an `email` column) or NDJSON upload.
+    Existing emails are skipped.
+    """
+    try:
+        lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        emails = (record.get("email") for record in read_csv_or_ndjson(lines, fmt))
+        result = Subscription.bulk_import(emails, chunk_size=chunk_size)
+        return 200, SubscriptionImportResponse(data=result)
+    except Exception as e:
+        return 400, ErrorResponse(message="Error importing subscriptions",
+                                  detail=str(e), code=400)
+
+
+@router.get("/export")
+def export_subscriptions(request, fmt: Literal["csv", "ndjson"] = "csv", active: bool | None = None):
+    """Stream every subscription as CSV or NDJSON"""
+    queryset = Subscription.objects.order_by("id")
+    if active is not None:
+        queryset = queryset.filter(active=active)
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=2000)
+
+    if fmt == "ndjson":
+        response = StreamingHttpResponse(stream_ndjson(EXPORT_FIELDS, rows),
+                                         content_type="application/x-ndjson")
+    else:
+        response = StreamingHttpResponse(stream_csv(EXPORT_FIELDS, rows), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="subscriptions.{fmt}"'
+    return response
+
+
 @router.get("/", response={200: SubscriptionListSchema, 400: ErrorResponse})
 def list_subscription(request, filters: SubscriptionFilter = Query(...),
                       page: int = 1, page_size: int = 10):
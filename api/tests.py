@@ -1,3 +1,870 @@
-from django.test import TestCase
+"""
+Endpoint benchmarks with query budgets.
 
-# Create your tests here.
+Every router endpoint is called against seeded data; each call must stay within
+its DB query budget and must not lazy-load a relation while its response schema
+is being built. Runs on SQLite with the stand-in gateways from core.gateway_stubs
+and a temporary MEDIA_ROOT:
+
+    python manage.py test api
+
+Set BENCHMARK_REPEAT to change how many times read endpoints are timed; the
+latency and query table per test class is printed only when it is set.
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Model, Sum
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.utils import timezone
+from ninja.schema import DjangoGetter
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.clients import BREAKERS
+from core.database import PIN_COOKIE, PrimaryPinMiddleware, ReplicaRouter, read_from_replica
+from core.gateway_stubs import StubPaypal, StubPaystack
+from core.metrics import MetricsMiddleware
+from .analytics import snapshot
+from .models import (Donation, Donor, ExchangeRate, GatewayPlan, IdempotencyKey, Project, ProjectPhoto, RecurringDonation, Subscription,
+                     User, Volunteer)
+
+REPEAT = int(os.getenv("BENCHMARK_REPEAT", "5"))
+REPORT = "BENCHMARK_REPEAT" in os.environ
+
+# Max queries per call, keyed by "METHOD route"; list endpoints must not grow with page size
+QUERY_BUDGETS = {
+    "POST /api/auth/login": 1,
+    "POST /api/auth/register": 3,
+    "GET /api/project/": 3,
+    "GET /api/project/{project_id}": 2,
+    "POST /api/project/": 3,
+    "PUT /api/project/{project_id}": 4,
+    "DELETE /api/project/{project_id}": 5,
+    "POST /api/project/{project_id}/photos": 5,
+    "DELETE /api/project/photos/{photo_id}": 3,
+    "GET /api/project/{project_id}/download_report": 1,
+    "GET /api/project/project_stats/": 1,
+    "POST /api/donation/donations": 4,
+    "POST /api/donation/donations (Idempotency-Key)": 6,
+    "POST /api/donation/paystack/webhook": 10,
+    "POST /api/donation/paypal/webhook": 10,
+    "GET /api/donation/execute_paypal/payment": 12,
+    "GET /api/donation/donation/{donation_id}": 2,
+    "GET /api/donation/donations": 3,
+    "GET /api/donation/donations/{reference}/status": 1,
+    "GET /api/donation/donors/{email}": 2,
+    "GET /api/donation/donors/{email}/donations": 4,
+    "GET /api/donation/donations/export": 2,
+    "GET /api/donation/donation_metric": 6,
+    "GET /api/donation/analytics": 3,
+    "GET /api/donation/recurring/metrics": 4,
+    "GET /api/donation/gateways/status": 1,
+    "GET /api/donation/exchange_rate": 1,
+    "POST /api/donation/exchange_rate/update": 2,
+    "POST /api/volunteer/": 3,
+    "GET /api/volunteer/": 3,
+    "GET /api/volunteer/{volunteer_id}": 2,
+    "DELETE /api/volunteer/{volunteer_id}": 3,
+    "POST /api/subscription/": 1,
+    "POST /api/subscription/import": 2,
+    "GET /api/subscription/export": 2,
+    "GET /api/subscription/": 3,
+    "GET /api/subscription/{subscription_id}": 2,
+}
+
+# 1x1 transparent GIF
+PIXEL = (b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+         b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+
+
+class QueryLog:
+    """execute_wrapper that records the SQL of every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # Savepoints only exist because TestCase wraps each test in a transaction
+        if not sql.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def detect_lazy_loads():
+    """
+    Record relations that ninja resolves on a model instance without them being
+    loaded up front (select_related / prefetch_related), i.e. one query per row.
+    """
+    found = []
+    original = DjangoGetter.__getattr__
+
+    def getattr_checked(getter, key):
+        obj = getter._obj
+        if isinstance(obj, Model):
+            field = next((f for f in obj._meta.get_fields() if f.name == key and f.is_relation), None)
+            if field is not None:
+                if field.many_to_one or field.one_to_one and field.concrete:
+                    lazy = not field.is_cached(obj) and getattr(obj, field.attname) is not None
+                else:
+                    accessor = field.get_accessor_name() if field.auto_created else field.name
+                    lazy = accessor not in getattr(obj, "_prefetched_objects_cache", {})
+                if lazy:
+                    found.append(f"{type(obj).__name__}.{key}")
+        return original(getter, key)
+
+    with mock.patch.object(DjangoGetter, "__getattr__", getattr_checked):
+        yield found
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class BenchmarkTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {}
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        # The volunteer cv field is bound to a storage instance at import time
+        cls.enterClassContext(mock.patch.object(Volunteer._meta.get_field("cv"), "storage",
+                                                FileSystemStorage(location=cls.media_root)))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if REPORT and cls.results:
+            lines = [f"\n{cls.__name__}: median ms / queries (budget)"]
+            for route, (ms, queries) in sorted(cls.results.items()):
+                lines.append(f"  {route:<48} {ms:8.2f} {queries:4d} ({QUERY_BUDGETS[route]})")
+            print("\n".join(lines))
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.user = User.objects.create_user(username="admin", email="admin@example.com", password="secret-pass",
+                                            is_staff=True)
+        ExchangeRate.objects.create(currency="NGN", rate=Decimal("1600"))
+
+        cls.projects = Project.objects.bulk_create([
+            Project(title=f"Project {i}", summary="Clean water for schools", target_amount=50000,
+                    currency=Project.CurrencyChoices.USD if i % 2 else Project.CurrencyChoices.NGN,
+                    status=Project.StatusChoices.ACTIVE if i % 3 else Project.StatusChoices.DRAFT,
+                    category=Project.CategoryChoices.values[i % len(Project.CategoryChoices.values)])
+            for i in range(24)
+        ])
+        ProjectPhoto.objects.bulk_create([
+            ProjectPhoto(project=project, name=f"Delivery {n}", image=f"project_photos/{project.id}-{n}.gif")
+            for project in cls.projects for n in range(3)
+        ])
+
+        cls.donor = Donor.objects.create(email="donor@example.com", full_name="Ada Donor",
+                                         lifetime_totals={"USD": "250.00"}, donation_count=25,
+                                         first_donation_at=now, last_donation_at=now)
+        statuses = Donation.StatusChoices.values
+        Donation.objects.bulk_create([
+            Donation(project=cls.projects[i % len(cls.projects)], donor_email=cls.donor.email,
+                     donor_full_name=cls.donor.full_name, donor=cls.donor if i % 4 == 0 else None,
+                     amount=Decimal(10 + i), currency="USD" if i % 2 else "NGN",
+                     status=statuses[i % len(statuses)], reference=f"seed-{i}",
+                     payment_client="PAYPAL" if i % 3 == 0 else "PAYSTACK",
+                     frequency="MONTHLY" if i % 5 == 0 else "ONCE")
+            for i in range(100)
+        ])
+        Volunteer.objects.bulk_create([
+            Volunteer(first_name=f"First{i}", last_name=f"Last{i}", age=20 + i, country="Ghana",
+                      role="lab-tech", availability="part-time")
+            for i in range(30)
+        ])
+        Subscription.objects.bulk_create([Subscription(email=f"reader{i}@example.com") for i in range(40)])
+
+    def setUp(self):
+        BREAKERS["paystack"].record_success()
+        BREAKERS["paypal"].record_success()
+        GatewayPlan._cache.clear()
+        ExchangeRate.invalidate_history()
+        snapshot.clear()
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def call(self, method, path, route, data=None, repeat=1, **extra):
+        """
+        Call an endpoint, enforce its query budget and lazy-load rule, and record its median latency.
+        Only idempotent requests should be repeated.
+        """
+        extra = {**self.auth, **extra}
+        if method != "get":
+            # JSON unless the caller asks for multipart with content_type=None
+            extra.setdefault("content_type", "application/json")
+            if extra["content_type"] is None:
+                del extra["content_type"]
+                if method != "post":
+                    # The test client only encodes multipart bodies for POST
+                    data = encode_multipart(BOUNDARY, data)
+                    extra["content_type"] = MULTIPART_CONTENT
+        timings = []
+        for _ in range(repeat):
+            log = QueryLog()
+            with detect_lazy_loads() as lazy, connection.execute_wrapper(log):
+                started = time.perf_counter()
+                response = getattr(self.client, method)(path, data, **extra)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.assertEqual(lazy, [], f"{route} lazy-loaded relations while serializing")
+            self.assertLessEqual(len(log.queries), QUERY_BUDGETS[route],
+                                 f"{route} ran {len(log.queries)} queries:\n" + "\n".join(log.queries))
+        self.results[route] = (statistics.median(timings), len(log.queries))
+        return response
+
+
+class AuthEndpointTests(BenchmarkTestCase):
+
+    def test_login_and_register(self):
+        response = self.call("post", "/api/auth/login", "POST /api/auth/login",
+                             {"username": "admin", "password": "secret-pass"})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.call("post", "/api/auth/register", "POST /api/auth/register",
+                             {"username": "new", "email": "new@example.com", "password": "pw-123456"})
+        self.assertEqual(response.status_code, 201)
+
+
+class ProjectEndpointTests(BenchmarkTestCase):
+
+    def test_reads(self):
+        project = self.projects[0]
+        response = self.call("get", "/api/project/", "GET /api/project/", {"page_size": 20}, repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"][0]["photos"]), 3)
+
+        response = self.call("get", f"/api/project/{project.id}", "GET /api/project/{project_id}", repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.call("get", "/api/project/project_stats/", "GET /api/project/project_stats/",
+                             repeat=REPEAT)
+        self.assertEqual(response.json()["total"], len(self.projects))
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        counts = []
+        for page_size in (2, 20):
+            log = QueryLog()
+            with connection.execute_wrapper(log):
+                self.client.get("/api/project/", {"page_size": page_size})
+            counts.append(len(log.queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_report(self):
+        # weasyprint needs the pango/cairo system libraries; stand in for it and check the view around it
+        html = mock.Mock()
+        html.return_value.write_pdf.side_effect = lambda target: target.write(b"%PDF-1.7")
+        with mock.patch.dict(sys.modules, {"weasyprint": mock.Mock(HTML=html)}):
+            response = self.call("get", f"/api/project/{self.projects[1].id}/download_report",
+                                 "GET /api/project/{project_id}/download_report")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response.content, b"%PDF-1.7")
+        self.assertIn(self.projects[1].title, html.call_args.kwargs["string"])
+
+    @mock.patch("core.database.replica_aliases", return_value=["replica_1"])
+    def test_authenticated_writer_is_pinned_to_primary(self, replicas):
+        cache.clear()
+        pinned = []
+        # Record the pin each replica-routed read sees, but read from the test database anyway
+        with mock.patch("core.database.replica_for", side_effect=lambda request: pinned.append(request.pin_primary)):
+            client = Client()
+            client.get("/api/project/", **self.auth)
+            response = client.put(f"/api/project/{self.projects[1].id}", encode_multipart(
+                BOUNDARY, {"payload": '{"title": "Renamed"}'}), content_type=MULTIPART_CONTENT, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+            client.get("/api/project/", **self.auth)
+            client.get("/api/project/")
+        self.assertEqual(pinned, [False, True, False])
+
+    def test_writes(self):
+        response = self.call("post", "/api/project/", "POST /api/project/",
+                             {"payload": '{"title": "New project", "target_amount": 1000}'},
+                             content_type=None)
+        self.assertEqual(response.status_code, 201, response.content)
+        project_id = response.json()["data"]["id"]
+
+        response = self.call("put", f"/api/project/{project_id}", "PUT /api/project/{project_id}",
+                             {"payload": '{"title": "Renamed", "status": "active"}'}, content_type=None)
+        self.assertEqual(response.status_code, 200)
+
+        image = SimpleUploadedFile("delivery.gif", PIXEL, content_type="image/gif")
+        response = self.call("post", f"/api/project/{project_id}/photos", "POST /api/project/{project_id}/photos",
+                             {"payload": '{"name": "Delivered"}', "image": image}, content_type=None)
+        self.assertEqual(response.status_code, 201)
+
+        photo = ProjectPhoto.objects.filter(project_id=project_id).first()
+        response = self.call("delete", f"/api/project/photos/{photo.id}", "DELETE /api/project/photos/{photo_id}")
+        self.assertEqual(response.status_code, 200)
+
+        response = self.call("delete", f"/api/project/{project_id}", "DELETE /api/project/{project_id}")
+        self.assertEqual(response.status_code, 200)
+
+
+class DonationEndpointTests(BenchmarkTestCase):
+
+    def test_reads(self):
+        donation = Donation.objects.first()
+        response = self.call("get", f"/api/donation/donation/{donation.id}", "GET /api/donation/donation/{donation_id}",
+                             repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.call("get", "/api/donation/donations", "GET /api/donation/donations",
+                             {"page_size": 50}, repeat=REPEAT)
+        self.assertEqual(response.json()["total"], 100)
+
+        response = self.call("get", f"/api/donation/donors/{self.donor.email}", "GET /api/donation/donors/{email}",
+                             repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.call("get", f"/api/donation/donors/{self.donor.email}/donations",
+                             "GET /api/donation/donors/{email}/donations", repeat=REPEAT)
+        self.assertEqual(response.json()["total"], 25)
+
+        response = self.call("get", "/api/donation/donations/export", "GET /api/donation/donations/export",
+                             {"fmt": "ndjson"}, repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+        self.call("get", "/api/donation/donation_metric", "GET /api/donation/donation_metric", repeat=REPEAT)
+        self.call("get", "/api/donation/gateways/status", "GET /api/donation/gateways/status", repeat=REPEAT)
+        response = self.call("get", "/api/donation/exchange_rate", "GET /api/donation/exchange_rate", repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_exchange_rate(self):
+        response = self.call("post", "/api/donation/exchange_rate/update", "POST /api/donation/exchange_rate/update",
+                             {"usd_to_ngn_rate": 1500})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ExchangeRate.objects.filter(is_active=True).count(), 2)
+        self.assertEqual(ExchangeRate.rate_at("NGN"), Decimal("1500"))
+
+        # Backdated rates re-value history: staff only, and only so far back
+        too_old = (timezone.now() - timezone.timedelta(days=365)).isoformat()
+        response = self.client.post("/api/donation/exchange_rate/update",
+                                    {"usd_to_ngn_rate": 1, "effective_date": too_old}, content_type="application/json",
+                                    **self.auth)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/donation/exchange_rate/update", {"usd_to_ngn_rate": 1},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+        response = self.client.post("/api/donation/exchange_rate/update", {"usd_to_ngn_rate": 1},
+                                    content_type="application/json", **self.auth)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(ExchangeRate.rate_at("NGN"), Decimal("1500"))
+
+    def test_rate_history(self):
+        seeded = ExchangeRate.objects.get()
+        before = seeded.effective_date - timezone.timedelta(days=30)
+        self.call("post", "/api/donation/exchange_rate/update", "POST /api/donation/exchange_rate/update",
+                  {"usd_to_ngn_rate": 1000, "effective_date": before.isoformat()})
+        self.assertEqual(ExchangeRate.rate_at("NGN", before), Decimal("1000"))
+        self.assertEqual(ExchangeRate.rate_at("NGN"), Decimal("1600"))
+        self.assertIsNone(ExchangeRate.rate_at("NGN", before - timezone.timedelta(seconds=1)))
+
+        response = self.client.get("/api/donation/exchange_rate", {"at": before.isoformat()})
+        self.assertEqual(Decimal(response.json()["data"]["rate"]), Decimal("1000"))
+
+        # Donations made while 1000 applied are re-valued at it, without a query per donation
+        old = Donation.objects.filter(project__currency="NGN", status=Donation.StatusChoices.PENDING)
+        old.update(created_at=before + timezone.timedelta(days=1), currency="USD", project_currency="NGN")
+        with self.assertNumQueries(5):
+            changed = Donation.revalue(batch_size=1000)
+        self.assertEqual(changed, old.count())
+        donation = old.first()
+        self.assertEqual(donation.exchange_rate_used, Decimal("1000"))
+        self.assertEqual(donation.project_currency_amount, donation.amount * 1000)
+
+    def test_multi_currency_conversion(self):
+        seeded = ExchangeRate.objects.get()
+        later = seeded.effective_date + timezone.timedelta(days=1)
+        for currency, rate in (("GBP", "0.8"), ("KES", "130"), ("EUR", "0.9")):
+            response = self.call("post", "/api/donation/exchange_rate/update", "POST /api/donation/exchange_rate/update",
+                                 {"currency": currency, "rate": rate, "effective_date": seeded.effective_date.isoformat()})
+            self.assertEqual(response.status_code, 200)
+        ExchangeRate.objects.create(currency="GBP", rate=Decimal("0.5"), effective_date=later)
+
+        self.assertEqual(ExchangeRate.convert_currency(100, "GBP", "KES", at=seeded.effective_date), Decimal("16250.00"))
+        self.assertEqual(ExchangeRate.convert_currency(1600, "NGN", "USD"), Decimal("1.00"))
+        with self.assertRaises(ValueError):
+            ExchangeRate.convert_currency(1, "GHS", "USD")
+
+        # One vectorized pass, at current rates and at a timestamp per amount
+        amounts, currencies = [1600, 10, 130, 9], ["NGN", "USD", "KES", "EUR"]
+        with self.assertNumQueries(0):
+            self.assertEqual(ExchangeRate.convert_many(amounts, currencies, "USD", at=seeded.effective_date).tolist(),
+                             [1.0, 10.0, 1.0, 10.0])
+        totals = ExchangeRate.convert_many([8, 8], ["GBP", "GBP"], "USD", at=[seeded.effective_date, later])
+        self.assertEqual(totals.tolist(), [10.0, 16.0])
+
+    def test_analytics(self):
+        response = self.call("get", "/api/donation/analytics", "GET /api/donation/analytics",
+                             {"interval": "day", "group_by": "currency", "currency": "USD"}, repeat=REPEAT)
+        buckets = response.json()["data"]
+        completed = Donation.objects.filter(status=Donation.StatusChoices.COMPLETED)
+        self.assertEqual(sum(bucket["count"] for bucket in buckets), completed.count())
+        ngn = completed.filter(currency="NGN").aggregate(total=Sum("amount"))["total"]
+        self.assertAlmostEqual(sum(bucket["total"] for bucket in buckets if bucket["group"] == "NGN"),
+                               float(ngn / 1600), places=2)
+
+        # A date without an offset is read in the current time zone rather than failing
+        start = (timezone.now() - timezone.timedelta(days=90)).date().isoformat()
+        naive = self.client.get("/api/donation/analytics", {"start": start}, **self.auth)
+        self.assertEqual(naive.status_code, 200)
+        self.assertEqual(naive.json(), self.client.get("/api/donation/analytics", {"start": f"{start}T00:00:00Z"},
+                                                       **self.auth).json())
+
+        # Completions in this worker are appended without another snapshot query
+        pending = Donation.objects.filter(status=Donation.StatusChoices.PENDING).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Donation.complete_many([pending.pk])
+        with self.assertNumQueries(0):
+            buckets = snapshot.series(interval="month", group_by="project")
+        self.assertEqual(sum(bucket["count"] for bucket in buckets), completed.count())
+
+    def test_paystack_checkout_and_webhook(self):
+        project = Project.objects.filter(status=Project.StatusChoices.ACTIVE, currency="USD").first()
+        with StubPaystack() as paystack, override_settings(PAYSTACK_API_URL=f"{paystack.url}/",
+                                                           PAYSTACK_SECRET_KEY=paystack.secret_key,
+                                                           FRONTEND_URL="http://frontend.invalid"):
+            response = self.call("post", "/api/donation/donations", "POST /api/donation/donations", {
+                "project_id": project.id, "donor_email": "new@example.com", "donor_full_name": "New Donor",
+                "amount": 20, "currency": "USD", "payment_client": "PAYSTACK",
+            })
+            self.assertEqual(response.status_code, 201)
+
+            reference = response.json()["checkout_url"].rsplit("/", 1)[-1]
+            body, signature = paystack.webhook(reference)
+            response = self.call("post", "/api/donation/paystack/webhook", "POST /api/donation/paystack/webhook",
+                                 body, content_type="application/json", HTTP_X_PAYSTACK_SIGNATURE=signature)
+            self.assertEqual(response.json()["status"], "success")
+
+        response = self.call("get", f"/api/donation/donations/{reference}/status",
+                             "GET /api/donation/donations/{reference}/status", repeat=REPEAT)
+        self.assertEqual(response.json()["data"]["status"], Donation.StatusChoices.COMPLETED)
+
+        project.refresh_from_db()
+        self.assertEqual(project.amount_raised, Decimal("20.00"))
+
+    def test_donor_rebuild_groups_padded_emails(self):
+        Donation.objects.bulk_create([
+            Donation(donor_email=email, donor_full_name="Padded", amount=Decimal("5.00"), currency="USD",
+                     status=Donation.StatusChoices.COMPLETED, reference=f"padded-{i}")
+            for i, email in enumerate([" padded@example.com", "Padded@example.com "])
+        ])
+        Donor.rebuild()
+        donor = Donor.objects.get(email="padded@example.com")
+        self.assertEqual(donor.donation_count, 2)
+        self.assertEqual(Donation.objects.filter(reference__startswith="padded-", donor=donor).count(), 2)
+
+    def test_racing_completions_apply_once(self):
+        project = Project.objects.filter(status=Project.StatusChoices.ACTIVE, currency="USD").first()
+        pending = Donation.objects.create(project=project, donor_email="race@example.com", donor_full_name="Race",
+                                          amount=Decimal("30.00"), currency="USD", reference="race-1")
+        # The webhook and the PayPal return both read the donation while it is still pending
+        webhook, redirect = Donation.objects.get(pk=pending.pk), Donation.objects.get(pk=pending.pk)
+        raised = Project.objects.get(pk=project.pk).amount_raised
+
+        self.assertTrue(webhook.transition(Donation.StatusChoices.COMPLETED, Donation.PAYABLE_STATUSES))
+        self.assertFalse(redirect.transition(Donation.StatusChoices.COMPLETED, Donation.PAYABLE_STATUSES))
+        self.assertEqual(redirect.status, Donation.StatusChoices.PENDING)
+
+        project.refresh_from_db()
+        self.assertEqual(project.amount_raised, raised + Decimal("30.00"))
+        self.assertEqual(Donation.objects.get(pk=pending.pk).status, Donation.StatusChoices.COMPLETED)
+
+    def test_reconcile_donations(self):
+        from api.management.commands.reconcile_donations import Command as Reconcile
+
+        project = Project.objects.filter(status=Project.StatusChoices.ACTIVE, currency="USD").first()
+        raised = project.amount_raised
+        with StubPaystack() as paystack, StubPaypal() as paypal, override_settings(
+                PAYSTACK_API_URL=f"{paystack.url}/", PAYSTACK_SECRET_KEY=paystack.secret_key,
+                PAYPAL_API_URL=paypal.url, PAYPAL_PAYMENT_MODE="sandbox", PAYPAL_CLIENT_ID="stub",
+                PAYPAL_SECRET_KEY="stub"):
+            def pending(name, gateway_state, age=timezone.timedelta(hours=1)):
+                """A PENDING donation `age` old whose gateway record is in `gateway_state`"""
+                if name.startswith("paypal"):
+                    reference = paypal.create_payment({"intent": "sale"})[1]["id"]
+                    paypal.payments[reference]["state"] = gateway_state
+                else:
+                    reference = paystack.initialize({"email": f"{name}@example.com"})[1]["data"]["reference"]
+                    paystack.transactions[reference]["status"] = gateway_state
+                donation = Donation.objects.create(
+                    project=project, donor_email=f"{name}@example.com", donor_full_name=name, amount=Decimal("10.00"),
+                    currency="USD", reference=reference,
+                    payment_client="PAYPAL" if name.startswith("paypal") else "PAYSTACK")
+                Donation.objects.filter(pk=donation.pk).update(created_at=timezone.now() - age)
+                return donation.pk
+
+            paid = pending("paid", "success")
+            paypal_paid = pending("paypal-paid", "approved")
+            declined = pending("declined", "failed")
+            abandoned = pending("abandoned", "abandoned")
+            stale = pending("stale", "abandoned", age=timezone.timedelta(days=3))
+            raced = pending("raced", "success")
+
+            # The webhook completes one of them after the gateway check but before the command applies it
+            apply = Reconcile.apply
+
+            def webhook_then_apply(command, outcomes):
+                Donation.objects.get(pk=raced).transition(Donation.StatusChoices.COMPLETED, Donation.PAYABLE_STATUSES)
+                apply(command, outcomes)
+
+            out = StringIO()
+            with mock.patch.object(Reconcile, "apply", webhook_then_apply):
+                call_command("reconcile_donations", stdout=out)
+        self.assertIn("checked=6", out.getvalue())
+        self.assertIn("completed=3 failed=1 expired=1 pending=1 error=0", out.getvalue())
+
+        statuses = dict(Donation.objects.filter(pk__in=[paid, paypal_paid, declined, abandoned, stale, raced])
+                        .values_list("pk", "status"))
+        self.assertEqual(statuses, {
+            paid: Donation.StatusChoices.COMPLETED, paypal_paid: Donation.StatusChoices.COMPLETED,
+            declined: Donation.StatusChoices.FAILED, abandoned: Donation.StatusChoices.PENDING,
+            stale: Donation.StatusChoices.CANCELLED, raced: Donation.StatusChoices.COMPLETED,
+        })
+        self.assertEqual(Donation.objects.get(pk=declined).failure_reason, "Paystack status: failed")
+
+        # The raced donation is counted by the webhook only
+        project.refresh_from_db()
+        self.assertEqual(project.amount_raised, raised + Decimal("30.00"))
+        donors = dict(Donor.objects.filter(email__in=["paid@example.com", "paypal-paid@example.com",
+                                                      "raced@example.com", "stale@example.com"])
+                      .values_list("email", "donation_count"))
+        self.assertEqual(donors, {"paid@example.com": 1, "paypal-paid@example.com": 1, "raced@example.com": 1})
+
+    def test_idempotent_checkout(self):
+        project = Project.objects.filter(status=Project.StatusChoices.ACTIVE, currency="USD").first()
+        payload = {"project_id": project.id, "donor_email": "retry@example.com", "donor_full_name": "Retry Donor",
+                   "amount": 20, "currency": "USD", "payment_client": "PAYSTACK"}
+        route = "POST /api/donation/donations (Idempotency-Key)"
+        with StubPaystack() as paystack, override_settings(PAYSTACK_API_URL=f"{paystack.url}/",
+                                                           PAYSTACK_SECRET_KEY=paystack.secret_key,
+                                                           FRONTEND_URL="http://frontend.invalid"):
+            first = self.call("post", "/api/donation/donations", route, payload, HTTP_IDEMPOTENCY_KEY="checkout-1")
+            retry = self.call("post", "/api/donation/donations", route, payload, HTTP_IDEMPOTENCY_KEY="checkout-1")
+            self.assertEqual(first.status_code, 201)
+            self.assertEqual(retry.status_code, 201)
+            self.assertEqual(retry.json(), first.json())
+            self.assertEqual(retry["Idempotent-Replayed"], "true")
+            self.assertEqual(len(paystack.transactions), 1)
+            self.assertEqual(Donation.objects.filter(donor_email="retry@example.com").count(), 1)
+
+            response = self.client.post("/api/donation/donations", {**payload, "amount": 25},
+                                        content_type="application/json", HTTP_IDEMPOTENCY_KEY="checkout-1")
+            self.assertEqual(response.status_code, 409)
+
+            # An expired key no longer replays
+            IdempotencyKey.objects.update(expires_at=timezone.now())
+            response = self.client.post("/api/donation/donations", payload, content_type="application/json",
+                                        HTTP_IDEMPOTENCY_KEY="checkout-1")
+            self.assertNotIn("Idempotent-Replayed", response)
+            self.assertEqual(len(paystack.transactions), 2)
+        self.assertEqual(IdempotencyKey.purge(), 0)
+
+        # A handler that outlives its lease, after a retry took the key over, has its writes rolled back
+        def slow_checkout():
+            Donation.objects.create(donor_email="slow@example.com", donor_full_name="Slow", amount=5, currency="USD")
+            IdempotencyKey.objects.filter(key="checkout-2").update(expires_at=timezone.now())
+            return 201, {"checkout_url": "http://gateway.invalid/slow"}
+
+        with self.assertRaises(IdempotencyKey.Conflict):
+            IdempotencyKey.run("donation.create", "checkout-2", "fingerprint", slow_checkout)
+        self.assertFalse(Donation.objects.filter(donor_email="slow@example.com").exists())
+
+    def test_paypal_subscription_execute_and_webhook(self):
+        project = Project.objects.filter(status=Project.StatusChoices.ACTIVE, currency="USD").first()
+        with StubPaypal() as paypal, override_settings(PAYPAL_API_URL=paypal.url, PAYPAL_PAYMENT_MODE="sandbox",
+                                                       PAYPAL_CLIENT_ID="stub", PAYPAL_SECRET_KEY="stub",
+                                                       PAYPAL_WEBHOOK_ID=paypal.webhook_id,
+                                                       FRONTEND_URL="http://frontend.invalid"):
+            response = self.client.post("/api/donation/donations", {
+                "project_id": project.id, "donor_email": "monthly@example.com", "donor_full_name": "Monthly",
+                "amount": 15, "currency": "USD", "payment_client": "PAYPAL", "frequency": "MONTHLY",
+            }, content_type="application/json")
+            self.assertEqual(response.status_code, 201)
+
+            token = response.json()["checkout_url"].rsplit("token=", 1)[-1]
+            response = self.call("get", "/api/donation/execute_paypal/payment",
+                                 "GET /api/donation/execute_paypal/payment", {"token": token})
+            self.assertEqual(response.status_code, 200)
+
+            body, headers = paypal.webhook(paypal.agreements[token]["id"], 15)
+            extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()}
+            response = self.call("post", "/api/donation/paypal/webhook", "POST /api/donation/paypal/webhook",
+                                 body, content_type="application/json", **extra)
+            self.assertEqual(response.json()["status"], "success")
+
+            # A redelivered event is not counted again
+            response = self.client.post("/api/donation/paypal/webhook", body, content_type="application/json",
+                                        **extra)
+            self.assertEqual(response.json()["status"], "already_processed")
+
+            ledger = RecurringDonation.objects.get(agreement_id=paypal.agreements[token]["id"])
+            self.assertEqual((ledger.charge_count, ledger.total_charged), (2, Decimal("30.00")))
+            response = self.call("get", "/api/donation/recurring/metrics", "GET /api/donation/recurring/metrics",
+                                 repeat=REPEAT)
+            self.assertEqual(response.json()["data"]["active"], 1)
+            self.assertEqual(response.json()["data"]["mrr"], {"USD": "15.00"})
+
+            body, headers = paypal.cancellation(ledger.agreement_id)
+            extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()}
+            response = self.client.post("/api/donation/paypal/webhook", body, content_type="application/json",
+                                        **extra)
+            self.assertEqual(response.json()["status"], "success")
+
+        metrics = RecurringDonation.metrics()
+        self.assertEqual((metrics["active"], metrics["churned"]), (0, 1))
+
+        # The backfill reaches the same counts from the donations alone and keeps the cancellation
+        RecurringDonation.objects.update(charge_count=0, total_charged=0)
+        call_command("backfill_recurring", stdout=StringIO())
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.charge_count, ledger.total_charged, ledger.status),
+                         (2, Decimal("30.00"), RecurringDonation.StatusChoices.CANCELLED))
+
+        project.refresh_from_db()
+        self.assertEqual(project.amount_raised, Decimal("30.00"))
+
+
+class VolunteerEndpointTests(BenchmarkTestCase):
+
+    def test_endpoints(self):
+        cv = SimpleUploadedFile("cv.pdf", b"%PDF-1.4 stub", content_type="application/pdf")
+        response = self.call("post", "/api/volunteer/", "POST /api/volunteer/", {
+            "payload": '{"first_name": "Kofi", "last_name": "Mensah", "age": 30, "country": "Ghana", '
+                       '"role": "lab-tech", "availability": "full-time"}',
+            "cv": cv,
+        }, content_type=None)
+        self.assertEqual(response.status_code, 201)
+        volunteer_id = response.json()["data"]["id"]
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, "volunteer_cvs", "cv.pdf")))
+
+        response = self.call("get", "/api/volunteer/", "GET /api/volunteer/", {"page_size": 20}, repeat=REPEAT)
+        self.assertEqual(response.json()["total"], 31)
+
+        response = self.call("get", f"/api/volunteer/{volunteer_id}", "GET /api/volunteer/{volunteer_id}",
+                             repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.call("delete", f"/api/volunteer/{volunteer_id}", "DELETE /api/volunteer/{volunteer_id}")
+        self.assertEqual(response.status_code, 204)
+
+
+class SubscriptionEndpointTests(BenchmarkTestCase):
+
+    def test_endpoints(self):
+        response = self.call("post", "/api/subscription/", "POST /api/subscription/", {"email": " New@Example.com"})
+        self.assertEqual(response.status_code, 201)
+
+        # Rows stored before emails were normalized still block their lower-cased form
+        Subscription.objects.create(email="Legacy@Example.com")
+        upload = SimpleUploadedFile("subs.csv", b"email\nreader1@example.com\nfresh@example.com\nnot-an-email\n"
+                                                b"legacy@example.com\n")
+        response = self.call("post", "/api/subscription/import", "POST /api/subscription/import",
+                             {"file": upload}, content_type=None)
+        self.assertEqual(response.json()["data"], {"received": 4, "created": 1, "invalid": 1})
+        self.assertEqual(Subscription.objects.filter(email__iexact="legacy@example.com").count(), 1)
+
+        response = self.call("get", "/api/subscription/export", "GET /api/subscription/export", repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.call("get", "/api/subscription/", "GET /api/subscription/", {"page_size": 20},
+                             repeat=REPEAT)
+        self.assertEqual(response.json()["total"], 43)
+
+        subscription = Subscription.objects.first()
+        response = self.call("get", f"/api/subscription/{subscription.id}",
+                             "GET /api/subscription/{subscription_id}", repeat=REPEAT)
+        self.assertEqual(response.status_code, 200)
+
+
+class AsgiInstrumentationTests(BenchmarkTestCase):
+    """Under ASGI the middleware runs on the event loop and the queries in sync_to_async threads"""
+
+    async def test_request_db_metrics(self):
+        recorded = []
+
+        def record(middleware, request, response, stats, elapsed):
+            recorded.append((request.path, stats.count))
+
+        with mock.patch.object(MetricsMiddleware, "record", autospec=True, side_effect=record):
+            # An async view, then a sync one
+            await AsyncClient().get("/api/project/", {"page_size": 5})
+            await AsyncClient().post("/api/subscription/", {"email": "asgi@example.com"},
+                                     content_type="application/json")
+        self.assertEqual(recorded, [("/api/project/", 3), ("/api/subscription/", 1)])
+
+    async def test_slow_query_log(self):
+        # The middleware is only loaded when SLOW_QUERY_MS is set, so each client builds its chain under the override
+        with override_settings(SLOW_QUERY_MS=0), self.assertLogs("needsafrica.slow_query", "WARNING") as logs:
+            await AsyncClient().get("/api/project/", {"page_size": 5})
+            await AsyncClient().post("/api/subscription/", {"email": "slow-asgi@example.com"},
+                                     content_type="application/json")
+        # Three queries for the async view, one for the sync view
+        self.assertEqual([record.db_alias for record in logs.records], ["default"] * 4)
+        self.assertIn("api_project", logs.records[0].sql)
+        self.assertTrue(logs.records[3].call_site.startswith("api/subscription_api.py"))
+
+    async def test_metrics_endpoint_needs_token_outside_debug(self):
+        self.assertEqual((await AsyncClient().get("/metrics")).status_code, 403)
+        with override_settings(METRICS_TOKEN="scrape"):
+            self.assertEqual((await AsyncClient().get("/metrics")).status_code, 403)
+            response = await AsyncClient().get("/metrics", headers={"Authorization": "Bearer scrape"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"needsafrica_http_request_db_queries", response.content)
+
+
+class LazyLoadDetectionTests(TestCase):
+
+    def test_unprefetched_relation_is_reported(self):
+        from .schema import ProjectSchema
+
+        project = Project.objects.create(title="Lazy")
+        with detect_lazy_loads() as lazy:
+            ProjectSchema.from_orm(project)
+        self.assertEqual(lazy, ["Project.photos"])
+
+        with detect_lazy_loads() as lazy:
+            ProjectSchema.from_orm(Project.objects.prefetch_related("photos").get(pk=project.pk))
+        self.assertEqual(lazy, [])
+
+
+@mock.patch("core.database.replica_aliases", return_value=["replica_1"])
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def read_alias(self, request):
+        return read_from_replica(lambda request: ReplicaRouter().db_for_read(Project))(request)
+
+    def test_reads_go_to_replica_until_client_writes(self, replicas):
+        factory = RequestFactory()
+        middleware = PrimaryPinMiddleware(lambda request: HttpResponse(status=201))
+        self.assertIsNone(ReplicaRouter().db_for_read(Project))
+
+        request = factory.get("/api/project/")
+        middleware(request)
+        self.assertEqual(self.read_alias(request), "replica_1")
+
+        response = middleware(factory.post("/api/subscription/"))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = factory.get("/api/project/")
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        middleware(request)
+        self.assertIsNone(self.read_alias(request))
+        self.assertEqual(ReplicaRouter().db_for_write(Project), "default")
+
+
+    async def test_async_pin_uses_async_cache_api(self, replicas):
+        pin_cache = mock.Mock(aget=mock.AsyncMock(return_value=None), aset=mock.AsyncMock())
+
+        async def created(request):
+            return HttpResponse(status=201)
+
+        middleware = PrimaryPinMiddleware(created)
+        auth = f"Bearer {RefreshToken.for_user(User(pk=7)).access_token}"
+        with mock.patch("core.database.caches", {"default": pin_cache}):
+            response = await middleware(RequestFactory().post("/api/subscription/", HTTP_AUTHORIZATION=auth))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        pin_cache.aget.assert_awaited_once_with("pin_primary:user:7")
+        pin_cache.aset.assert_awaited_once_with("pin_primary:user:7", 1, timeout=mock.ANY)
+        pin_cache.get.assert_not_called()
+        pin_cache.set.assert_not_called()
+
+
+class StartupTests(SimpleTestCase):
+
+    def test_deferred_modules_are_not_imported_at_startup(self):
+        # Raises CommandError if weasyprint, paypalrestsdk, cloudinary or numpy load before they are used;
+        # DEBUG=0 is the production configuration, with media on Cloudinary
+        for debug in ("1", "0"):
+            with self.subTest(DEBUG=debug), mock.patch.dict(os.environ, {"DATABASE_URL": "sqlite://:memory:",
+                                                                         "DEBUG": debug}):
+                call_command("startup_benchmark", runs=1, top=0, path="/api/donation/gateways/status",
+                             stdout=StringIO())
+
+
+class MiddlewareProfileTests(SimpleTestCase):
+
+    def test_api_skips_browser_middleware_admin_keeps_it(self):
+        response = self.client.get("/api/donation/gateways/status")
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn("X-Frame-Options", response.headers)
+        self.assertNotIn("Cookie", response.headers.get("Vary", ""))
+
+        response = self.client.get("/admin/login/")
+        self.assertEqual(response["X-Frame-Options"], "DENY")
+        self.assertIn("csrftoken", response.cookies)
+        response = Client(enforce_csrf_checks=True).post("/admin/login/", {"username": "a", "password": "b"})
+        self.assertEqual(response.status_code, 403)
+
+
+class MediaServingTests(SimpleTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        os.makedirs(os.path.join(media_root, "volunteer_cvs"))
+        with open(os.path.join(media_root, "volunteer_cvs", "cv.pdf"), "wb") as f:
+            f.write(b"0123456789")
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, MEDIA_OFFLOAD=""))
+
+    def test_conditional_and_range_requests(self):
+        response = self.client.get("/media/volunteer_cvs/cv.pdf")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        etag = response["ETag"]
+
+        response = self.client.get("/media/volunteer_cvs/cv.pdf", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get("/media/volunteer_cvs/cv.pdf", HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+        response = self.client.get("/media/volunteer_cvs/cv.pdf", HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get("/media/volunteer_cvs/cv.pdf", HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/media/volunteer_cvs/cv.pdf", HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+        self.assertEqual(self.client.post("/media/volunteer_cvs/cv.pdf").status_code, 405)
+
+    def test_offload_to_proxy(self):
+        with override_settings(MEDIA_OFFLOAD="x-accel-redirect"):
+            response = self.client.get("/media/volunteer_cvs/cv.pdf")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/volunteer_cvs/cv.pdf")
+        self.assertEqual(response.content, b"")
+
+        with override_settings(MEDIA_OFFLOAD="x-sendfile"):
+            response = self.client.get("/media/volunteer_cvs/cv.pdf")
+        self.assertTrue(response["X-Sendfile"].endswith(os.path.join("volunteer_cvs", "cv.pdf")))
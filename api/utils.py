@@ -4,26 +4,14 @@ from django.conf import settings
 def conversion(to_currency, from_currency, amount):
     from .models import ExchangeRate
 
-    rate = ExchangeRate.objects.last()
-
-    if not rate:
-        raise ValueError("Exchange rate not set in database")
-
-    if from_currency == to_currency:
-        return amount
-
-    if from_currency == "USD" and to_currency == "NGN":
-        return amount * rate.USD
-
-    if from_currency == "NGN" and to_currency == "USD":
-        return amount * rate.NGN
-
-    raise ValueError("Unsupported currency conversion")
+    return ExchangeRate.convert_currency(amount, from_currency, to_currency)
 
 
 def retrieve_storage():
     from django.core.files.storage import FileSystemStorage
-    if settings.DEBUG:
+    # Follows settings rather than DEBUG itself, which the test runner switches off
+    if "cloudinary_storage" not in settings.INSTALLED_APPS:
         return FileSystemStorage(location=settings.MEDIA_ROOT)  # local disk
-    from cloudinary_storage.storage import RawMediaCloudinaryStorage
-    return RawMediaCloudinaryStorage()
+    from core.storage import LazyStorage
+    # The Cloudinary SDK loads on the first cv upload or download, not when models are imported
+    return LazyStorage("volunteer_cvs")
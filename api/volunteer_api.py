@@ -1,8 +1,10 @@
 from django.core.paginator import Paginator, EmptyPage
 from django.db.models import Q
+from django.db.models.functions import Lower
 from ninja import Router, File, Form, Query
 from ninja.files import UploadedFile
 
+from core.metrics import record_upload
 from core.schema import ErrorResponse
 from .models import Volunteer
 
@@ -19,10 +21,13 @@ def create_volunteer(
 ):
     try:
         # Check for duplicates
-        exists = Volunteer.objects.filter(
-            first_name__iexact=payload.first_name.strip(),
-            last_name__iexact=payload.last_name.strip(),
-            role__iexact=payload.role.strip()
+        # Lower() rather than __iexact so the lookup can use volunteer_name_role_idx
+        exists = Volunteer.objects.alias(
+            first_name_lower=Lower('first_name'), last_name_lower=Lower('last_name'), role_lower=Lower('role')
+        ).filter(
+            first_name_lower=payload.first_name.strip().lower(),
+            last_name_lower=payload.last_name.strip().lower(),
+            role_lower=payload.role.strip().lower()
         ).exists()
 
         if exists:
@@ -41,6 +46,7 @@ def create_volunteer(
             email = payload.email
         )
 
+        record_upload("volunteer_cv", cv)
         if cv:
             volunteer.cv = cv
             volunteer.save()
@@ -2,15 +2,22 @@ from django.conf import settings
 from typing import Dict, Any, Optional
 from urllib.parse import urlparse, parse_qs
 import logging
+import random
 import requests
 import os
 import hmac
 import hashlib
 import datetime
-import paypalrestsdk
+import threading
+import time
 import os
+import sys
+import functools
 
-logger = logging.getLevelName(__name__)
+from core.metrics import GATEWAY_LATENCY
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
 
 
 class PaymentError(Exception):
@@ -20,6 +27,160 @@ class PaymentError(Exception):
         self.original_exception = original_exception
 
 
+class CircuitOpenError(PaymentError):
+    """Raised without calling the gateway while its breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Per-process breaker for one gateway.
+    Opens after `threshold` consecutive failures, lets a single trial call
+    through once `reset_seconds` have passed, and closes again on success.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and \
+                    time.monotonic() - self.opened_at >= settings.GATEWAY_BREAKER_RESET_SECONDS:
+                self.state = self.HALF_OPEN
+                return True
+            self.total_rejected += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.total_failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == self.HALF_OPEN or self.failures >= settings.GATEWAY_BREAKER_THRESHOLD:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "gateway": self.name,
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.opened_at else None,
+                "total_failures": self.total_failures,
+                "total_rejected": self.total_rejected,
+                "last_error": self.last_error,
+            }
+
+
+BREAKERS = {"paystack": CircuitBreaker("paystack"), "paypal": CircuitBreaker("paypal")}
+
+_call_timeout = threading.local()
+
+
+def gateway_timeout(gateway, operation):
+    """(connect, read) timeout for an operation, e.g. gateway_timeout("paystack", "verify_transaction")"""
+    return settings.GATEWAY_OPERATION_TIMEOUTS.get(
+        f"{gateway}.{operation}",
+        (settings.GATEWAY_CONNECT_TIMEOUT, settings.GATEWAY_READ_TIMEOUT)
+    )
+
+
+def _is_gateway_failure(error):
+    """Errors that say the gateway is unhealthy, as opposed to a rejected request"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    # paypalrestsdk is imported on first PayPal use, no error can come from it before that
+    paypal = sys.modules.get("paypalrestsdk")
+    if paypal and isinstance(error, paypal.exceptions.ServerError):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+def call_gateway(gateway, operation, func, idempotent=False):
+    """
+    Run `func(timeout)` through the gateway's circuit breaker.
+    Idempotent calls are retried on gateway failures with jittered exponential backoff.
+    """
+    breaker = BREAKERS[gateway]
+    if not breaker.allow():
+        GATEWAY_LATENCY.labels(gateway, operation, "circuit_open").observe(0)
+        raise CircuitOpenError(f"{operation} skipped, circuit open", gateway)
+
+    timeout = gateway_timeout(gateway, operation)
+    attempts = 1 + (settings.GATEWAY_MAX_RETRIES if idempotent else 0)
+    for attempt in range(attempts):
+        _call_timeout.value = timeout
+        started = time.perf_counter()
+        try:
+            with span(f"gateway.{gateway}.{operation}", attempt=attempt):
+                result = func(timeout)
+        except Exception as e:
+            failed = _is_gateway_failure(e)
+            GATEWAY_LATENCY.labels(gateway, operation, "failure" if failed else "rejected").observe(
+                time.perf_counter() - started)
+            if not failed:
+                breaker.record_success()
+                raise
+            breaker.record_failure(e)
+            if attempt == attempts - 1 or not breaker.allow():
+                raise
+            time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+        else:
+            GATEWAY_LATENCY.labels(gateway, operation, "success").observe(time.perf_counter() - started)
+            breaker.record_success()
+            return result
+        finally:
+            _call_timeout.value = None
+
+
+def gateway_status():
+    return [breaker.snapshot() for breaker in BREAKERS.values()]
+
+
+@functools.cache
+def timeout_api_class():
+    """paypalrestsdk Api that never issues a request without a timeout, defined on first PayPal use"""
+    import paypalrestsdk
+
+    class TimeoutApi(paypalrestsdk.Api):
+
+        def http_call(self, url, method, **kwargs):
+            kwargs.setdefault("timeout", getattr(_call_timeout, "value", None) or gateway_timeout("paypal", "default"))
+            return super().http_call(url, method, **kwargs)
+
+    return TimeoutApi
+
+
+_paypal_apis = {}
+
+
+def paypal_api(config):
+    """Shared Api per configuration so its OAuth token is reused across requests"""
+    key = tuple(sorted(config.items()))
+    api = _paypal_apis.get(key)
+    if api is None:
+        api = _paypal_apis[key] = timeout_api_class()(config)
+    return api
+
+
 class PaystackClient():
     def __init__(self):
         self.secret_key = settings.PAYSTACK_SECRET_KEY
@@ -28,41 +189,42 @@ class PaystackClient():
         self.client = requests.Session()
         self.client.headers.update({"Content-Type": "application/json",
                                     "Authorization": f"Bearer {self.secret_key}"})
-        print(self.secret_key, "secrete key")
         self.headers = {
             'Authorization': f'Bearer {self.secret_key}',
             'Content-Type': 'application/json'
         }
 
+    def _request(self, operation, method, url, idempotent=False, **kwargs):
+        def send(timeout):
+            response = self.client.request(method, url, timeout=timeout, **kwargs)
+            response.raise_for_status()
+            return response
+
+        return call_gateway("paystack", operation, send, idempotent=idempotent)
+
     def initialize_plan(self, payload: Dict[str, Any]) -> requests.Response:
         url = f"{self.api_url}plan"
         try:
-            response = self.client.post(url, json=payload)
-            response.raise_for_status()
-            print(response.json())
+            response = self._request("initialize_plan", "POST", url, json=payload)
             return response.json()
         except Exception as e:
-            print(f"Error initializing payment: {str(e)}")
+            logger.error(f"Error initializing plan: {str(e)}")
             raise PaymentError(str(e), "paystack", e)
 
     def initialize(self, payload: Dict[str, Any]) -> requests.Response:
         url = f"{self.api_url}transaction/initialize"
         try:
-            response = self.client.post(url, json=payload)
-            print(response.json())
-            response.raise_for_status()
-
+            response = self._request("initialize", "POST", url, json=payload)
             return response.json()
         except requests.exceptions.RequestException as e:
-            # logger.error(f"Error initializing payment: {str(e)}")
-            print(f"Error initializing payment: {str(e)}")
+            logger.error(f"Error initializing payment: {str(e)}")
             raise PaymentError(str(e), "paystack", e)
 
     def verify_transaction(self, reference: str) -> Dict[str, Any]:
         try:
-            res = self.client.get(f"https://api.paystack.co/transaction/verify/{reference}")
-            res.raise_for_status()
-            logger.info(f"Transaction verified: {res.json()}")
+            res = self._request("verify_transaction", "GET", f"{self.api_url}transaction/verify/{reference}",
+                                idempotent=True)
+            logger.debug("Transaction verified: %s", reference)
             return res.json()
         except requests.exceptions.RequestException as e:
             logger.error(f"Error verifying transaction: {e}")
@@ -75,6 +237,9 @@ class PaystackClient():
 
 class PaypalClient():
     def __init__(self):
+        import paypalrestsdk
+
+        self.sdk = paypalrestsdk
         self.secret_key = settings.PAYPAL_SECRET_KEY
         self.client_id = settings.PAYPAL_CLIENT_ID
         self.api_url = settings.PAYPAL_API_URL
@@ -82,42 +247,48 @@ class PaypalClient():
             'Authorization': f'Bearer {self.secret_key}',
             'Content-Type': 'application/json'
         }
-        print(settings.PAYPAL_API_URL,
-              self.client_id, self.secret_key)
-        paypalrestsdk.configure({
+        config = {
             "mode": settings.PAYPAL_PAYMENT_MODE,
             "client_id": self.client_id,
             "client_secret": self.secret_key
-        })
+        }
+        if self.api_url:
+            # Keep the SDK on the same host as our direct calls (also lets tests use a stand-in)
+            config["endpoint"] = self.api_url
+        self.api = paypal_api(config)
 
     def build_url(self, path):
         return f"{self.api_url}{path}"
 
+    def _sdk(self, operation, func, idempotent=False):
+        return call_gateway("paypal", operation, lambda timeout: func(), idempotent=idempotent)
+
     def get_access_token(self):
-        url = self.build_url("/v1/oauth2/token")
-        auth = (self.client_id, self.secret_key)
-        data = {'grant_type': 'client_credentials'}
-        response = requests.post(url, auth=auth, data=data)
-        print(response.text)
-        response.raise_for_status()
-        return response.json()['access_token']
+        # The shared SDK Api caches the token until it expires
+        return self._sdk("get_access_token", self.api.get_access_token, idempotent=True)
 
     def verify_webhook_signature(self, verification_data):
         access_token = self.get_access_token()
-        print(self.api_url)
         verify_url = self.build_url("/v1/notifications/verify-webhook-signature")
         headers = {
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json'
         }
-        response = requests.post(verify_url, json=verification_data, headers=headers)
+
+        def verify(timeout):
+            response = requests.post(verify_url, json=verification_data, headers=headers, timeout=timeout)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            return response
+
+        response = call_gateway("paypal", "verify_webhook_signature", verify, idempotent=True)
         if response.status_code == 200:
             result = response.json()
             return result.get('verification_status') == 'SUCCESS'
         return False
 
     def create_payment(self, amount, currency="USD", return_url=None, cancel_url=None, description="Deposit to wallet"):
-        payment = paypalrestsdk.Payment({
+        payment = self.sdk.Payment({
             "intent": "sale",
             "payer": {
                 "payment_method": "paypal"
@@ -142,8 +313,8 @@ class PaypalClient():
                 },
                 "description": description
             }]
-        })
-        if payment.create():
+        }, api=self.api)
+        if self._sdk("create_payment", payment.create):
             approval_url = None
             for link in payment.links:
                 if link.rel == "approval_url":
@@ -153,10 +324,11 @@ class PaypalClient():
         else:
             return {"success": False, "error": payment.error}
 
-    def subcription_payment(self, amount, currency="USD", return_url=None, cancel_url=None, name="",
+    def create_billing_plan(self, amount, currency="USD", return_url=None, cancel_url=None,
                             description="NeedsAfrica donation"):
-        plan = paypalrestsdk.BillingPlan({
-            "name": f"Monthly Donation Plan ${amount}",
+        """Create and activate a monthly billing plan; returns the plan id"""
+        plan = self.sdk.BillingPlan({
+            "name": f"Monthly Donation Plan {amount} {currency}",
             "description": f"{description}",
             "type": "INFINITE",
             "payment_definitions": [{
@@ -164,7 +336,7 @@ class PaypalClient():
                 "type": "REGULAR",
                 "frequency": "MONTH",
                 "frequency_interval": "1",
-                "amount": {"currency": "USD", "value": amount},
+                "amount": {"currency": currency, "value": amount},
                 "cycles": "0"
             }],
             "merchant_preferences": {
@@ -173,44 +345,67 @@ class PaypalClient():
                 "max_fail_attempts": "1",
                 "return_url": return_url or settings.FRONTEND_URL,
                 "cancel_url": cancel_url or settings.FRONTEND_URL,
-                "setup_fee": {"value": amount, "currency": "USD"}
+                "setup_fee": {"value": amount, "currency": currency}
             }
-        })
+        }, api=self.api)
 
-        if plan.create():
-            approval_url = None
-            plan.activate()
-            future = datetime.datetime.utcnow() + datetime.timedelta(hours=25)
-            start_date = future.strftime("%Y-%m-%dT%H:%M:%SZ")
-            agreement = paypalrestsdk.BillingAgreement({
-                "name": "Monthly Donation Agreement",
-                "description": "Agree to donate $100 every month",
-                "start_date": start_date,
-                "plan": {"id": plan.id},
-                "payer": {"payment_method": "paypal"}
-            })
-
-            if agreement.create():
-                print("Agreement object", agreement)
-
-                # return {"error": "Failed to create agreement", "details": agreement.error}
-                for link in agreement.links:
-                    if link.rel == "approval_url":
-                        approval_url = str(link.href)
-                        token = parse_qs(urlparse(approval_url).query).get('token', [None])[0]
-                        print("Agreement token:", token)
-                        return {"success": True, "approval_url": approval_url, "token": token}
+        if not self._sdk("create_billing_plan", plan.create) or \
+                not self._sdk("activate_billing_plan", plan.activate, idempotent=True):
+            raise PaymentError(str(plan.error), "paypal")
+        return plan.id
+
+    def subcription_payment(self, amount, currency="USD", return_url=None, cancel_url=None, name="",
+                            description="NeedsAfrica donation", plan_id=None):
+        """
+        Create a billing agreement for the donor. Pass `plan_id` to reuse an
+        existing plan instead of creating and activating a new one.
+        """
+        if not plan_id:
+            plan_id = self.create_billing_plan(amount, currency, return_url, cancel_url, description)
+
+        future = datetime.datetime.utcnow() + datetime.timedelta(hours=25)
+        start_date = future.strftime("%Y-%m-%dT%H:%M:%SZ")
+        agreement = self.sdk.BillingAgreement({
+            "name": "Monthly Donation Agreement",
+            "description": f"Agree to donate {amount} {currency} every month",
+            "start_date": start_date,
+            "plan": {"id": plan_id},
+            "payer": {"payment_method": "paypal"},
+            # Plans are shared between donors, so redirect URLs are set per agreement
+            "override_merchant_preferences": {
+                "return_url": return_url or settings.FRONTEND_URL,
+                "cancel_url": cancel_url or settings.FRONTEND_URL,
+            }
+        }, api=self.api)
+
+        if self._sdk("create_billing_agreement", agreement.create):
+            for link in agreement.links:
+                if link.rel == "approval_url":
+                    approval_url = str(link.href)
+                    token = parse_qs(urlparse(approval_url).query).get('token', [None])[0]
+                    return {"success": True, "approval_url": approval_url, "token": token}
+        return {"success": False, "error": agreement.error}
+
+    def get_payment(self, payment_id):
+        """Look up a one-time payment; returns its state or raises PaymentError"""
+        try:
+            payment = self._sdk("get_payment",
+                                lambda: self.sdk.Payment.find(payment_id, api=self.api), idempotent=True)
+        except Exception as e:
+            raise PaymentError(str(e), "paypal", e)
+        return {"id": payment.id, "state": payment.state}
 
     def execute_payment_or_subscription(self, payment_id, payer_id, token):
         if payer_id:
-            payment = paypalrestsdk.Payment.find(payment_id)
-            payment = payment.execute({"payer_id": payer_id})
+            # execute only needs the id, so skip the Payment.find round trip
+            payment = self.sdk.Payment({"id": payment_id}, api=self.api)
+            payment = self._sdk("execute_payment", lambda: payment.execute({"payer_id": payer_id}))
             if payment:
                 return {"success": True}
             return {"success": False}
         else:
-            payment = paypalrestsdk.BillingAgreement.execute(token)
-            print(payment)
+            payment = self._sdk("execute_billing_agreement",
+                                lambda: self.sdk.BillingAgreement.execute(token, api=self.api))
             if payment:
                 return {"success": True, "agreement_id": payment.id}
             return False
@@ -0,0 +1,223 @@
+"""
+DATABASES entries built from DATABASE_URL-style URLs.
+
+On PostgreSQL with psycopg 3 and psycopg_pool installed, connections come from
+Django's native pool (CONN_MAX_AGE must be 0 then). Otherwise (psycopg2,
+SQLite, DB_POOL=0) connections persist for CONN_MAX_AGE seconds. Either way
+CONN_HEALTH_CHECKS is on, which for the pool means every connection is checked
+before it is handed out.
+"""
+import functools
+import importlib.util
+import os
+import random
+import time
+from contextvars import ContextVar
+
+import dj_database_url
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+
+def pooling_available():
+    return bool(importlib.util.find_spec("psycopg") and importlib.util.find_spec("psycopg_pool"))
+
+
+def pool_options():
+    """psycopg_pool.ConnectionPool arguments from DB_POOL_* environment variables"""
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        # Seconds a request waits for a free connection before failing
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+        "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+    }
+
+
+def database_config(url):
+    config = dj_database_url.parse(url, ssl_require=False)
+    is_postgres = config["ENGINE"] == "django.db.backends.postgresql"
+
+    if is_postgres and os.getenv("DB_POOL", "1") == "1" and pooling_available():
+        config["CONN_MAX_AGE"] = 0
+        config.setdefault("OPTIONS", {})["pool"] = pool_options()
+    else:
+        config["CONN_MAX_AGE"] = int(os.getenv("CONN_MAX_AGE", "60"))
+    config["CONN_HEALTH_CHECKS"] = True
+    return config
+
+
+def wrap_every_connection(wrapper):
+    """
+    Install an execute_wrapper on every connection, already open or opened later, in any thread.
+    Connections are per thread and under ASGI views query from sync_to_async threads, so a
+    wrapper entered on the request's own connection never sees their queries; `wrapper` should
+    find out which request a query belongs to from a ContextVar, which those threads inherit.
+    """
+    def install(connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False, dispatch_uid=f"{wrapper.__module__}.{wrapper.__qualname__}")
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+# Read replicas
+#
+# DATABASE_REPLICA_URLS adds "replica_1", "replica_2", ... next to "default". Only views
+# wrapped in read_from_replica() read from them; everything else, and every write, uses the
+# primary. After a successful write the client's reads are pinned to the primary for a short
+# while, so it does not read its own write back from a lagging replica. Authenticated clients
+# are pinned by the user id in their bearer token, in the shared cache (cross-origin frontends
+# never send cookies); anonymous ones get a cookie.
+
+REPLICA_PREFIX = "replica_"
+PIN_COOKIE = "pin_primary"
+PIN_CACHE_KEY = "pin_primary:user:{}"
+
+_read_alias = ContextVar("read_alias", default=None)
+
+
+def replica_databases(urls):
+    """DATABASES entries for a comma separated list of replica URLs"""
+    databases = {}
+    for number, url in enumerate(filter(None, (url.strip() for url in urls.split(","))), 1):
+        config = database_config(url)
+        # Tests run against the primary's test database instead of creating one per replica
+        config["TEST"] = {"MIRROR": DEFAULT_DB_ALIAS}
+        databases[f"{REPLICA_PREFIX}{number}"] = config
+    return databases
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def replica_for(request):
+    """Replica alias for this request, or None when it must read from the primary"""
+    replicas = replica_aliases()
+    if not replicas or getattr(request, "pin_primary", False):
+        return None
+    # Reads inside a transaction on the primary must see its uncommitted writes
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return None
+    return random.choice(replicas)
+
+
+def read_from_replica(run):
+    """
+    Operation decorator sending the endpoint's reads to a replica, used as
+    @decorate_view(read_from_replica) so it also covers response serialization.
+    """
+    if iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_alias.set(replica_for(request))
+            try:
+                return await run(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(request, *args, **kwargs):
+        token = _read_alias.set(replica_for(request))
+        try:
+            return run(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+def token_subject(request):
+    """User id claim of a valid bearer access token, checked without a database query; None otherwise"""
+    scheme, _, raw = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not raw.strip():
+        return None
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        return AccessToken(raw.strip()).get(api_settings.USER_ID_CLAIM)
+    except TokenError:
+        return None
+
+
+class PrimaryPinMiddleware:
+    """Pin a client's reads to the primary for REPLICA_PIN_SECONDS after it writes"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        cache = caches[settings.REPLICA_PIN_CACHE]
+        key = self.read_pin(request)
+        if key is not None:
+            request.pin_primary = cache.get(key) is not None
+        response = self.get_response(request)
+        key = self.set_pin(request, response)
+        if key is not None:
+            cache.set(key, 1, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        # A network cache (Redis) must not block the event loop
+        cache = caches[settings.REPLICA_PIN_CACHE]
+        key = self.read_pin(request)
+        if key is not None:
+            request.pin_primary = await cache.aget(key) is not None
+        response = await self.get_response(request)
+        key = self.set_pin(request, response)
+        if key is not None:
+            await cache.aset(key, 1, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def read_pin(self, request):
+        """Read an anonymous client's pin cookie; returns the cache key holding an authenticated client's pin"""
+        request.pin_primary = False
+        if not replica_aliases():
+            return None
+        request.pin_subject = token_subject(request)
+        if request.pin_subject is not None:
+            return PIN_CACHE_KEY.format(request.pin_subject)
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        request.pin_primary = pinned_until > time.time()
+        return None
+
+    def set_pin(self, request, response):
+        """Pin an anonymous writer by cookie; returns the cache key pinning an authenticated one"""
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400 and replica_aliases():
+            seconds = settings.REPLICA_PIN_SECONDS
+            subject = getattr(request, "pin_subject", None)
+            if subject is not None:
+                return PIN_CACHE_KEY.format(subject)
+            response.set_cookie(PIN_COOKIE, f"{time.time() + seconds:.0f}", max_age=seconds,
+                                httponly=True, samesite="Lax")
+        return None
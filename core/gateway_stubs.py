@@ -0,0 +1,317 @@
+"""
+Local stand-ins for the Paystack and PayPal REST APIs, used for load testing.
+
+Each stub is a small threaded HTTP server that returns payloads shaped like the
+real gateway, with configurable latency and failure rate, and can produce
+correctly signed webhooks for the transactions it has seen.
+"""
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubGateway:
+    """Base class: runs routes on a background ThreadingHTTPServer"""
+
+    routes = []
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, failure_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.failure_count = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _should_fail(self):
+        with self.lock:
+            self.request_count += 1
+            failed = self.random.random() < self.failure_rate
+            if failed:
+                self.failure_count += 1
+            return failed
+
+    def _handler_class(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if gateway.latency_ms:
+                    time.sleep(gateway.latency_ms / 1000)
+
+                path = self.path.split("?", 1)[0]
+                for route_method, pattern, name in gateway.routes:
+                    match = re.fullmatch(pattern, path)
+                    if route_method == method and match:
+                        break
+                else:
+                    return self._send(404, {"message": "Not found"})
+
+                if gateway._should_fail():
+                    return self._send(503, {"message": "Stub gateway failure"})
+
+                try:
+                    body = json.loads(raw) if raw and raw[:1] in (b"{", b"[") else raw.decode()
+                except ValueError:
+                    body = {}
+                status, payload = getattr(gateway, name)(body, *match.groups())
+                self._send(status, payload)
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+        return Handler
+
+
+class StubPaystack(StubGateway):
+    """
+    Paystack stand-in. Point PAYSTACK_API_URL at `stub.url + "/"`.
+    `webhook(reference)` returns a charge.success body and its X-Paystack-Signature.
+    """
+
+    routes = [
+        ("POST", r"/plan", "create_plan"),
+        ("POST", r"/transaction/initialize", "initialize"),
+        ("GET", r"/transaction/verify/([^/]+)", "verify"),
+    ]
+
+    def __init__(self, secret_key="sk_test_stub", **kwargs):
+        super().__init__(**kwargs)
+        self.secret_key = secret_key
+        self.transactions = {}
+
+    def create_plan(self, body):
+        plan_code = f"PLN_{uuid.uuid4().hex[:14]}"
+        return 200, {
+            "status": True,
+            "message": "Plan created",
+            "data": {
+                "name": body.get("name"),
+                "interval": body.get("interval"),
+                "amount": body.get("amount"),
+                "currency": body.get("currency"),
+                "plan_code": plan_code,
+                "id": self.random.randint(1, 10 ** 7),
+            },
+        }
+
+    def initialize(self, body):
+        reference = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.transactions[reference] = dict(body, status="abandoned")
+        return 200, {
+            "status": True,
+            "message": "Authorization URL created",
+            "data": {
+                "authorization_url": f"{self.url}/checkout/{reference}",
+                "access_code": uuid.uuid4().hex[:15],
+                "reference": reference,
+            },
+        }
+
+    def verify(self, body, reference):
+        transaction = self.transactions.get(reference)
+        if not transaction:
+            return 400, {"status": False, "message": "Transaction reference not found"}
+        return 200, {"status": True, "message": "Verification successful",
+                     "data": self._transaction_data(reference, transaction)}
+
+    def _transaction_data(self, reference, transaction):
+        return {
+            "reference": reference,
+            "status": transaction["status"],
+            "gateway_response": "Successful" if transaction["status"] == "success" else "Abandoned",
+            "amount": transaction.get("amount"),
+            "currency": transaction.get("currency"),
+            "paid_at": datetime.now(timezone.utc).isoformat(),
+            "channel": "card",
+            "customer": {"email": transaction.get("email")},
+            "plan": transaction.get("plan"),
+        }
+
+    def webhook(self, reference):
+        """Mark the transaction paid; returns (body bytes, signature header value)"""
+        with self.lock:
+            transaction = self.transactions[reference]
+            transaction["status"] = "success"
+        body = json.dumps({"event": "charge.success",
+                           "data": self._transaction_data(reference, transaction)}).encode()
+        signature = hmac.new(self.secret_key.encode(), body, hashlib.sha512).hexdigest()
+        return body, signature
+
+
+class StubPaypal(StubGateway):
+    """
+    PayPal REST v1 stand-in. Point PAYPAL_API_URL at `stub.url`.
+    `webhook(agreement_id, amount, currency)` returns a PAYMENT.SALE.COMPLETED
+    body and the transmission headers its verify endpoint accepts.
+    """
+
+    routes = [
+        ("POST", r"/v1/oauth2/token", "token"),
+        ("POST", r"/v1/payments/payment", "create_payment"),
+        ("GET", r"/v1/payments/payment/([^/]+)", "get_payment"),
+        ("POST", r"/v1/payments/payment/([^/]+)/execute", "execute_payment"),
+        ("POST", r"/v1/payments/billing-plans", "create_plan"),
+        ("PATCH", r"/v1/payments/billing-plans/([^/]+)", "update_plan"),
+        ("POST", r"/v1/payments/billing-agreements", "create_agreement"),
+        ("POST", r"/v1/payments/billing-agreements/([^/]+)/agreement-execute", "execute_agreement"),
+        ("POST", r"/v1/notifications/verify-webhook-signature", "verify_webhook"),
+    ]
+
+    def __init__(self, webhook_id="WH-STUB", webhook_secret="stub-webhook-secret", **kwargs):
+        super().__init__(**kwargs)
+        self.webhook_id = webhook_id
+        self.webhook_secret = webhook_secret
+        self.payments = {}
+        self.agreements = {}
+
+    def token(self, body):
+        return 200, {"access_token": f"A21.{uuid.uuid4().hex}", "token_type": "Bearer",
+                     "expires_in": 32400, "app_id": "APP-STUB"}
+
+    def create_payment(self, body):
+        payment_id = f"PAYID-{uuid.uuid4().hex[:24].upper()}"
+        token = f"EC-{uuid.uuid4().hex[:17].upper()}"
+        payment = dict(body, id=payment_id, state="created", create_time=datetime.now(timezone.utc).isoformat())
+        payment["links"] = [
+            {"href": f"{self.url}/v1/payments/payment/{payment_id}", "rel": "self", "method": "GET"},
+            {"href": f"{self.url}/checkoutnow?paymentId={payment_id}&token={token}",
+             "rel": "approval_url", "method": "REDIRECT"},
+            {"href": f"{self.url}/v1/payments/payment/{payment_id}/execute", "rel": "execute", "method": "POST"},
+        ]
+        with self.lock:
+            self.payments[payment_id] = payment
+        return 201, payment
+
+    def get_payment(self, body, payment_id):
+        payment = self.payments.get(payment_id)
+        if not payment:
+            return 404, {"name": "INVALID_RESOURCE_ID", "message": "Requested resource ID was not found."}
+        return 200, payment
+
+    def execute_payment(self, body, payment_id):
+        payment = self.payments.get(payment_id)
+        if not payment:
+            return 404, {"name": "INVALID_RESOURCE_ID", "message": "Requested resource ID was not found."}
+        with self.lock:
+            payment["state"] = "approved"
+            payment["payer"] = {"payment_method": "paypal", "payer_info": {"payer_id": body.get("payer_id")}}
+        return 200, payment
+
+    def create_plan(self, body):
+        plan = dict(body, id=f"P-{uuid.uuid4().hex[:24].upper()}", state="CREATED")
+        return 201, plan
+
+    def update_plan(self, body, plan_id):
+        return 200, {}
+
+    def create_agreement(self, body):
+        token = f"EC-{uuid.uuid4().hex[:17].upper()}"
+        with self.lock:
+            self.agreements[token] = dict(body, state="Pending")
+        return 201, dict(body, links=[
+            {"href": f"{self.url}/webapps/checkout?token={token}", "rel": "approval_url", "method": "REDIRECT"},
+            {"href": f"{self.url}/v1/payments/billing-agreements/{token}/agreement-execute",
+             "rel": "execute", "method": "POST"},
+        ])
+
+    def execute_agreement(self, body, token):
+        agreement = self.agreements.get(token)
+        if not agreement:
+            return 404, {"name": "INVALID_RESOURCE_ID", "message": "Requested resource ID was not found."}
+        with self.lock:
+            agreement.update(state="Active", id=f"I-{uuid.uuid4().hex[:12].upper()}")
+        return 200, agreement
+
+    def _signature(self, transmission_id, transmission_time, body):
+        message = f"{transmission_id}|{transmission_time}|{self.webhook_id}|{zlib.crc32(body)}"
+        return hmac.new(self.webhook_secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+    def verify_webhook(self, body):
+        event = json.dumps(body.get("webhook_event", {})).encode()
+        expected = self._signature(body.get("transmission_id"), body.get("transmission_time"), event)
+        valid = body.get("webhook_id") == self.webhook_id and \
+            hmac.compare_digest(expected, body.get("transmission_sig") or "")
+        return 200, {"verification_status": "SUCCESS" if valid else "FAILURE"}
+
+    def webhook(self, agreement_id, amount, currency="USD"):
+        """Build a recurring charge event; returns (body bytes, headers dict)"""
+        return self.event("PAYMENT.SALE.COMPLETED", {
+            "id": uuid.uuid4().hex[:17].upper(),
+            "state": "completed",
+            "billing_agreement_id": agreement_id,
+            "amount": {"total": str(amount), "currency": currency},
+        })
+
+    def cancellation(self, agreement_id):
+        """Build a billing agreement cancellation event; returns (body bytes, headers dict)"""
+        return self.event("BILLING.AGREEMENT.CANCELLED", {"id": agreement_id, "state": "Cancelled"})
+
+    def event(self, event_type, resource):
+        event = {"id": f"WH-{uuid.uuid4().hex[:20].upper()}", "event_type": event_type, "resource": resource}
+        body = json.dumps(event).encode()
+        transmission_id = str(uuid.uuid4())
+        transmission_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        # The app re-serializes the parsed event before verification, so sign that form
+        signed = json.dumps(json.loads(body)).encode()
+        headers = {
+            "Paypal-Auth-Algo": "SHA256withRSA",
+            "Paypal-Cert-Url": f"{self.url}/certs/stub",
+            "Paypal-Transmission-Id": transmission_id,
+            "Paypal-Transmission-Sig": self._signature(transmission_id, transmission_time, signed),
+            "Paypal-Transmission-Time": transmission_time,
+        }
+        return body, headers
@@ -0,0 +1,85 @@
+"""
+Structured, non-blocking logging.
+
+Request threads only put records on an in-memory queue; a background
+QueueListener formats them as JSON lines and writes them to stderr.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including `extra=` fields"""
+
+    converter = time.gmtime
+
+    def format(self, record):
+        payload = {
+            "ts": f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class NonBlockingHandler(QueueHandler):
+    """
+    QueueHandler that owns its QueueListener.
+    When the queue is full records are dropped (and counted) instead of blocking the caller.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.target.setFormatter(JsonFormatter())
+        self.listener = None
+        self._start_listener()
+        atexit.register(self.stop_listener)
+        # The listener thread does not survive fork (gunicorn --preload), so start a new one in the child
+        os.register_at_fork(after_in_child=self._start_listener)
+
+    def _start_listener(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def stop_listener(self):
+        if self.listener and self.listener._thread:
+            self.listener.stop()
+
+    def prepare(self, record):
+        """Render message and traceback on the caller's thread, keep `extra=` fields for the formatter"""
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = self.target.formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
@@ -0,0 +1,137 @@
+"""
+Serving locally stored media (MEDIA_ROOT) when it is not on Cloudinary.
+
+serve_media answers conditional requests (ETag / Last-Modified) with 304,
+serves single byte ranges with 206 and sets Cache-Control. With MEDIA_OFFLOAD
+set, it only checks the path and hands the transfer to the front proxy
+(nginx X-Accel-Redirect or Apache/lighttpd X-Sendfile), so no worker streams
+the bytes.
+"""
+import mimetypes
+import os
+import posixpath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def byte_range(header, size):
+    """
+    (first, last) byte of a single "bytes=" range, None to send the whole file
+    (no, malformed or multiple ranges); raises RangeNotSatisfiable.
+    """
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable
+            return max(0, size - length), size - 1
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if first >= size or first > last:
+        raise RangeNotSatisfiable
+    return first, last
+
+
+def read_range(path, first, length):
+    with open(path, "rb") as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def cache_control(path):
+    if path.startswith(settings.MEDIA_PRIVATE_PREFIXES):
+        return "private, no-cache"
+    return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+
+
+@require_safe
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found")
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404("Not found")
+    if not os.path.isfile(fullpath):
+        raise Http404("Not found")
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    if encoding or not content_type:
+        # e.g. .gz: send as-is rather than have the client decompress it
+        content_type = "application/octet-stream"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control(path),
+        "Accept-Ranges": "bytes",
+    }
+
+    offload = settings.MEDIA_OFFLOAD
+    if offload:
+        # The proxy adds its own validators and handles ranges and conditional requests
+        response = HttpResponse(content_type=content_type)
+        response["Cache-Control"] = headers["Cache-Control"]
+        if offload == "x-accel-redirect":
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        else:
+            response["X-Sendfile"] = os.path.abspath(fullpath)
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    requested = None
+    if range_header and (not if_range or if_range == etag):
+        try:
+            requested = byte_range(range_header, stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+
+    if requested is None:
+        response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+    else:
+        first, last = requested
+        length = last - first + 1
+        response = StreamingHttpResponse(read_range(fullpath, first, length), status=206,
+                                         content_type=content_type)
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = f"bytes {first}-{last}/{stat.st_size}"
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,185 @@
+"""
+Prometheus metrics for the API.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) so every
+worker writes its samples to a shared directory and /metrics aggregates them.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from core.database import wrap_every_connection
+from core.tracing import span
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    "needsafrica_http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "needsafrica_http_request_db_queries", "Database queries per request",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "needsafrica_http_request_db_duration_seconds", "Database time per request",
+    ["route"], buckets=LATENCY_BUCKETS,
+)
+GATEWAY_LATENCY = Histogram(
+    "needsafrica_gateway_request_duration_seconds", "Payment gateway call latency",
+    ["gateway", "operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+PDF_RENDER_SECONDS = Histogram(
+    "needsafrica_pdf_render_duration_seconds", "Project report PDF render time",
+    buckets=(.1, .25, .5, 1, 2, 5, 10, 30),
+)
+UPLOAD_BYTES = Counter(
+    "needsafrica_upload_bytes", "Bytes received in file uploads", ["kind"],
+)
+
+# Connection pool (psycopg_pool, see core/database.py); gauges are summed over live workers
+DB_POOL_CONNECTIONS = Gauge(
+    "needsafrica_db_pool_connections", "Pooled connections by state", ["alias", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAITING = Gauge(
+    "needsafrica_db_pool_requests_waiting", "Requests queued for a pooled connection", ["alias"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "needsafrica_db_pool_checkouts", "Connections handed out by the pool", ["alias"],
+)
+DB_POOL_WAIT_SECONDS = Counter(
+    "needsafrica_db_pool_wait_seconds", "Time spent queued for a pooled connection", ["alias"],
+)
+DB_POOL_ERRORS = Counter(
+    "needsafrica_db_pool_errors", "Pool checkout timeouts and failed connection attempts", ["alias", "kind"],
+)
+
+
+def record_upload(kind, *files):
+    """Count the size of uploaded files, ignoring missing ones"""
+    size = sum(f.size or 0 for f in files if f)
+    if size:
+        UPLOAD_BYTES.labels(kind=kind).inc(size)
+
+
+class QueryStats:
+    """execute_wrapper counting queries and their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+_request_stats = ContextVar("request_query_stats", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """execute_wrapper on every connection, charging queries to the current request's QueryStats"""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+wrap_every_connection(count_query)
+
+
+def record_pool_stats():
+    """Export psycopg_pool stats for every pooled alias; counters come from pop_stats() deltas"""
+    for alias in connections:
+        if not connections.settings[alias].get("OPTIONS", {}).get("pool"):
+            continue
+        pool = getattr(connections[alias], "pool", None)
+        if pool is None:
+            continue
+        stats = pool.pop_stats()
+        DB_POOL_CONNECTIONS.labels(alias, "open").set(stats.get("pool_size", 0))
+        DB_POOL_CONNECTIONS.labels(alias, "idle").set(stats.get("pool_available", 0))
+        DB_POOL_WAITING.labels(alias).set(stats.get("requests_waiting", 0))
+        DB_POOL_CHECKOUTS.labels(alias).inc(stats.get("requests_num", 0))
+        DB_POOL_WAIT_SECONDS.labels(alias).inc(stats.get("requests_wait_ms", 0) / 1000)
+        DB_POOL_ERRORS.labels(alias, "timeout").inc(stats.get("requests_errors", 0))
+        DB_POOL_ERRORS.labels(alias, "connect").inc(stats.get("connections_errors", 0))
+
+
+class MetricsMiddleware:
+    """Record latency and DB usage per resolved route (not per raw path, to bound label cardinality)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        started = time.perf_counter()
+        with self.instrument(request, stats):
+            response = self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with self.instrument(request, stats):
+            response = await self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    @contextmanager
+    def instrument(self, request, stats):
+        token = _request_stats.set(stats)
+        try:
+            with span("http.request", method=request.method, path=request.path):
+                yield
+        finally:
+            _request_stats.reset(token)
+
+    def record(self, request, response, stats, elapsed):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "unmatched"
+        REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(elapsed)
+        REQUEST_DB_QUERIES.labels(route).observe(stats.count)
+        REQUEST_DB_SECONDS.labels(route).observe(stats.seconds)
+        record_pool_stats()
+
+
+def metrics_view(request):
+    """Prometheus text exposition, aggregated across workers in multiprocess mode"""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    # Route names, gateway errors and pool sizes are not public: without a token only DEBUG serves them
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden()
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,65 @@
+"""
+Browser middleware that steps aside for the JSON API.
+
+The API under settings.API_PREFIX is stateless and JWT-authenticated, so
+sessions, CSRF, request.user, messages and X-Frame-Options only matter for the
+admin. These subclasses skip themselves, without a sync_to_async hop under
+ASGI, for API paths. Being subclasses, the admin's middleware system checks
+still recognise them.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+
+
+def is_api_request(request):
+    return request.path_info.startswith(settings.API_PREFIX)
+
+
+class SiteOnlyMixin:
+
+    def __call__(self, request):
+        if is_api_request(request):
+            # A coroutine when the chain is async, awaited by the caller like __acall__'s
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SiteSessionMiddleware(SiteOnlyMixin, SessionMiddleware):
+    pass
+
+
+class SiteCsrfViewMiddleware(SiteOnlyMixin, CsrfViewMiddleware):
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            # Django runs a sync process_view in a thread for every request, API ones included
+            self.process_view = self.aprocess_view
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+    async def aprocess_view(self, request, callback, callback_args, callback_kwargs):
+        if is_api_request(request):
+            return None
+        return await sync_to_async(CsrfViewMiddleware.process_view, thread_sensitive=True)(
+            self, request, callback, callback_args, callback_kwargs)
+
+
+class SiteAuthenticationMiddleware(SiteOnlyMixin, AuthenticationMiddleware):
+    pass
+
+
+class SiteMessageMiddleware(SiteOnlyMixin, MessageMiddleware):
+    pass
+
+
+class SiteXFrameOptionsMiddleware(SiteOnlyMixin, XFrameOptionsMiddleware):
+    pass
@@ -0,0 +1,164 @@
+"""
+Opt-in slow query log.
+
+With SLOW_QUERY_MS set, SlowQueryMiddleware logs a request's queries at or
+above the threshold on the "needsafrica.slow_query" logger, with a SQL
+fingerprint, the api/ line that issued the query and, when SLOW_QUERY_EXPLAIN
+is on, the query plan. `manage.py slow_query_report`
+aggregates those JSON log lines.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core.database import wrap_every_connection
+
+logger = logging.getLogger("needsafrica.slow_query")
+
+_IN_LIST = re.compile(r"\bIN \((?:%s|\?)(?:, ?(?:%s|\?))*\)", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+# Tables whose full scans the report calls out
+WATCHED_TABLES = ("api_donation", "api_project", "api_volunteer")
+
+
+def fingerprint(sql):
+    """SQL with literals and IN lists collapsed, so the same query shape groups together"""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint_id(sql_fingerprint):
+    return hashlib.sha1(sql_fingerprint.encode()).hexdigest()[:12]
+
+
+def call_site():
+    """Innermost stack frame in the api package, as 'api/donation_api.py:42 in list_donations'"""
+    api_dir = os.path.join(str(settings.BASE_DIR), "api") + os.sep
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(api_dir):
+            path = os.path.relpath(frame.filename, settings.BASE_DIR)
+            return f"{path}:{frame.lineno} in {frame.name}"
+    return None
+
+
+def seq_scans(plan, tables=WATCHED_TABLES):
+    """Watched tables read with a full scan in a PostgreSQL or SQLite plan"""
+    found = []
+    for line in (plan or "").splitlines():
+        for table in tables:
+            # PostgreSQL: "Seq Scan on api_donation"; SQLite: "SCAN api_donation" (no USING ... INDEX)
+            if re.search(rf"Seq Scan on {table}\b", line) or (
+                    re.search(rf"\bSCAN {table}\b", line) and "INDEX" not in line):
+                found.append(table)
+    return sorted(set(found))
+
+
+class SlowQueryRecorder:
+    """execute_wrapper logging queries slower than `threshold_ms`"""
+
+    def __init__(self, threshold_ms, explain=False):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self._local = threading.local()
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(self._local, "explaining", False):
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold:
+                self.record(context["connection"], sql, params, many, elapsed)
+
+    def record(self, connection, sql, params, many, elapsed):
+        sql_fingerprint = fingerprint(sql)
+        entry = {
+            "fingerprint": fingerprint_id(sql_fingerprint),
+            "sql": sql_fingerprint,
+            "duration_ms": round(elapsed * 1000, 3),
+            "call_site": call_site(),
+            "db_alias": connection.alias,
+        }
+        if self.explain and not many and sql.lstrip()[:6].upper() == "SELECT":
+            entry["plan"] = self.explain_plan(connection, sql, params)
+            entry["seq_scans"] = seq_scans(entry["plan"])
+        logger.warning("slow query %s %.1fms", entry["fingerprint"], entry["duration_ms"], extra=entry)
+
+    def explain_plan(self, connection, sql, params):
+        self._local.explaining = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+        finally:
+            self._local.explaining = False
+
+
+_recorder = ContextVar("slow_query_recorder", default=None)
+
+
+def log_slow_query(execute, sql, params, many, context):
+    """execute_wrapper on every connection, handing queries to the current block's SlowQueryRecorder"""
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+wrap_every_connection(log_slow_query)
+
+
+@contextmanager
+def record_slow_queries(threshold_ms=None, explain=None):
+    """Log slow queries for the duration of the block, including ones run from sync_to_async threads"""
+    threshold_ms = settings.SLOW_QUERY_MS if threshold_ms is None else threshold_ms
+    explain = settings.SLOW_QUERY_EXPLAIN if explain is None else explain
+    token = _recorder.set(SlowQueryRecorder(threshold_ms, explain))
+    try:
+        yield
+    finally:
+        _recorder.reset(token)
+
+
+class SlowQueryMiddleware:
+    """Enabled only when SLOW_QUERY_MS is set"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if getattr(settings, "SLOW_QUERY_MS", None) is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with record_slow_queries():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with record_slow_queries():
+            return await self.get_response(request)
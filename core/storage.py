@@ -0,0 +1,36 @@
+"""
+File storage that is only imported and built when a file is first touched.
+
+A FileField builds its storage when the model class is created, so a backend
+passed directly (e.g. Cloudinary's) is imported by every worker at startup.
+LazyStorage stands in for a STORAGES alias and loads the backend on first use.
+"""
+from django.core.files.storage import Storage, storages
+from django.utils.functional import cached_property
+
+DELEGATED = [
+    "open", "save", "get_valid_name", "get_alternative_name", "get_available_name", "generate_filename",
+    "path", "delete", "exists", "listdir", "size", "url", "get_accessed_time", "get_created_time",
+    "get_modified_time",
+]
+
+
+class LazyStorage(Storage):
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @cached_property
+    def backend(self):
+        return storages[self.alias]
+
+
+def delegate(name):
+    def method(self, *args, **kwargs):
+        return getattr(self.backend, name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+for name in DELEGATED:
+    setattr(LazyStorage, name, delegate(name))
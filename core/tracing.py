@@ -0,0 +1,66 @@
+"""
+Lightweight timing spans for hot code paths.
+
+    with span("donation.create", project_id=1):
+        with span("donation.gateway"):
+            ...
+
+A trace starts at the outermost span and is sampled with probability
+TRACE_SAMPLE_RATE; nested spans follow the decision of their root. Sampled
+spans are logged on the "needsafrica.trace" logger with their duration.
+"""
+import logging
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger("needsafrica.trace")
+
+# (trace_id, span_id) of the innermost active span, or (None, None) when the trace is not sampled
+_current = ContextVar("needsafrica_span", default=None)
+_UNSAMPLED = (None, None)
+
+
+@contextmanager
+def span(name, **attributes):
+    parent = _current.get()
+    if parent is None:
+        sampled = random.random() < getattr(settings, "TRACE_SAMPLE_RATE", 0)
+        trace_id = uuid.uuid4().hex[:16] if sampled else None
+        parent_id = None
+    else:
+        trace_id, parent_id = parent
+
+    if trace_id is None:
+        token = _current.set(_UNSAMPLED)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+        return
+
+    span_id = uuid.uuid4().hex[:8]
+    token = _current.set((trace_id, span_id))
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        logger.info(name, extra={
+            "span": name,
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "error": error,
+            **attributes,
+        })
+
@@ -1,5 +1,60 @@
-from ninja import Schema, HttpError
-from typing import Optional
+import csv
+import json
 
+from django.core.paginator import Paginator
 
 
+async def apaginate(queryset, page, page_size):
+    """Paginator.page() for async views; the count and the page's rows are fetched with the async ORM"""
+    paginator = Paginator(queryset, page_size)
+    paginator.count = await queryset.acount()
+    page = paginator.page(page)
+    page.object_list = [obj async for obj in page.object_list]
+    return page
+
+
+class Echo:
+    """File-like object whose write() hands the value back, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    """Yield CSV lines for header + rows without buffering the whole file"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(header, rows):
+    """Yield one JSON object per line, keyed by header"""
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), default=str) + "\n"
+
+
+def read_csv_or_ndjson(lines, fmt="csv"):
+    """
+    Iterate dict records from an iterable of text lines.
+    CSV input needs a header row, NDJSON is one object per line.
+    """
+    if fmt == "ndjson":
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(lines)
+
+
+def chunked(iterable, size):
+    """Group an iterable into lists of at most `size` items"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,20 @@
+"""
+gunicorn hooks for multiprocess Prometheus metrics.
+Set PROMETHEUS_MULTIPROC_DIR to a writable, per-deployment directory.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        # Samples from a previous master must not leak into this one
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -11,12 +11,13 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 from pathlib import Path
 from datetime import timedelta
-import dj_database_url
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
-import cloudinary
+
+from core.database import database_config, replica_databases
 
 load_dotenv()
 
@@ -43,12 +44,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'cloudinary',
-    'cloudinary_storage',
     'rest_framework',
     "corsheaders",
     'api',
 ]
+if not DEBUG:
+    # Media lives on Cloudinary only outside DEBUG. The storage package is light; the SDK it wraps
+    # (not an installed app: only its template tags need that) loads with the first media access
+    INSTALLED_APPS += ['cloudinary_storage']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -62,19 +65,25 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
+    "core.querylog.SlowQueryMiddleware",
+    "core.database.PrimaryPinMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.staticfiles.StaticFilesMiddleware',
     "ninja.compatibility.files.fix_request_files_middleware",
     "django.middleware.common.CommonMiddleware",
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Browser-only (admin); they skip themselves for API_PREFIX paths, see core/middleware.py
+    'core.middleware.SiteSessionMiddleware',
+    'core.middleware.SiteCsrfViewMiddleware',
+    'core.middleware.SiteAuthenticationMiddleware',
+    'core.middleware.SiteMessageMiddleware',
+    'core.middleware.SiteXFrameOptionsMiddleware',
 ]
 
+# The JSON API: stateless, JWT-authenticated
+API_PREFIX = '/api/'
+
 ROOT_URLCONF = 'needafricaapi.urls'
 
 TEMPLATES = [
@@ -105,12 +114,27 @@ WSGI_APPLICATION = 'needafricaapi.wsgi.application'
 # }
 
 
+if not os.environ.get('DATABASE_URL') and not DEBUG:
+    raise ImproperlyConfigured("DATABASE_URL must be set when DEBUG is off")
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=os.environ.get('DATABASE_URL'),
-        conn_max_age=600,
-        ssl_require=False
-    )
+    # Local (DEBUG) runs and the test suite fall back to SQLite. On PostgreSQL with psycopg 3 connections are
+    # pooled (DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, ...; DB_POOL=0 disables), see core/database.py
+    'default': database_config(os.environ.get('DATABASE_URL') or f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+    # Comma separated read replicas, e.g. sqlite:///replica.sqlite3 locally; used by read-heavy endpoints
+    **replica_databases(os.environ.get('DATABASE_REPLICA_URLS', '')),
+}
+DATABASE_ROUTERS = ['core.database.ReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it writes. Authenticated clients are pinned
+# in this cache, which must be shared by every worker when there are replicas (set CACHE_URL)
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+REPLICA_PIN_CACHE = 'default'
+
+# CACHE_URL, e.g. redis://localhost:6379/0 (needs the redis package); per-process memory otherwise
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ['CACHE_URL']}
+    if os.environ.get('CACHE_URL') else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
 }
 
 # Password validation
@@ -146,11 +170,12 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 if DEBUG is False:
-    cloudinary.config(
-        cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
-        api_key=os.environ.get('CLOUDINARY_API_KEY'),
-        api_secret=os.environ.get('CLOUDINARY_API_SECRET'),
-    )
+    # Applied by cloudinary_storage when the media storage is first loaded
+    CLOUDINARY_STORAGE = {
+        'CLOUD_NAME': os.environ.get('CLOUDINARY_CLOUD_NAME'),
+        'API_KEY': os.environ.get('CLOUDINARY_API_KEY'),
+        'API_SECRET': os.environ.get('CLOUDINARY_API_SECRET'),
+    }
 
     STORAGES = {
         'default': {
@@ -159,6 +184,10 @@ if DEBUG is False:
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
         },
+        # Volunteer cvs (PDF/Word) are uploaded as raw files, see api.utils.retrieve_storage
+        'volunteer_cvs': {
+            'BACKEND': 'cloudinary_storage.storage.RawMediaCloudinaryStorage',
+        },
     }
 
     DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
@@ -176,6 +205,16 @@ else:
 
 STATIC_URL = '/static/'
 
+# Local media (when not on Cloudinary) is served by core.media.serve_media
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', str(30 * 24 * 3600)))
+# Personal files, never stored by shared caches
+MEDIA_PRIVATE_PREFIXES = ('volunteer_cvs/',)
+# "x-accel-redirect" (nginx) or "x-sendfile" (Apache, lighttpd): the proxy sends the file, workers only
+# resolve the path. serve_media does no authorisation, so every file under MEDIA_ROOT is public
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '')
+# nginx `internal` location aliased to MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -194,3 +233,64 @@ PAYSTACK_PUBLIC_KEY = os.getenv("PAYSTACK_PUBLIC_KEY")
 PAYPAL_SECRET_KEY = os.getenv("PAYPAL_CLIENT_SECRET")
 PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
 PAYPAL_WEBHOOK_ID = os.getenv("PAYPAL_WEBHOOK_ID")
+
+# JSON logs go through a queue so request threads never block on stderr
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "default": {"()": "core.logs.NonBlockingHandler"},
+    },
+    "root": {"handlers": ["default"], "level": LOG_LEVEL},
+    "loggers": {
+        "django": {"handlers": ["default"], "level": LOG_LEVEL, "propagate": False},
+        "paypalrestsdk": {"level": "WARNING"},
+    },
+}
+
+# Fraction of requests whose spans are logged on "needsafrica.trace"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+
+# Log queries slower than this many ms (unset disables), optionally with their plan
+SLOW_QUERY_MS = float(os.environ["SLOW_QUERY_MS"]) if os.getenv("SLOW_QUERY_MS") else None
+SLOW_QUERY_EXPLAIN = bool(int(os.getenv("SLOW_QUERY_EXPLAIN", "0")))
+
+# Bearer token required by /metrics; without one /metrics is only served when DEBUG is on
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Gateway HTTP calls: (connect, read) timeouts in seconds, retries for idempotent
+# calls and the per-gateway circuit breaker
+GATEWAY_CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "3.05"))
+GATEWAY_READ_TIMEOUT = float(os.getenv("GATEWAY_READ_TIMEOUT", "15"))
+GATEWAY_OPERATION_TIMEOUTS = {
+    "paystack.verify_transaction": (GATEWAY_CONNECT_TIMEOUT, 10),
+    "paypal.verify_webhook_signature": (GATEWAY_CONNECT_TIMEOUT, 10),
+    "paypal.get_access_token": (GATEWAY_CONNECT_TIMEOUT, 10),
+}
+GATEWAY_MAX_RETRIES = int(os.getenv("GATEWAY_MAX_RETRIES", "2"))
+GATEWAY_BREAKER_THRESHOLD = int(os.getenv("GATEWAY_BREAKER_THRESHOLD", "5"))
+GATEWAY_BREAKER_RESET_SECONDS = float(os.getenv("GATEWAY_BREAKER_RESET_SECONDS", "30"))
+
+# Seconds a worker keeps its in-memory exchange rate history before reloading it
+# to see rates added by other workers (its own changes apply at once)
+EXCHANGE_RATE_REFRESH_SECONDS = float(os.getenv("EXCHANGE_RATE_REFRESH_SECONDS", "60"))
+# How far back POST /api/donation/exchange_rate/update may date a rate
+EXCHANGE_RATE_MAX_BACKDATE_DAYS = int(os.getenv("EXCHANGE_RATE_MAX_BACKDATE_DAYS", "90"))
+
+# Donation analytics snapshot (api.analytics): seconds between delta queries for
+# donations completed by other workers, and between full rebuilds
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "5"))
+ANALYTICS_REBUILD_SECONDS = float(os.getenv("ANALYTICS_REBUILD_SECONDS", "3600"))
+
+# Days past its expected monthly charge before a recurring donation counts as churned
+RECURRING_GRACE_DAYS = int(os.getenv("RECURRING_GRACE_DAYS", "7"))
+
+# Idempotency-Key on POST /api/donation/donations: hours a successful response is
+# replayed to retries, seconds a request in progress holds its key (longer than
+# the gateway calls it makes; a crashed worker's key frees up after this), and how
+# long and how often a concurrent duplicate waits for it before getting a 409
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.1"))
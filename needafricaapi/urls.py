@@ -1,7 +1,7 @@
 from django.contrib import admin
 from ninja import NinjaAPI
 
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
@@ -12,6 +12,8 @@ from api.project_api import router as project_api
 from api.donation_api import router as donation_api
 from api.volunteer_api import router as volunteer_api
 from api.subscription_api import router as subscription_api
+from core.media import serve_media
+from core.metrics import metrics_view
 
 
 class JWTAuth(HttpBearer):
@@ -41,9 +43,11 @@ api.add_router("/subscription/", subscription_api)
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/", api.urls),
+    path("metrics", metrics_view, name="metrics"),
 
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if "cloudinary_storage" not in settings.INSTALLED_APPS:
+    urlpatterns.append(re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", serve_media, name="media"))
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 